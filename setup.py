@@ -36,6 +36,7 @@ setup(name='vidpy',
       license='MIT',
       packages=find_packages(),
       install_requires=['pillow'],
+      extras_require={'numpy': ['numpy']},
       zip_safe=False,
       test_suite='tests'
 )
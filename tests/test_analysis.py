@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+from fractions import Fraction
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    import numpy as np
+    from vidpy import analysis, config, utils
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TestAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(self.tmpdir, 'cache')
+        self.addCleanup(setattr, config, 'CACHE_DIR', cache_dir)
+
+
+    def frames(self, colors):
+        return np.array([np.full((4, 6, 3), c, dtype=np.uint8) for c in colors])
+
+
+    def test_color_histograms(self):
+        histograms = analysis.color_histograms(self.frames([(0, 0, 0), (255, 255, 255)]))
+        self.assertEqual(histograms.shape, (2, 4096))
+        self.assertEqual(histograms[0, 0], 1.0)
+        self.assertEqual(histograms[1, 4095], 1.0)
+        self.assertEqual(histograms.sum(), 2.0)
+
+
+    def test_histogram_distances(self):
+        histograms = analysis.color_histograms(self.frames([(0, 0, 0), (0, 0, 0), (255, 0, 0)]))
+        self.assertEqual(list(analysis.histogram_distances(histograms)), [0, 0, 1])
+        self.assertEqual(list(analysis.histogram_distances(histograms[2:], histograms[1])), [1])
+
+
+    def test_detect_scenes(self):
+        colors = [(0, 0, 0)] * 40 + [(255, 0, 0)] * 5 + [(0, 0, 255)] * 40 + [(0, 255, 0)] * 40
+        batches = [self.frames(colors[i:i+32]) for i in range(0, len(colors), 32)]
+
+        with mock.patch('vidpy.analysis.probe_fps', return_value=utils.Timebase(20)), \
+                mock.patch('vidpy.analysis.stream_video', return_value=iter(batches)):
+            scenes = analysis.detect_scenes('video.mp4', min_length=0.5, cache=False)
+
+        # the 5 frame red flash is shorter than min_length, so it's not a scene of its own
+        self.assertEqual(scenes, [2.0, 4.25])
+        self.assertIsInstance(scenes[0], utils.Second)
+        self.assertFalse(os.path.exists(config.CACHE_DIR))
+
+
+    def test_probe_fps(self):
+        output = b'r_frame_rate=30000/1001\navg_frame_rate=0/0\n'
+        with mock.patch('vidpy.analysis.check_output', return_value=output):
+            self.assertEqual(analysis.probe_fps('video.mp4').fps, Fraction(30000, 1001))
+
+        with mock.patch('vidpy.analysis.check_output', return_value=b'r_frame_rate=0/0\navg_frame_rate=0/0\n'):
+            with self.assertRaises(ValueError):
+                analysis.probe_fps('video.mp4')
+
+
+    def test_failed_decode(self):
+        process = mock.Mock(returncode=1)
+        process.stdout.read.return_value = b''
+
+        with mock.patch('vidpy.analysis.Popen', return_value=process), \
+                mock.patch('vidpy.analysis.probe_fps', return_value=utils.Timebase(25)), \
+                mock.patch('vidpy.analysis.open', create=True) as opened:
+            with self.assertRaises(RuntimeError):
+                analysis.detect_scenes('missing.mp4')
+
+        # nothing is cached for a failed run
+        opened.assert_not_called()
+
+
+    def test_scene_clips(self):
+        with mock.patch('vidpy.analysis.probe_fps', return_value=utils.Timebase(10)):
+            clips = analysis.scene_clips('video.mp4', scenes=[utils.Second(2), utils.Second(5)])
+
+        self.assertEqual([(c.start, c.end) for c in clips], [(0, 1.9), (2, 4.9), (5, None)])
+
+
+    def test_audio_features(self):
+        sample_rate = 8000
+        samples = np.zeros(sample_rate * 3, dtype=np.float32)
+        for t in (0.5, 1.5, 2.25):
+            start = int(t * sample_rate)
+            samples[start:start + 400] = np.sin(np.arange(400) * 0.8) * 0.8
+        blocks = [samples[i:i + 5000] for i in range(0, len(samples), 5000)]
+
+        with mock.patch('vidpy.analysis.stream_audio', return_value=iter(blocks)):
+            features = analysis.audio_features('audio.wav', sample_rate=sample_rate, frame_length=512, hop_length=128)
+
+        self.assertEqual(len(features['times']), 1 + (len(samples) - 512) // 128)
+        self.assertEqual(len(features['rms']), len(features['times']))
+        self.assertTrue(features['loudness'].max() < 0)
+        onsets = features['onsets']
+        self.assertEqual(len(onsets), 3)
+        for onset, expected in zip(onsets, (0.5, 1.5, 2.25)):
+            self.assertAlmostEqual(onset, expected, delta=512.0 / sample_rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from PIL import Image
+from vidpy import animated, Composition, config
+
+
+def solid(color, size=(8, 6)):
+    return Image.new('RGB', size, color)
+
+
+class TestAnimated(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+
+    def test_collect_frames(self):
+        images = [solid('red'), solid('red'), solid('blue'), solid('blue'), solid('blue'), solid('red')]
+        frames, counts = animated.collect_frames(images)
+        self.assertEqual(counts, [2, 3, 1])
+        self.assertEqual(frames[1].getpixel((0, 0)), (0, 0, 255))
+
+        # halving the frame rate keeps every other frame
+        frames, counts = animated.collect_frames(images, step=2)
+        self.assertEqual(counts, [1, 2])
+
+
+    def test_collect_and_convert(self):
+        images = (solid(c) for c in ['red', 'red', 'green', 'blue', 'blue'])
+        frames, counts = animated.collect_frames(images, convert=animated.quantizer(4), workers=2)
+        self.assertEqual(counts, [2, 1, 2])
+        self.assertEqual([f.mode for f in frames], ['P'] * 3)
+        self.assertEqual(frames[1].convert('RGB').getpixel((0, 0)), (0, 128, 0))
+
+
+    def test_sample_indexes(self):
+        self.assertEqual(animated.sample_indexes(100, samples=4), [0, 25, 50, 75])
+        self.assertEqual(animated.sample_indexes(3, samples=16), [0, 1, 2])
+
+
+    def test_frame_durations(self):
+        # 30fps frames rounded to gif centiseconds without drifting
+        durations = animated.frame_durations([1] * 30, 1000 / 30.0, 10)
+        self.assertEqual(sum(durations), 1000)
+        self.assertTrue(all(d in (30, 40) for d in durations))
+        self.assertEqual(animated.frame_durations([3, 1], 40), [120, 40])
+
+
+    def test_quantize_frames(self):
+        frames = [solid('red'), solid('green'), solid('blue')]
+        for palette in ('global', 'frame'):
+            quantized = animated.quantize_frames(frames, colors=4, palette=palette, workers=2)
+            self.assertEqual([q.mode for q in quantized], ['P'] * 3)
+            self.assertEqual(quantized[2].convert('RGB').getpixel((0, 0)), (0, 0, 255))
+
+        with self.assertRaises(ValueError):
+            animated.quantize_frames(frames, palette='adaptive')
+
+
+    def test_save_gif(self):
+        filename = os.path.join(self.tmpdir, 'loop.gif')
+        frames = [solid('red'), solid('blue')]
+        animated.save_gif(frames, [2, 1], filename, 100)
+
+        gif = Image.open(filename)
+        self.assertEqual(gif.n_frames, 2)
+        self.assertEqual(gif.info['duration'], 200)
+
+
+    def test_composition_save_gif(self):
+        config.MELT_BINARY = 'melt'
+        filename = os.path.join(self.tmpdir, 'comp.gif')
+        xml = b'<mlt><profile width="8" height="6" frame_rate_num="30" frame_rate_den="1" /></mlt>'
+        colors = ['red', 'red', 'red', 'blue', 'blue', 'blue']
+        data = b''.join(solid(c).tobytes() for c in colors)
+
+        def fake_popen(args, **kwargs):
+            process = mock.Mock()
+            process.stdout = io.BytesIO(data)
+            # single frames, rendered with in= and out=
+            start = [a for a in args if a.startswith('in=')]
+            if start:
+                process.stdout = io.BytesIO(solid(colors[int(start[0][3:]) % len(colors)]).tobytes())
+            return process
+
+        comp = Composition([], width=16, height=12, duration=1)
+        with mock.patch.object(Composition, 'xml', return_value=xml), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.frames.Popen', side_effect=fake_popen) as popen:
+            comp.save_gif(filename, width=8, fps=10)
+
+        # the palette comes from single sample frames, and the composition is only streamed once
+        calls = [c[0][0] for c in popen.call_args_list]
+        samples = [args for args in calls if any(a.startswith('in=') for a in args)]
+        self.assertEqual(len(samples), 16)
+        self.assertEqual(len(calls) - len(samples), 1)
+        self.assertIn('width=8', popen.call_args[0][0])
+        gif = Image.open(filename)
+        self.assertEqual(gif.n_frames, 2)
+        self.assertEqual(gif.info['duration'], 100)
+
+        # animations are downscaled by default
+        comp = Composition([], width=1920, height=1080, duration=1)
+        with mock.patch.object(Composition, 'xml', return_value=xml), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.frames.Popen', side_effect=fake_popen) as popen:
+            # the fake frames are too small for the default size, so nothing is rendered
+            with self.assertRaises(RuntimeError):
+                comp.save_gif(filename, palette='frame')
+
+        self.assertEqual(popen.call_count, 1)
+        self.assertIn('width={}'.format(config.ANIMATION_WIDTH), popen.call_args[0][0])
+        self.assertIn('height=270', popen.call_args[0][0])
+
+
+    def test_save_keeps_melt(self):
+        config.MELT_BINARY = 'melt'
+        xml = b'<mlt><profile width="8" height="6" frame_rate_num="30" frame_rate_den="1" /></mlt>'
+        comp = Composition([], duration=1)
+
+        with mock.patch.object(Composition, 'xml', return_value=xml), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch.object(Composition, 'save_gif') as save_gif, \
+                mock.patch('vidpy.encoding.call', return_value=0) as call:
+            comp.save(os.path.join(self.tmpdir, 'out.gif'), on_missing='ignore')
+
+        save_gif.assert_not_called()
+        self.assertEqual(call.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import camera
+from vidpy.camera import Camera
+
+
+class TestCamera(unittest.TestCase):
+    def test_platform_defaults(self):
+        with mock.patch('sys.platform', 'darwin'):
+            cam = Camera()
+        self.assertEqual(cam.resource, 'avfoundation:0?framerate=30&video_size=1280x720&pixel_format=yuyv422')
+
+        with mock.patch('sys.platform', 'linux'):
+            cam = Camera(width=640, height=480, fps=25, pixel_format='mjpeg')
+        self.assertEqual(cam.resource, 'v4l2:/dev/video0?framerate=25&video_size=640x480&input_format=mjpeg')
+        self.assertEqual(cam.input_args(), ['-f', 'v4l2', '-framerate', '25', '-video_size', '640x480', '-input_format', 'mjpeg', '-i', '/dev/video0'])
+
+
+    def test_lavfi(self):
+        cam = Camera(avformat='lavfi', device='testsrc=size=320x240:rate=30')
+        self.assertEqual(cam.resource, 'lavfi:testsrc=size=320x240:rate=30')
+        self.assertEqual(cam.input_args(), ['-f', 'lavfi', '-i', 'testsrc=size=320x240:rate=30'])
+
+
+    def test_record(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        cam = Camera(avformat='lavfi', device='testsrc')
+        with mock.patch('vidpy.camera.Popen') as popen:
+            recording = cam.record(tmpdir, segment_time=2, keep=3)
+
+        args = popen.call_args[0][0]
+        self.assertEqual(args[args.index('-f', 6) + 1], 'segment')
+        self.assertEqual(args[args.index('-segment_wrap') + 1], '3')
+        self.assertEqual(args[args.index('-segment_list_type') + 1], 'csv')
+        self.assertEqual(args[-1], os.path.join(tmpdir, 'segment%05d.mp4'))
+
+        self.assertEqual(recording.segments(), [])
+
+        with open(recording.listfile, 'w') as f:
+            for i in range(5):
+                f.write('segment{:05d}.mp4,{:.6f},{:.6f}\n'.format(i % 3, i * 2, i * 2 + 2))
+
+        # segment00002 is being overwritten while recording
+        recording.process.poll.return_value = None
+        segments = recording.segments()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(segments[0], (os.path.join(tmpdir, 'segment00000.mp4'), 6.0, 8.0))
+        self.assertEqual(segments[-1][0], os.path.join(tmpdir, 'segment00001.mp4'))
+
+        recording.process.poll.return_value = 0
+        self.assertEqual(recording.segments()[0][0], os.path.join(tmpdir, 'segment00002.mp4'))
+
+        with self.assertRaises(ValueError):
+            cam.record(tmpdir, keep=1)
+
+
+    def test_dshow_devices(self):
+        old = (b'[dshow @ 0000] DirectShow video devices (some may be both video and audio devices)\r\n'
+               b'[dshow @ 0000]  "Integrated Camera"\r\n'
+               b'[dshow @ 0000]     Alternative name "@device_pnp_\\\\?\\usb"\r\n'
+               b'[dshow @ 0000] DirectShow audio devices\r\n'
+               b'[dshow @ 0000]  "Microphone (Realtek Audio)"\r\n')
+        new = (b'[dshow @ 0000] "OBS Virtual Camera" (video)\r\n'
+               b'[dshow @ 0000]   Alternative name "@device_sw_{860BB310}"\r\n'
+               b'[dshow @ 0000] "Microphone (Realtek Audio)" (audio)\r\n'
+               b'[dshow @ 0000] "USB Camera" (video)\r\n')
+
+        for output, expected in ((old, ['Integrated Camera']), (new, ['OBS Virtual Camera', 'USB Camera'])):
+            with mock.patch('vidpy.camera.Popen') as popen:
+                popen.return_value.communicate.return_value = (b'', output)
+                self.assertEqual(camera.dshow_devices(), expected)
+
+        with mock.patch('sys.platform', 'win32'), mock.patch('vidpy.camera.dshow_devices', return_value=['USB Camera']):
+            self.assertEqual(Camera().input_args()[-2:], ['-i', 'video=USB Camera'])
+
+        with mock.patch('sys.platform', 'win32'), mock.patch('vidpy.camera.dshow_devices', return_value=[]):
+            with self.assertRaises(ValueError):
+                Camera()
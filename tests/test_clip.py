@@ -1,7 +1,11 @@
 import os
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 from xml.etree.ElementTree import fromstring
-from vidpy import Composition, config, Clip
+from vidpy import Composition, config, Clip, scratch, utils
 
 class TestClip(unittest.TestCase):
     def test_args(self):
@@ -72,6 +76,43 @@ class TestClip(unittest.TestCase):
         self.assertTrue(' param2="hello"' in clip)
 
 
+    def test_chroma(self):
+        clip = Clip('video.mp4', start=utils.Frame(50))
+        with mock.patch.object(Clip, 'get_profile', return_value={'frame_rate_num': 25, 'frame_rate_den': 1}), \
+                mock.patch('vidpy.clip.get_bg_color', return_value='#00ff00') as get_bg_color:
+            clip.chroma()
+
+        # frame in-points are sampled at their time in seconds
+        self.assertEqual(get_bg_color.call_args[1]['times'], [2.0])
+        self.assertEqual(clip.fxs[-1], ('frei0r.bluescreen0r', {'0': '#00ff00', '1': 0.15}))
+
+
+    def test_nested(self):
+        xml = b'<mlt><profile width="640" height="360" frame_rate_num="30" frame_rate_den="1" /><tractor out=":2.000000" /></mlt>'
+        before = os.listdir('.')
+
+        with mock.patch.object(Composition, 'xml', return_value=xml):
+            clip = Clip(Composition([]))
+
+        self.assertEqual(clip.resource, 'xml-string:' + xml.decode('utf-8'))
+        self.assertEqual(clip.width, 640)
+        self.assertEqual(clip.total_frames, 61)
+        self.assertEqual(os.listdir('.'), before)
+
+        # too long for a command line argument
+        limit = config.INLINE_XML_LIMIT
+        config.INLINE_XML_LIMIT = 10
+        try:
+            with mock.patch.object(Composition, 'xml', return_value=xml):
+                clip = Clip(Composition([]))
+        finally:
+            config.INLINE_XML_LIMIT = limit
+
+        self.assertEqual(os.path.dirname(clip.resource), scratch.directory())
+        with open(clip.resource, 'rb') as infile:
+            self.assertEqual(infile.read(), xml)
+
+
     @unittest.skipIf('TRAVIS' in os.environ and os.environ['TRAVIS'] == 'true', 'Skipping this test on Travis')
     def test_profie(self):
         clip = Clip(os.path.realpath('demos/videos/hand1.mp4'))
@@ -1,5 +1,12 @@
+import io
 import os
+import shutil
+import tempfile
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 from xml.etree.ElementTree import fromstring
 from vidpy import Composition, config, Clip
 
@@ -14,6 +21,41 @@ class TestComposition(unittest.TestCase):
         width/height/fps tests
     '''
 
+    def test_masks(self):
+        config.MELT_BINARY = 'melt'
+        still = Clip('video.mp4').set_mask('mask.png')
+        video = Clip('video2.mp4').set_mask('mask.mp4')
+
+        comp = Composition([still, video])
+
+        # until melt has been checked for the shape filter, every mask gets a track
+        with mock.patch('vidpy.services.is_available') as is_available:
+            args = comp.args()
+        self.assertFalse(is_available.called)
+        self.assertNotIn('shape', args)
+        self.assertEqual(args.count('matte'), 2)
+
+        with mock.patch('vidpy.services.is_available', return_value=True):
+            comp._resolve_masks()
+        args = comp.args()
+
+        # the still mask is a filter on its clip, the video mask gets a track and a matte transition
+        self.assertIn('shape', args)
+        self.assertIn('resource="mask.png"', args)
+        self.assertNotIn('mask.png', args)
+        self.assertIn('mask.mp4', args)
+        self.assertEqual(args.count('matte'), 1)
+
+        # still masks with effects need their own track
+        mask = Clip('mask.png').glow()
+        comp = Composition([Clip('video.mp4').set_mask(mask)])
+        with mock.patch('vidpy.services.is_available', return_value=True):
+            comp._resolve_masks()
+        args = comp.args()
+        self.assertNotIn('shape', args)
+        self.assertEqual(args.count('matte'), 1)
+
+
     def test_empty_composition(self):
         config.MELT_BINARY = 'melt'
         comp = Composition([])
@@ -43,6 +85,17 @@ class TestComposition(unittest.TestCase):
         self.assertEqual(str(comp), 'melt -track color:#000000 out=0 -track video.mp4 in=":0.000000" -track video2.mp4 in=":0.000000" -transition composite distort=0 a_track=0 b_track=1 -transition mix a_track=0 b_track=1 -transition composite distort=0 a_track=0 b_track=2 -transition mix a_track=0 b_track=2')
 
 
+    def test_audio_only_composition(self):
+        config.MELT_BINARY = 'melt'
+        clip = Clip('video.mp4').position(0, 0, 100, 100).volume(0.5)
+        clip2 = Clip('music.mp3')
+        comp = Composition([clip, clip2], audio_only=True)
+        self.assertEqual(str(comp), 'melt -track video.mp4 in=":0.000000" video_index="-1" -attach-track avfilter.volume av.volume="0.5" -track music.mp3 in=":0.000000" video_index="-1" -transition mix a_track=0 b_track=1')
+
+        comp = Composition([clip, clip2], singletrack=True, audio_only=True)
+        self.assertEqual(str(comp), 'melt -track video.mp4 in=":0.000000" video_index="-1" -attach-clip avfilter.volume av.volume="0.5" music.mp3 in=":0.000000" video_index="-1"')
+
+
     def test_autoset_duration(self):
         xmlstring = '''<melt>
             <tractor out="100" />
@@ -64,6 +117,29 @@ class TestComposition(unittest.TestCase):
         self.assertEqual(xml.find('./playlist/entry').get('out'), ':2.500000')
 
 
+    def test_share_producers(self):
+        xmlstring = '''<mlt>
+            <profile width="1280" height="720" frame_rate_num="30" frame_rate_den="1" />
+            <producer id="producer0" in="0" out="0"><property name="resource">#000000</property><property name="mlt_service">color</property></producer>
+            <playlist id="playlist0"><entry producer="producer0" in="0" out="0" /></playlist>
+            <producer id="producer1" in="0" out="99"><property name="resource">a.mp4</property></producer>
+            <producer id="producer2" in="0" out="99"><property name="resource">a.mp4</property></producer>
+            <playlist id="playlist1"><entry producer="producer1" in="0" out="99" /><entry producer="producer2" in="10" out="20" /></playlist>
+            <producer id="producer3" in="0" out="99"><property name="resource">a.mp4</property></producer>
+            <playlist id="playlist2"><entry producer="producer3" in="0" out="99" /></playlist>
+            <producer id="producer4" in="0" out="99"><property name="resource">a.mp4</property></producer>
+            <playlist id="playlist3"><blank length="3" /><entry producer="producer4" in="0" out="99" /></playlist>
+            <producer id="producer5" in="0" out="99"><property name="resource">b.mp4</property></producer>
+            <playlist id="playlist4"><blank length="3" /><entry producer="producer5" in="0" out="99" /></playlist>
+        </mlt>'''
+
+        comp = Composition([])
+        xml = comp.share_producers(fromstring(xmlstring))
+        self.assertEqual([p.get('id') for p in xml.findall('producer')], ['producer0', 'producer1', 'producer4', 'producer5'])
+        entries = [[e.get('producer') for e in p.findall('entry')] for p in xml.findall('playlist')]
+        self.assertEqual(entries, [['producer0'], ['producer1', 'producer1'], ['producer1'], ['producer4'], ['producer5']])
+
+
     def test_set_meta(self):
         xmlstring = '''<melt>
             <tractor out="100" />
@@ -80,6 +156,114 @@ class TestComposition(unittest.TestCase):
         self.assertEqual(profile.get('frame_rate_num'), '60')
 
 
+    def test_save_chunked_resume(self):
+        xmlstring = b'''<mlt><profile width="1280" height="720" frame_rate_num="30" frame_rate_den="1" /></mlt>'''
+        tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(tmpdir, 'out.mp4')
+        rendered = []
+
+        def fake_call(args, **kwargs):
+            if args[0] == 'ffmpeg':
+                return 0
+            rendered.append((args[2], args[3]))
+            open(args[5].split(':', 1)[1], 'w').close()
+            return 1 if len(rendered) == 2 else 0
+
+        comp = Composition([], duration=10)
+        try:
+            with mock.patch('vidpy.composition.call', side_effect=fake_call), \
+                    mock.patch('vidpy.composition.check_melt'), \
+                    mock.patch.object(Composition, 'xml', return_value=xmlstring):
+                with self.assertRaises(RuntimeError):
+                    comp.save_chunked(filename, chunk_duration=4)
+                self.assertEqual(rendered, [('in=0', 'out=119'), ('in=120', 'out=239')])
+
+                comp.save_chunked(filename, chunk_duration=4)
+                self.assertEqual(rendered[2:], [('in=120', 'out=239'), ('in=240', 'out=300')])
+                self.assertFalse(os.path.exists(filename + '.chunks'))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_save_many(self):
+        config.MELT_BINARY = 'melt'
+        xml = b'<mlt><profile width="1920" height="1080" frame_rate_num="25" frame_rate_den="1" /></mlt>'
+        comp = Composition([], duration=4)
+        outputs = [
+            {'filename': 'full.mp4', 'encoding': 'web'},
+            {'filename': 'small.mp4', 'encoding': 'web', 'width': 1280, 'height': 720},
+            {'filename': 'clip.webm', 'vcodec': 'libvpx-vp9'},
+            {'filename': 'poster.jpg', 'time': 2, 'width': 640, 'height': 360},
+        ]
+
+        poster = mock.Mock()
+        with mock.patch.object(Composition, 'xml', return_value=xml), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.composition.render_frames', return_value=[poster]) as render_frames, \
+                mock.patch('vidpy.composition.call', return_value=0) as call:
+            filenames = comp.save_many(outputs, on_missing='ignore')
+
+        self.assertEqual(filenames, ['full.mp4', 'small.mp4', 'clip.webm', 'poster.jpg'])
+
+        # one melt process encodes every video
+        self.assertEqual(call.call_count, 1)
+        args = call.call_args[0][0]
+        self.assertEqual(args[args.index('-consumer') + 1], 'multi:')
+        self.assertIn('0=avformat:full.mp4', args)
+        self.assertIn('0.g="50"', args)
+        self.assertIn('1.width="1280"', args)
+        self.assertIn('2=avformat:clip.webm', args)
+        self.assertIn('2.vcodec="libvpx-vp9"', args)
+
+        self.assertEqual(render_frames.call_args[0][1:4], ([50], 640, 360))
+        poster.save.assert_called_with('poster.jpg')
+
+
+    def test_stream(self):
+        config.MELT_BINARY = 'melt'
+        xmlstring = b'''<mlt><profile width="1280" height="720" frame_rate_num="30" frame_rate_den="1" /></mlt>'''
+        launched = []
+        reports = []
+
+        def fake_popen(args, **kwargs):
+            launched.append(args)
+            process = mock.Mock()
+            process.stderr = io.BytesIO(b'Current Frame:          1, percentage:          0\rCurrent Frame:         30, percentage:         50\r')
+            return process
+
+        comp = Composition([], duration=1)
+        with mock.patch('vidpy.composition.Popen', side_effect=fake_popen), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch.object(Composition, 'xml', return_value=xmlstring):
+            stats = comp.stream('rtmp://localhost/live/test', metrics=reports.append, interval=0)
+            comp.stream('out/stream.m3u8', latency='normal', g=15)
+
+        self.assertEqual(stats['position'], 30)
+        self.assertEqual(reports[-1]['position'], 30)
+        self.assertEqual(stats['lag'], 0)
+        self.assertNotIn('dropped', stats)
+        self.assertIn('f="flv"', launched[0])
+        self.assertIn('tune="zerolatency"', launched[0])
+        self.assertIn('g="30"', launched[0])
+        self.assertIn('f="hls"', launched[1])
+        self.assertIn('hls_time="4"', launched[1])
+        self.assertIn('g="15"', launched[1])
+        self.assertNotIn('tune="zerolatency"', launched[1])
+
+        # the job directory is removed even when the xml can't be compiled
+        directories = []
+
+        def failing_compile(job):
+            directories.append(job.directory)
+            raise ValueError('bad xml')
+
+        with mock.patch('vidpy.composition.check_melt'), mock.patch.object(Composition, '_compile', side_effect=failing_compile):
+            with self.assertRaises(ValueError):
+                comp.stream('rtmp://localhost/live/test')
+
+        self.assertFalse(os.path.exists(directories[0]))
+
+
     @unittest.skipIf('TRAVIS' in os.environ and os.environ['TRAVIS'] == 'true', 'Skipping this test on Travis')
     def test_xml(self):
         clip = Clip('demos/videos/hand1.mp4')
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from xml.etree.ElementTree import fromstring
+from vidpy import Composition, CutList, config, scratch
+
+
+class TestCutList(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_shared_producers(self):
+        cuts = CutList(['a.mp4', 'b.mp4', 'a.mp4'], [0, 1, 2], [1, 2, 3])
+        with mock.patch('vidpy.cutlist.get_melt_profile', return_value={'frame_rate_num': 30, 'frame_rate_den': 1}) as get_melt_profile:
+            xml = fromstring(cuts.xml())
+
+        # without an fps, cut points are frames at the first source's rate
+        get_melt_profile.assert_called_once_with('a.mp4')
+        producers = xml.findall('producer')
+        self.assertEqual([p.find('property').text for p in producers], ['a.mp4', 'b.mp4'])
+        entries = xml.findall('./playlist/entry')
+        self.assertEqual([e.get('producer') for e in entries], ['producer0', 'producer1', 'producer0'])
+        # out-points are exclusive, so back to back cuts don't repeat a frame
+        self.assertEqual([(e.get('in'), e.get('out')) for e in entries], [('0', '29'), ('30', '59'), ('60', '89')])
+
+
+    def test_exact_frames(self):
+        cuts = CutList('a.mp4', [0, 1.1, 2.2], [1.1, 2.2, 3.3], offsets=[0, 0.5, 0], fps=30)
+        xml = fromstring(cuts.xml())
+        self.assertEqual(len(xml.findall('producer')), 1)
+        entries = xml.findall('./playlist/entry')
+        self.assertEqual([(e.get('in'), e.get('out')) for e in entries], [('0', '32'), ('33', '65'), ('66', '98')])
+        self.assertEqual([b.get('length') for b in xml.findall('./playlist/blank')], ['15'])
+
+        with self.assertRaises(ValueError):
+            CutList('a.mp4', [0, 1], [1])
+
+
+    def test_csv(self):
+        filename = os.path.join(self.tmpdir, 'cuts.csv')
+        with open(filename, 'w') as outfile:
+            outfile.write('resource,start,end\n/videos/a.mp4,1,2\n/videos/b.mp4,3,4.5\n')
+
+        cuts = CutList.from_csv(filename)
+        self.assertEqual(cuts.sources, ['/videos/a.mp4', '/videos/b.mp4'])
+        self.assertEqual(cuts.starts, [1, 3])
+        self.assertEqual(cuts.ends, [2, 4.5])
+        self.assertEqual(cuts.offsets, None)
+
+
+    def test_edl(self):
+        filename = os.path.join(self.tmpdir, 'cuts.edl')
+        with open(filename, 'w') as outfile:
+            outfile.write('\n'.join([
+                'TITLE: test',
+                'FCM: NON-DROP FRAME',
+                '001  AX       V     C        00:00:01:00 00:00:02:15 01:00:00:00 01:00:01:15',
+                '* FROM CLIP NAME: /videos/a.mp4',
+                '002  AX       V     C        00:00:10:00 00:00:11:00 01:00:02:15 01:00:03:15',
+                '* FROM CLIP NAME: /videos/b.mp4',
+            ]))
+
+        cuts = CutList.from_edl(filename, fps=30)
+        self.assertEqual(cuts.sources, ['/videos/a.mp4', '/videos/b.mp4'])
+        self.assertEqual(cuts.starts, [1, 10])
+        self.assertEqual(cuts.ends, [2.5, 11])
+        self.assertEqual(cuts.offsets, [0, 1])
+
+        with open(filename, 'w') as outfile:
+            outfile.write('\n'.join([
+                'TITLE: test',
+                'FCM: DROP FRAME',
+                '001  AX       V     C        00:59:59:00 01:00:00:00 01:00:00:00 01:00:01:00',
+                '* FROM CLIP NAME: /videos/a.mp4',
+            ]))
+
+        # an hour of drop-frame timecode is an hour of 29.97 video
+        cuts = CutList.from_edl(filename, fps=29.97)
+        self.assertAlmostEqual(cuts.ends[0], 3600, places=2)
+        self.assertAlmostEqual(cuts.starts[0], 3599, places=1)
+
+
+    def test_from_cuts(self):
+        config.MELT_BINARY = 'melt'
+        comp = Composition.from_cuts('a.mp4', [0, 1], [1, 2], fps=30)
+        self.assertTrue(comp.singletrack)
+        self.assertEqual(len(comp.clips), 1)
+        xml = fromstring(scratch.inline_xml(comp.clips[0].resource).encode('utf-8'))
+        self.assertEqual(len(xml.findall('./playlist/entry')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
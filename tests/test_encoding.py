@@ -0,0 +1,88 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import Composition, config, encoding
+from vidpy.encoding import EncodingProfile
+
+XML = b'<mlt><profile width="1280" height="720" frame_rate_num="30" frame_rate_den="1" /></mlt>'
+
+
+class TestEncoding(unittest.TestCase):
+    def test_params(self):
+        params = encoding.get_profile('web').params(fps=30)
+        self.assertEqual(params['crf'], 23)
+        self.assertEqual(params['g'], 60)
+        self.assertEqual(params['movflags'], '+faststart')
+
+        self.assertEqual(encoding.get_profile('mezzanine').params(fps=25)['g'], 1)
+
+        vp9 = EncodingProfile('libvpx-vp9', crf=31).params()
+        self.assertEqual((vp9['crf'], vp9['vb']), (31, 0))
+        self.assertNotIn('preset', vp9)
+
+        profile = EncodingProfile(bitrate='4M')
+        self.assertTrue(profile.two_pass)
+        self.assertNotIn('crf', profile.params())
+
+        with self.assertRaises(ValueError):
+            encoding.get_profile('fastest')
+
+
+    def test_two_pass(self):
+        config.MELT_BINARY = 'melt'
+        with mock.patch('vidpy.encoding.call', return_value=0) as call:
+            self.assertTrue(encoding.encode('comp.xml', 'out.mp4', EncodingProfile(bitrate='2M')))
+
+        first, second = [c[0][0] for c in call.call_args_list]
+        self.assertIn('pass="1"', first)
+        self.assertIn('an="1"', first)
+        self.assertNotIn('acodec="aac"', first)
+        self.assertIn('pass="2"', second)
+        self.assertIn('avformat:out.mp4', second)
+        self.assertIn('acodec="aac"', second)
+
+        logfile = [a for a in first if a.startswith('passlogfile=')]
+        self.assertEqual(logfile, [a for a in second if a.startswith('passlogfile=')])
+
+
+    def test_save_profile(self):
+        config.MELT_BINARY = 'melt'
+        comp = Composition([], duration=2)
+
+        with mock.patch.object(Composition, 'xml', return_value=XML), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.encoding.call', return_value=0) as call:
+            comp.save('out.mp4', on_missing='ignore', encoding='preview', crf=35)
+
+        args = call.call_args[0][0]
+        self.assertIn('preset="ultrafast"', args)
+        self.assertIn('crf="35"', args)
+        self.assertIn('out=":2.000000"', args)
+
+        # profile is still passed to the melt consumer, like it was before encoding profiles
+        with mock.patch.object(Composition, 'xml', return_value=XML), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.encoding.call', return_value=0) as call:
+            comp.save('out.mp4', on_missing='ignore', profile='atsc_1080p_25')
+        self.assertIn('profile="atsc_1080p_25"', call.call_args[0][0])
+
+        with mock.patch.object(Composition, 'xml', return_value=XML), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.encoding.call', return_value=1):
+            with self.assertRaises(RuntimeError):
+                comp.save('out.mp4', on_missing='ignore')
+
+
+    def test_measure_quality(self):
+        output = b'[Parsed_ssim_4] SSIM Y:0.98 U:0.99 V:0.99 All:0.984321 (18.0)\n[Parsed_psnr_5] PSNR y:40.1 u:44 v:44 average:41.234 min:38 max:45\n'
+        process = mock.Mock()
+        process.communicate.return_value = (b'', output)
+
+        with mock.patch('vidpy.encoding.Popen', return_value=process):
+            self.assertEqual(encoding.measure_quality('a.mp4', 'ref.mkv', 1280, 720), (41.234, 0.984321))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from vidpy import Clip, filters, config
+
+
+class TestFilters(unittest.TestCase):
+    def test_opacity(self):
+        fxs = [
+            ('brightness', {'alpha': 0.5, 'opacity': 0.5}),
+            ('brightness', {'alpha': '0=0;:1.000000=1', 'opacity': '0=0;:1.000000=1'}),
+        ]
+        fused = filters.fuse(fxs)
+        self.assertEqual(fused, [('brightness', {'alpha': '0=0;:1.000000=0.5', 'opacity': '0=0;:1.000000=0.5'})])
+
+
+    def test_fades(self):
+        fade_in = ('brightness', {'alpha': '0=0;:1.000000=1', 'opacity': '0=0;:1.000000=1'})
+        fade_out = ('brightness', {'alpha': ':-2.000000=1;-1=0', 'opacity': ':-2.000000=1;-1=0'})
+
+        # without a known length the fades might overlap, so they stay separate
+        self.assertEqual(len(filters.fuse([fade_in, fade_out])), 2)
+        self.assertEqual(len(filters.fuse([fade_in, fade_out], length=2.5)), 2)
+
+        fused = filters.fuse([fade_in, fade_out], length=10)
+        self.assertEqual(fused, [('brightness', {'alpha': '0=0;:1.000000=1;:-2.000000=1;-1=0', 'opacity': '0=0;:1.000000=1;:-2.000000=1;-1=0'})])
+
+
+    def test_affine(self):
+        fxs = [
+            ('affine', {'transition.fix_rotate_x': 10}),
+            ('brightness', {'alpha': 0.5, 'opacity': 0.5}),
+            ('affine', {'transition.fix_rotate_x': 20, 'transition.rotate_x': 1}),
+            ('affine', {'transition.fix_rotate_y': 5}),
+        ]
+        fused = filters.fuse(fxs)
+        # each rotation crops the corners of the last one, so they're kept apart
+        self.assertEqual(fused, fxs)
+        spin = [('affine', {'transition.fix_rotate_x': 45}), ('affine', {'transition.fix_rotate_x': -45})]
+        self.assertEqual(filters.fuse(spin), spin)
+
+        rect = lambda r, **p: ('affine', dict({'transition.geometry': r, 'transition.distort': 1}, **p))
+        fused = filters.fuse([rect('50%/0%:50%x50%'), rect('10%/10%:80%x80%')])
+        self.assertEqual(fused, [rect('50%/10%:40%x40%')])
+
+        # pixels, rects outside the frame and other filters in between aren't combined
+        self.assertEqual(len(filters.fuse([rect('0/0:640x360'), rect('10%/10%:80%x80%')])), 2)
+        self.assertEqual(len(filters.fuse([rect('60%/0%:50%x50%'), rect('10%/10%:80%x80%')])), 2)
+        self.assertEqual(len(filters.fuse([rect('0%/0%:50%x50%'), ('greyscale', []), rect('10%/10%:80%x80%')])), 3)
+
+
+    def test_clip_args(self):
+        clip = Clip('video.mp4', end=10).fadein(1).fadeout(1).opacity(0.5).resize('50%', '50%').resize('50%', '50%')
+        args = clip.args()
+        self.assertEqual(args.count('brightness'), 1)
+        self.assertEqual(args.count('affine'), 1)
+        self.assertIn('transition.geometry="0%/0%:25%x25%"', args)
+        self.assertEqual(len(clip.fxs), 5)
+
+        config.FUSE_FILTERS = False
+        try:
+            self.assertEqual(clip.args().count('brightness'), 3)
+        finally:
+            config.FUSE_FILTERS = True
+
+
+if __name__ == '__main__':
+    unittest.main()
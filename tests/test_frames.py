@@ -0,0 +1,42 @@
+import io
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from PIL import Image
+from vidpy import frames, config
+
+
+class TestFrames(unittest.TestCase):
+    def test_tile(self):
+        images = [Image.new('RGB', (4, 2), color) for color in ['red', 'green', 'blue']]
+        sheet = frames.tile(images, cols=2, rows=2)
+        self.assertEqual(sheet.size, (8, 4))
+        self.assertEqual(sheet.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(sheet.getpixel((4, 0)), (0, 128, 0))
+        self.assertEqual(sheet.getpixel((0, 2)), (0, 0, 255))
+        self.assertEqual(sheet.getpixel((4, 2)), (0, 0, 0))
+
+
+    def test_render_frames(self):
+        config.MELT_BINARY = 'melt'
+        calls = []
+
+        def fake_popen(args, **kwargs):
+            calls.append(args)
+            process = mock.Mock()
+            process.stdout = io.BytesIO(b'\xff\x00\x00' * 6)
+            return process
+
+        with mock.patch('vidpy.frames.Popen', side_effect=fake_popen):
+            images = frames.render_frames('comp.xml', [10, 20], 3, 2, workers=2)
+
+        self.assertEqual([image.size for image in images], [(3, 2), (3, 2)])
+        self.assertEqual(images[0].getpixel((2, 1)), (255, 0, 0))
+        self.assertEqual(sorted(args[2:4] for args in calls), [['in=10', 'out=10'], ['in=20', 'out=20']])
+        self.assertIn('pix_fmt=rgb24', calls[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
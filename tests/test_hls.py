@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import Composition, config, hls
+
+XML = b'<mlt><profile width="1920" height="1080" frame_rate_num="30000" frame_rate_den="1001" /></mlt>'
+
+
+class TestHLS(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_bitrates(self):
+        self.assertEqual(hls.parse_bitrate('3M'), 3000000)
+        self.assertEqual(hls.parse_bitrate('128k'), 128000)
+        self.assertEqual(hls.parse_bitrate(700000), 700000)
+
+        with self.assertRaises(ValueError):
+            hls.parse_bitrate('fast')
+
+
+    def test_sizes(self):
+        self.assertEqual(hls.rendition_size({'height': 720}, 1920, 1080), (1280, 720))
+        self.assertEqual(hls.rendition_size({'width': 854}, 1920, 1080), (854, 480))
+        self.assertEqual(hls.rendition_size({'height': 360}, 1920, 1080), (640, 360))
+        self.assertEqual(hls.rendition_name({'height': 360, 'name': 'low'}, 1920, 1080), 'low')
+
+
+    def test_params(self):
+        params = hls.rendition_params({'height': 720, 'bitrate': '3M', 'preset': 'fast'}, 'out/720p', 1920, 1080, 29.97, segment_time=4)
+
+        # keyframes land on segment boundaries in every rendition
+        self.assertEqual((params['g'], params['keyint_min'], params['sc_threshold']), (120, 120, 0))
+        self.assertEqual(params['hls_time'], '%.6g' % (120 / 29.97))
+        self.assertEqual(params['maxrate'], 3000000)
+        self.assertEqual(params['preset'], 'fast')
+        self.assertEqual(params['hls_segment_filename'], os.path.join('out/720p', hls.SEGMENT_PATTERN))
+        self.assertEqual((params['vprofile'], params['level']), ('main', '3.1'))
+
+        # other encoders don't get x264's profile and level
+        params = hls.rendition_params({'height': 720, 'bitrate': '3M', 'vcodec': 'libvpx-vp9'}, 'out/720p', 1920, 1080, 30)
+        self.assertEqual(params['vcodec'], 'libvpx-vp9')
+        self.assertNotIn('vprofile', params)
+        self.assertNotIn('level', params)
+        self.assertIsNone(hls.rendition_codecs(params))
+
+
+    def test_levels(self):
+        self.assertEqual(hls.h264_level(640, 360, 30, 700000), '3.0')
+        self.assertEqual(hls.h264_level(1920, 1080, 30, 5000000), '4.0')
+        self.assertEqual(hls.h264_level(1920, 1080, 30, 25000000), '4.1')
+        self.assertEqual(hls.h264_level(1920, 1080, 60, 5000000), '4.2')
+
+
+    def test_fit_ladder(self):
+        ladder = hls.fit_ladder(hls.LADDER, 1280, 720)
+        self.assertEqual([rendition['height'] for rendition in ladder], [720, 480, 360])
+
+        # nothing fits, so the lowest rendition is kept at the composition's size
+        self.assertEqual(hls.fit_ladder(hls.LADDER, 320, 240), [dict(hls.LADDER[-1], width=320, height=240)])
+
+
+    def test_master_playlist(self):
+        ladder = hls.LADDER[:2] + [{'height': 480, 'bitrate': '1M', 'vprofile': 'high'}, {'height': 360, 'bitrate': '700k', 'vcodec': 'libx265'}]
+        playlist = hls.master_playlist(ladder, 1920, 1080, 30).splitlines()
+        self.assertEqual(playlist[0], '#EXTM3U')
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=5192000,RESOLUTION=1920x1080,CODECS="avc1.4d4028,mp4a.40.2"', playlist)
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=3128000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"', playlist)
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=1128000,RESOLUTION=854x480,CODECS="avc1.64001f,mp4a.40.2"', playlist)
+
+        # codecs that can't be described are left for the player to find
+        self.assertIn('#EXT-X-STREAM-INF:BANDWIDTH=828000,RESOLUTION=640x360', playlist)
+        self.assertEqual(playlist[-1], '360p/index.m3u8')
+
+
+    def test_save_hls(self):
+        config.MELT_BINARY = 'melt'
+        comp = Composition([], duration=10)
+        ladder = [{'height': 2160, 'bitrate': '16M'}, {'height': 720, 'bitrate': '3M'}, {'height': 360, 'bitrate': '700k'}]
+
+        with mock.patch.object(Composition, 'xml', return_value=XML), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.composition.call', return_value=0) as call:
+            master = comp.save_hls(self.directory, ladder, on_missing='ignore')
+
+        # both renditions come from one melt process
+        self.assertEqual(call.call_count, 1)
+        args = call.call_args[0][0]
+        self.assertEqual(args[args.index('-consumer') + 1], 'multi:')
+        self.assertIn('0=avformat:{}'.format(os.path.join(self.directory, '720p', 'index.m3u8')), args)
+        self.assertIn('1.height="360"', args)
+        self.assertIn('1.f="hls"', args)
+        self.assertIn('0.vprofile="main"', args)
+
+        # the 2160p rendition is bigger than the composition
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '2160p')))
+
+        self.assertTrue(os.path.isdir(os.path.join(self.directory, '360p')))
+        with open(master) as infile:
+            self.assertIn('360p/index.m3u8', infile.read())
+
+        with mock.patch.object(Composition, 'xml', return_value=XML), \
+                mock.patch('vidpy.composition.check_melt'), \
+                mock.patch('vidpy.composition.call', return_value=0):
+            with self.assertRaises(ValueError):
+                comp.save_hls(self.directory, [{'height': 720, 'bitrate': '3M'}, {'height': 720, 'bitrate': '2M'}], on_missing='ignore')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+from vidpy import ImageSequence, Still, config, images
+
+
+class TestImages(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(self.tmpdir, 'cache')
+        self.addCleanup(setattr, config, 'CACHE_DIR', cache_dir)
+
+        self.frames = os.path.join(self.tmpdir, 'frames')
+        os.makedirs(self.frames)
+        for i in range(3, 13):
+            Image.new('RGB', (64, 48)).save(os.path.join(self.frames, 'frame{:04d}.png'.format(i)))
+        open(os.path.join(self.frames, 'notes.txt'), 'w').close()
+
+
+    def test_sequence_files(self):
+        pattern, files = images.sequence_files(self.frames)
+        self.assertEqual(pattern, os.path.join(self.frames, '*.png'))
+        self.assertEqual(len(files), 10)
+
+        pattern, files = images.sequence_files(os.path.join(self.frames, 'frame%04d.png'))
+        self.assertEqual(os.path.basename(files[0]), 'frame0003.png')
+        self.assertEqual(os.path.basename(files[-1]), 'frame0012.png')
+
+        with self.assertRaises(ValueError):
+            images.sequence_files(os.path.join(self.frames, 'frame0003.png'))
+
+        # only the file name is read as a pattern
+        shots = os.path.join(self.tmpdir, 'shots [100%]')
+        shutil.copytree(self.frames, shots)
+
+        pattern, files = images.sequence_files(os.path.join(shots, 'frame%04d.png'))
+        self.assertEqual(pattern, os.path.join(self.tmpdir, 'shots [100%%]', 'frame%04d.png'))
+        self.assertEqual(files[0], os.path.join(shots, 'frame0003.png'))
+
+        pattern, files = images.sequence_files(shots)
+        self.assertEqual(pattern, os.path.join(self.tmpdir, 'shots [[]100%]', '*.png'))
+        self.assertEqual(len(files), 10)
+
+
+    def test_image_sequence(self):
+        clip = ImageSequence(os.path.join(self.frames, '*.png'), fps=24)
+        self.assertTrue(clip.resource.startswith('avformat:image2:'))
+        self.assertIn('pattern_type=glob', clip.resource)
+        self.assertIn('framerate=24/1', clip.resource)
+        self.assertEqual(clip.kwargs['threads'], 0)
+
+        # the profile comes from the files, without probing with melt
+        self.assertEqual((clip.width, clip.height, clip.total_frames), (64, 48, 10))
+        self.assertEqual(clip.original_fps, 24.0)
+
+        clip = ImageSequence(os.path.join(self.frames, 'frame%04d.png'), fps=29.97)
+        self.assertIn('start_number=3', clip.resource)
+        self.assertIn('framerate=30000/1001', clip.resource)
+
+        with self.assertRaises(ValueError):
+            ImageSequence(os.path.join(self.frames, '*.jpg'))
+
+
+    def test_still(self):
+        source = os.path.join(self.tmpdir, 'wide.png')
+        Image.new('RGB', (400, 100), 'red').save(source)
+
+        clip = Still(source, end=5, resolution=(320, 180))
+        self.assertTrue(clip.resource.startswith(config.CACHE_DIR))
+        self.assertEqual(clip.source, source)
+
+        image = Image.open(clip.resource)
+        self.assertEqual(image.size, (320, 180))
+        # contained with transparent borders above and below
+        self.assertEqual(image.getpixel((160, 0))[3], 0)
+        self.assertEqual(image.getpixel((160, 90)), (255, 0, 0, 255))
+
+        # scaled once and reused
+        self.assertEqual(Still(source, resolution=(320, 180)).resource, clip.resource)
+
+        cover = Image.open(images.still_image(source, 320, 180, fit='cover'))
+        self.assertEqual(cover.getpixel((160, 0)), (255, 0, 0, 255))
+
+        with self.assertRaises(ValueError):
+            images.still_image(source, 320, 180, fit='squash')
+
+        with self.assertRaises(ValueError):
+            Still(source, fit='squash')
+
+
+    def test_still_composition_size(self):
+        source = os.path.join(self.tmpdir, 'wide.png')
+        Image.new('RGB', (400, 100), 'red').save(source)
+
+        # without a resolution, the still is scaled to the composition it's rendered in
+        clip = Still(source, end=5)
+        self.assertEqual(clip.resource, source)
+
+        clip.prepare(640, 360)
+        self.assertEqual(Image.open(clip.resource).size, (640, 360))
+        self.assertEqual(clip.resource, images.still_image(source, 640, 360))
+
+
+if __name__ == '__main__':
+    unittest.main()
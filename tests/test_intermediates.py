@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+from fractions import Fraction
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import Clip, config, intermediates
+
+
+class TestIntermediates(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(self.tmpdir, 'cache')
+        self.addCleanup(setattr, config, 'CACHE_DIR', cache_dir)
+
+        self.video = os.path.join(self.tmpdir, 'video.mp4')
+        with open(self.video, 'wb') as outfile:
+            outfile.write(b'not really a video')
+
+
+    def fake_call(self, args):
+        self.calls.append(args)
+        open(args[-1], 'wb').close()
+        return 0
+
+
+    def test_atempo(self):
+        self.assertEqual(intermediates.atempo(0.25), ['atempo=0.5', 'atempo=0.5'])
+        self.assertEqual(intermediates.atempo(3), ['atempo=2.0', 'atempo=1.5'])
+
+
+    def test_plan(self):
+        self.assertIsNone(intermediates.plan(2))
+        self.assertEqual(intermediates.plan(-1, length=10), (['reverse'], ['areverse'], 1))
+        self.assertEqual(intermediates.plan(-2, length=3600), ([], [], -2))
+        self.assertEqual(intermediates.plan(8), ([], [], 8))
+
+        video, audio, speed = intermediates.plan(0.5, 'interpolate', fps=Fraction(30000, 1001))
+        self.assertEqual(video, ['setpts=PTS/0.5', 'minterpolate=fps=30000/1001:mi_mode=mci'])
+        self.assertEqual(audio, ['atempo=0.5'])
+        self.assertEqual(speed, 1.0)
+
+        with self.assertRaises(ValueError):
+            intermediates.plan(0.5, 'smooth')
+
+
+    def test_build(self):
+        self.calls = []
+        with mock.patch('vidpy.intermediates.call', side_effect=self.fake_call):
+            first = intermediates.build(self.video, ['reverse'], ['areverse'], start=10, end=12.5)
+            second = intermediates.build(self.video, ['reverse'], ['areverse'], start=10, end=12.5)
+
+        self.assertEqual(first, second)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(len(self.calls), 1)
+
+        args = self.calls[0]
+        self.assertEqual(args[args.index('-ss') + 1], '10.000000')
+        self.assertEqual(args[args.index('-t') + 1], '2.500000')
+        self.assertEqual(args[args.index('-vf') + 1], 'reverse')
+
+
+    def test_prune(self):
+        directory = os.path.join(config.CACHE_DIR, 'intermediates')
+        os.makedirs(directory)
+        paths = []
+        for i in range(4):
+            path = os.path.join(directory, 'clip{}.mov'.format(i))
+            with open(path, 'wb') as outfile:
+                outfile.write(b'x' * 1024 * 1024)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+
+        # an intermediate that's still being rendered
+        open(os.path.join(directory, 'clip9.mov.123.tmp.mov'), 'wb').close()
+
+        # the oldest file is kept if it's the one about to be used
+        removed = intermediates.prune(limit=2.5, keep=paths[0])
+        self.assertEqual(removed, paths[1:3])
+        self.assertEqual(sorted(os.listdir(directory)), ['clip0.mov', 'clip3.mov', 'clip9.mov.123.tmp.mov'])
+
+        self.assertEqual(intermediates.prune(limit=100), [])
+
+
+    def test_clip_prepare(self):
+        self.calls = []
+        clip = Clip(self.video, start=10, end=12).speed(-2)
+        self.assertIn('timewarp:-2:{}'.format(self.video), clip.args())
+
+        with mock.patch('vidpy.intermediates.call', side_effect=self.fake_call):
+            clip.prepare()
+
+        resource, speed = clip._intermediate
+        self.assertEqual(speed, 2)
+        self.assertEqual(clip.args()[1:3], ['timewarp:2:{}'.format(resource), 'in=":0.000000"'])
+
+        # regular speeds play straight from the source
+        clip = Clip(self.video, end=12).speed(2).prepare()
+        self.assertIsNone(clip._intermediate)
+
+        config.INTERMEDIATES = False
+        try:
+            clip = Clip(self.video, end=12).speed(-1).prepare()
+            self.assertIsNone(clip._intermediate)
+        finally:
+            config.INTERMEDIATES = True
+
+
+if __name__ == '__main__':
+    unittest.main()
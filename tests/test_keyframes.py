@@ -0,0 +1,50 @@
+import unittest
+from vidpy import keyframes, utils, Clip
+
+
+class TestKeyframes(unittest.TestCase):
+    def test_scalar(self):
+        self.assertEqual(keyframes.scalar([0, 10, 20], [0, 0.5, 1.25]), '0=0;10=0.5;20=1.25')
+        self.assertEqual(keyframes.scalar([0, 0.5], [1, 2], fps=30), '0=1;15=2')
+
+
+    def test_rect(self):
+        self.assertEqual(keyframes.rect([0, 10], [0, 50], [0, 25], [100, 200], [50, 100]), '0=0/0:100x50;10=50/25:200x100')
+        self.assertEqual(keyframes.rect([0], [1.5], [2], [3], [4], opacity=[0.5]), '0=1.5/2:3x4:50')
+
+
+    def test_simplify(self):
+        times = list(range(100))
+        line = [t * 2.0 for t in times]
+        self.assertEqual(keyframes.simplify(times, [line], 0.01), [0, 99])
+
+        corner = [min(t, 50) for t in times]
+        self.assertEqual(keyframes.simplify(times, [line, corner], 0.01), [0, 50, 99])
+        self.assertEqual(keyframes.scalar(times, corner, tolerance=0.01), '0=0;50=50;99=50')
+
+        np = utils.np
+        try:
+            utils.np = None
+            keyframes.np = None
+            self.assertEqual(keyframes.simplify(times, [line, corner], 0.01), [0, 50, 99])
+            self.assertEqual(keyframes.scalar(times, corner, tolerance=0.01), '0=0;50=50;99=50')
+        finally:
+            utils.np = np
+            keyframes.np = np
+
+
+    def test_clip_keyframes(self):
+        clip = Clip('video.mp4').move_keyframes([0, 1, 2], [0, 5, 10], [0, 0, 0], [10, 10, 10], [10, 10, 10], tolerance=0.1)
+        self.assertEqual(clip.fxs[0][1]['transition.geometry'], '0=0/0:10x10;2=10/0:10x10')
+
+        clip = Clip('video.mp4').animate('brightness', 'level', [0, 10], [0, 1])
+        self.assertEqual(clip.fxs[0], ('brightness', {'level': '0=0;10=1'}))
+
+        if utils.np is not None:
+            rows = utils.np.array([[0, 0, 0, 10, 10], [5, 10, 10, 20, 20]])
+            clip = Clip('video.mp4').move(rows)
+            self.assertEqual(clip.fxs[0][1]['transition.geometry'], '0=0/0:10x10;5=10/10:20x20')
+
+
+if __name__ == '__main__':
+    unittest.main()
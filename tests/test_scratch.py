@@ -0,0 +1,119 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from subprocess import check_output
+from vidpy import scratch, config
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+def find_melt():
+    '''Returns the path to melt, or None if it isn't installed'''
+
+    for candidate in config.PATHS:
+        for directory in [''] + os.environ.get('PATH', '').split(os.pathsep):
+            path = os.path.join(directory, candidate)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+    return None
+
+
+MELT = find_melt()
+
+
+class TestScratch(unittest.TestCase):
+    def setUp(self):
+        scratch.cleanup()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        config.SCRATCH_DIR = os.path.join(self.tmpdir, 'scratch')
+        self.addCleanup(setattr, config, 'SCRATCH_DIR', None)
+        self.addCleanup(setattr, config, 'SCRATCH_QUOTA', None)
+        self.addCleanup(scratch.cleanup)
+
+
+    def test_directory(self):
+        directory = scratch.directory()
+        self.assertEqual(os.path.dirname(directory), config.SCRATCH_DIR)
+
+        filename = scratch.write(b'<mlt/>')
+        self.assertTrue(filename.startswith(directory))
+
+        # changing the scratch dir makes a new directory, and cleanup removes both
+        config.SCRATCH_DIR = os.path.join(self.tmpdir, 'other')
+        other = scratch.directory()
+        self.assertNotEqual(other, directory)
+        scratch.write(b'<mlt/>')
+        self.assertEqual(scratch.usage(), 12)
+
+        scratch.cleanup()
+        self.assertFalse(os.path.exists(directory))
+        self.assertFalse(os.path.exists(other))
+
+
+    def test_ram(self):
+        config.SCRATCH_DIR = 'ram'
+        base = scratch.base_directory()
+        self.assertIn(base, scratch.RAM_DIRS + (None,))
+
+
+    def test_job(self):
+        with scratch.Job() as job:
+            resource = job.xml_resource(b'<mlt/>')
+            self.assertEqual(resource, 'xml-string:<mlt/>')
+            self.assertEqual(scratch.inline_xml(resource), '<mlt/>')
+
+            limit = config.INLINE_XML_LIMIT
+            config.INLINE_XML_LIMIT = 5
+            try:
+                filename = job.xml_resource(b'<mlt/>')
+            finally:
+                config.INLINE_XML_LIMIT = limit
+
+            self.assertEqual(os.path.dirname(filename), job.directory)
+            self.assertTrue(os.path.exists(filename))
+
+        self.assertFalse(os.path.exists(job.directory))
+
+
+    def test_windows(self):
+        # the whole command line is limited to about 32K characters on Windows
+        with mock.patch.object(sys, 'platform', 'win32'), scratch.Job() as job:
+            filename = job.xml_resource(b'<mlt/>')
+            self.assertIsNone(scratch.inline_xml(filename))
+            self.assertTrue(os.path.exists(filename))
+
+
+    @unittest.skipIf(MELT is None or sys.platform == 'win32', 'melt is not installed')
+    def test_melt_reads_inline_xml(self):
+        xml = (b'<mlt><producer id="red"><property name="mlt_service">color</property>'
+               b'<property name="resource">#ff0000</property></producer>'
+               b'<playlist id="main"><entry producer="red" in="0" out="4" /></playlist></mlt>')
+
+        with scratch.Job() as job:
+            resource = job.xml_resource(xml)
+            self.assertIsNotNone(scratch.inline_xml(resource))
+
+            # melt fails to load the resource if it reads it as a file name
+            with open(os.devnull, 'w') as devnull:
+                output = check_output([MELT, resource, '-consumer', 'xml'], stderr=devnull)
+
+        self.assertIn(b'#ff0000', output)
+
+
+    def test_quota(self):
+        config.SCRATCH_QUOTA = 0.001
+        scratch.write(b'x' * 1000)
+        self.assertEqual(scratch.usage(), 1000)
+
+        with self.assertRaises(scratch.ScratchFullError):
+            scratch.write(b'x' * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import Clip, config, seeking, utils
+
+PACKETS = b'''0.000000,K__
+0.033333,___
+2.000000,K__
+2.033333,___
+4.000000,K_
+6.000000,K__
+'''
+
+
+class TestSeeking(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(self.tmpdir, 'cache')
+        self.addCleanup(setattr, config, 'CACHE_DIR', cache_dir)
+        self.addCleanup(seeking._indexes.clear)
+
+        self.video = os.path.join(self.tmpdir, 'long.mp4')
+        with open(self.video, 'wb') as outfile:
+            outfile.write(b'not really a video')
+
+        patcher = mock.patch('vidpy.seeking.check_output', return_value=PACKETS)
+        self.check_output = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_keyframes(self):
+        self.assertEqual(seeking.keyframes(self.video), [0.0, 2.0, 4.0, 6.0])
+        self.assertNotIn('-read_intervals', self.check_output.call_args[0][0])
+
+        # the whole file is indexed now
+        self.assertEqual(seeking.keyframes(self.video, 2, 22), [0.0, 2.0, 4.0, 6.0])
+        self.assertEqual(self.check_output.call_count, 1)
+
+
+    def test_windows(self):
+        # only the packets around a time are read
+        self.assertEqual(seeking.keyframes(self.video, 2, 22), [0.0, 2.0, 4.0, 6.0])
+        args = self.check_output.call_args[0][0]
+        self.assertEqual(args[args.index('-read_intervals') + 1], '2.000000%22.000000')
+
+        # ranges inside a span that was read come from the index, in memory or on disk
+        self.assertEqual(seeking.keyframes(self.video, 1, 12), [0.0, 2.0, 4.0, 6.0])
+        seeking._indexes.clear()
+        self.assertAlmostEqual(seeking.seek_cost(self.video, 3.5), 1.5)
+        self.assertEqual(self.check_output.call_count, 1)
+
+        # other windows are read and merged into the same index
+        self.check_output.return_value = b'28.000000,K__\n29.000000,___\n32.000000,K__\n'
+        self.assertAlmostEqual(seeking.seek_cost(self.video, 30), 2)
+        args = self.check_output.call_args[0][0]
+        self.assertEqual(args[args.index('-read_intervals') + 1], '20.000000%40.000000')
+        self.assertEqual(seeking._indexes[utils.file_fingerprint(self.video)]['spans'], [[0.0, 40.0]])
+        self.assertEqual(seeking.snap(self.video, 29, 'after'), 32)
+        self.assertEqual(self.check_output.call_count, 2)
+
+
+    def test_seek_cost(self):
+        self.assertAlmostEqual(seeking.seek_cost(self.video, 3.5), 1.5)
+        self.assertAlmostEqual(seeking.seek_cost(self.video, 4), 0)
+        self.assertAlmostEqual(Clip(self.video, start=7).seek_cost(), 1)
+
+        # no keyframe within the window, so at least that much is decoded
+        self.check_output.return_value = b'20.033333,___\n'
+        self.assertAlmostEqual(seeking.seek_cost(self.video, 25), seeking.WINDOW)
+
+
+    def test_snap(self):
+        self.assertEqual(seeking.snap(self.video, 3.5), 4)
+        self.assertEqual(seeking.snap(self.video, 2.9), 2)
+        self.assertEqual(seeking.snap(self.video, 3.5, 'before'), 2)
+        self.assertEqual(seeking.snap(self.video, 2.1, 'after'), 4)
+        self.assertEqual(seeking.snap(self.video, 7, 'after'), 6)
+        self.assertEqual(seeking.suggest(self.video, 3.9, window=2), [4, 2])
+
+        clip = Clip(self.video, start=5.5).snap('before')
+        self.assertEqual(clip.start, 4)
+
+
+    def test_mezzanine(self):
+        self.assertFalse(config.MEZZANINES)
+        config.MEZZANINES = True
+        self.addCleanup(setattr, config, 'MEZZANINES', False)
+        calls = []
+
+        def fake_call(args):
+            calls.append(args)
+            open(args[-1], 'wb').close()
+            return 0
+
+        with mock.patch('vidpy.intermediates.call', side_effect=fake_call):
+            # starts on a keyframe, played once
+            self.assertIsNone(Clip(self.video, start=4, end=5).prepare()._intermediate)
+
+            # starts far from a keyframe
+            clip = Clip(self.video, start=8.5, end=9).prepare()
+            self.assertIsNotNone(clip._intermediate)
+
+            # repeated
+            clip = Clip(self.video, start=4, end=5).repeat(3).prepare()
+            self.assertIsNotNone(clip._intermediate)
+
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
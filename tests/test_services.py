@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from vidpy import Composition, Clip, config, services
+
+
+class TestServices(unittest.TestCase):
+    def setUp(self):
+        config.MELT_BINARY = 'melt'
+        services._indexes[services._binary_key()] = {
+            'filters': frozenset(['affine', 'brightness']),
+            'transitions': frozenset(['composite', 'mix']),
+            'producers': frozenset(['color']),
+            'consumers': frozenset(['avformat']),
+        }
+
+
+    def tearDown(self):
+        services._indexes.clear()
+
+
+    def test_missing_services(self):
+        clip = Clip('video.mp4').fadein(1).glow()
+        clip.transition('webvfx', {})
+        missing = services.missing_services([clip])
+        self.assertEqual([(kind, name) for c, kind, name in missing], [('filters', 'frei0r.glow'), ('transitions', 'webvfx')])
+        self.assertTrue(services.is_available('affine'))
+        self.assertFalse(services.is_available('frei0r.glow'))
+
+
+    def test_policies(self):
+        clip = Clip('video.mp4').glow().fadein(1)
+        Composition([clip]).check_services('warn')
+        self.assertEqual(len(clip.fxs), 2)
+
+        Composition([clip]).check_services('drop')
+        self.assertEqual([name for name, params in clip.fxs], ['brightness'])
+
+        clip = Clip('video.mp4').glow()
+        Composition([clip]).check_services({'frei0r.glow': ('affine', {})})
+        self.assertEqual(clip.fxs, [('affine', {})])
+
+        clip = Clip('video.mp4').glow()
+        with self.assertRaises(services.MissingServiceError):
+            Composition([clip]).check_services('fail')
+
+        self.assertEqual(Composition([Clip('video.mp4').glow()]).check_services('ignore'), [])
+
+
+    def test_index_per_binary(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(tmpdir, 'cache')
+        self.addCleanup(setattr, config, 'CACHE_DIR', cache_dir)
+        self.addCleanup(setattr, config, 'MELT_BINARY', 'melt')
+
+        # two builds of the same version with different modules
+        found = {}
+        for name, modules in (('distro', ['affine']), ('custom', ['affine', 'frei0r.glow'])):
+            binary = os.path.join(tmpdir, name, 'melt')
+            os.makedirs(os.path.dirname(binary))
+            open(binary, 'w').close()
+            config.MELT_BINARY = binary
+            with mock.patch('vidpy.services.melt_version', return_value='7.0.0'), \
+                    mock.patch('vidpy.services.query_services', return_value=modules):
+                found[name] = services.get_index()['filters']
+            services._indexes.clear()
+
+        self.assertEqual(found['distro'], frozenset(['affine']))
+        self.assertEqual(found['custom'], frozenset(['affine', 'frei0r.glow']))
+        self.assertEqual(len(os.listdir(config.CACHE_DIR)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
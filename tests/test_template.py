@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from xml.etree.ElementTree import fromstring
+from vidpy import Composition, Template, config, scratch
+
+XML = b'''<mlt root="/work">
+  <profile width="1280" height="720" frame_rate_num="30" frame_rate_den="1" />
+  <producer id="producer1"><property name="resource">videos/hand1.mp4</property></producer>
+  <filter><property name="argument">Sample Title costs $5</property><property name="fgcolour">#ff0000</property></filter>
+</mlt>'''
+
+
+class TestTemplate(unittest.TestCase):
+    def template(self):
+        comp = Composition([], duration=3)
+        with mock.patch.object(Composition, 'xml', return_value=XML):
+            return comp.to_template(title='Sample Title', video='videos/hand1.mp4', color='#ff0000')
+
+
+    def test_to_template(self):
+        template = self.template()
+        self.assertEqual(template.placeholders, ['color', 'title', 'video'])
+        self.assertEqual(template.duration, ':3.000000')
+
+        xml = fromstring(template.substitute(title='Tom & Jerry', video='/videos/b.mov', color='#00ff00'))
+        self.assertEqual(xml.find('./producer/property').text, '/videos/b.mov')
+        self.assertEqual([p.text for p in xml.findall('./filter/property')], ['Tom & Jerry costs $5', '#00ff00'])
+
+        with self.assertRaises(KeyError):
+            template.substitute(title='Hi')
+
+        comp = Composition([], duration=3)
+        with mock.patch.object(Composition, 'xml', return_value=XML):
+            with self.assertRaises(ValueError):
+                comp.to_template(title='Not in the composition')
+
+
+    def test_save_load(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = self.template().save(os.path.join(tmpdir, 'template.xml'))
+            template = Template.load(filename)
+            self.assertEqual(template.duration, ':3.000000')
+            self.assertEqual(template.placeholders, ['color', 'title', 'video'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_render_many(self):
+        config.MELT_BINARY = 'melt'
+        template = self.template()
+        rendered = []
+
+        def fake_call(args):
+            # small documents go to melt as xml strings
+            rendered.append((args[-1], fromstring(scratch.inline_xml(args[1]).encode('utf-8')).find('./producer/property').text))
+            return 0
+
+        rows = [{'filename': 'out{}.mp4'.format(i), 'title': str(i), 'video': 'v{}.mp4'.format(i), 'color': '#000000'} for i in range(4)]
+        with mock.patch('vidpy.template.call', side_effect=fake_call), mock.patch('vidpy.template.check_melt'):
+            filenames = template.render_many(rows, workers=2)
+
+        self.assertEqual(filenames, ['out0.mp4', 'out1.mp4', 'out2.mp4', 'out3.mp4'])
+        self.assertEqual(sorted(rendered), [('avformat:out{}.mp4'.format(i), 'v{}.mp4'.format(i)) for i in range(4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
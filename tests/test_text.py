@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from PIL import Image, ImageFont
+from vidpy import Clip, Text, config, rasterize
+
+
+def default_font(family, size, weight=400, style='normal'):
+    return ImageFont.load_default()
+
+
+class TestText(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(config.CACHE_DIR)
+        config.CACHE_DIR = self.cache_dir
+
+
+    def test_parse_color(self):
+        self.assertEqual(rasterize.parse_color('#ff0000'), (255, 0, 0, 255))
+        self.assertEqual(rasterize.parse_color('0x00000000'), (0, 0, 0, 0))
+        self.assertEqual(rasterize.parse_color('#11223380'), (17, 34, 51, 128))
+
+
+    def test_render_text(self):
+        with mock.patch('vidpy.rasterize.find_font', side_effect=default_font):
+            image = rasterize.render_text('Hello', 200, 100, size=20, halign='left', valign='top', bbox=(100, 50, 100, 50))
+
+        self.assertEqual(image.mode, 'RGBA')
+        left, top, right, bottom = image.getbbox()
+        self.assertTrue(left >= 100 and top >= 50)
+        self.assertTrue(right <= 200 and bottom <= 100)
+
+        # outlines are drawn around each line, in the outline color
+        with mock.patch('vidpy.rasterize.find_font', side_effect=default_font):
+            image = rasterize.render_text('Hello\nWorld', 200, 100, color='#ffffff', olcolor='#ff0000', outline=2)
+
+        colors = set(color for count, color in image.getcolors(200 * 100))
+        self.assertIn((255, 0, 0, 255), colors)
+        self.assertTrue(any(g > 200 and b > 200 and a == 255 for r, g, b, a in colors))
+        left, top, right, bottom = image.getbbox()
+        self.assertTrue(bottom - top > 20)
+
+
+    def test_prerendered_text(self):
+        with mock.patch('vidpy.rasterize.find_font', side_effect=default_font):
+            text = Text('Hello', size=40, prerender=True, resolution=(320, 180))
+            again = Text('Hello', size=40, prerender=True, resolution=(320, 180))
+            other = Text('Hello', size=40, color='#ff0000', prerender=True, resolution=(320, 180))
+
+        self.assertEqual(text.fxs, [])
+        self.assertTrue(text.resource.endswith('.png'))
+        self.assertEqual(Image.open(text.resource).size, (320, 180))
+        self.assertEqual(text.resource, again.resource)
+        self.assertNotEqual(text.resource, other.resource)
+
+
+    def test_prerender_at_composition_size(self):
+        with mock.patch('vidpy.rasterize.find_font', side_effect=default_font), \
+                mock.patch('vidpy.clip.find_font', side_effect=default_font):
+            text = Text('Hello', size=40, prerender=True)
+            clip = Clip('video.mp4').text('Hi', size=40, prerender=True).fadein(1)
+
+            # nothing is drawn until the composition's size is known
+            self.assertEqual(text.fused_fxs()[0][0], 'dynamictext')
+            text.prepare(640, 360)
+            clip.prepare(640, 360)
+
+        name, params = text.fused_fxs()[0]
+        self.assertEqual(name, 'watermark')
+        self.assertEqual(Image.open(params['resource']).size, (640, 360))
+        self.assertEqual([name for name, params in clip.fused_fxs()], ['watermark', 'brightness'])
+
+        text.prepare()
+        self.assertEqual(text.fused_fxs()[0][0], 'dynamictext')
+
+
+    def test_dynamic_text(self):
+        with mock.patch('vidpy.clip.find_font', side_effect=default_font):
+            text = Text('#timecode#', prerender=True)
+        self.assertEqual(text.resource, 'color:#00000000')
+        self.assertEqual(text.fxs[0][0], 'dynamictext')
+
+        # melt draws text by default
+        text = Text('Hello')
+        self.assertEqual(text.fxs[0][0], 'dynamictext')
+        self.assertEqual(text._text_images, [])
+
+
+    def test_missing_font(self):
+        with mock.patch('vidpy.clip.find_font', return_value=None):
+            with self.assertRaises(ValueError):
+                Text('Hello', prerender=True)
+            with self.assertRaises(ValueError):
+                Clip('video.mp4').text('Hello', prerender=True)
+
+
+    def test_find_font(self):
+        rasterize._fonts.clear()
+        self.addCleanup(rasterize._fonts.clear)
+
+        # fontconfig suggests a different family when the one asked for isn't installed
+        with mock.patch('vidpy.rasterize.check_output', return_value=b'/fonts/DejaVuSans.ttf|DejaVu Sans'), \
+                mock.patch('vidpy.rasterize.ImageFont.truetype', side_effect=IOError) as truetype:
+            self.assertIsNone(rasterize.find_font('Nonexistent Sans', 20))
+        self.assertEqual([c[0][0] for c in truetype.call_args_list], ['Nonexistent Sans'])
+
+        with mock.patch('vidpy.rasterize.check_output', return_value=b'/fonts/DejaVuSans.ttf|DejaVu Sans,DejaVu Sans Book'), \
+                mock.patch('vidpy.rasterize.ImageFont.truetype', return_value='font') as truetype:
+            self.assertEqual(rasterize.find_font('dejavu sans', 20), 'font')
+            self.assertEqual(rasterize.find_font('Sans', 20), 'font')
+        self.assertEqual(truetype.call_args_list[0][0][0], '/fonts/DejaVuSans.ttf')
+        self.assertEqual(truetype.call_args_list[1][0][0], '/fonts/DejaVuSans.ttf')
+
+
+if __name__ == '__main__':
+    unittest.main()
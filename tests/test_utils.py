@@ -1,5 +1,8 @@
 import unittest
 import os
+import shutil
+import tempfile
+from PIL import Image
 from vidpy import utils
 
 class TestUtils(unittest.TestCase):
@@ -30,6 +33,103 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(s(1) / 2, 0.5)
 
 
+    def test_timebase(self):
+        tb = utils.Timebase(30)
+        self.assertEqual(tb.to_frame(1.1), 33)
+        self.assertIsInstance(tb.to_frame(1.1), utils.Frame)
+        self.assertEqual(tb.to_frame(utils.Frame(7)), 7)
+        self.assertEqual(tb.to_seconds(45), 1.5)
+        self.assertIsInstance(tb.to_seconds(45), utils.Second)
+        self.assertEqual(tb.snap(1.01), 1.0)
+
+        ntsc = utils.Timebase(29.97)
+        self.assertEqual(ntsc.fps, utils.Fraction(30000, 1001))
+        self.assertEqual(ntsc, utils.Timebase((30000, 1001)))
+        self.assertEqual(ntsc.to_frame(ntsc.to_seconds(107892)), 107892)
+
+        self.assertEqual(utils.Second(2).to_frame(24), 48)
+        self.assertEqual(utils.Frame(48).to_second(24), 2)
+
+        with self.assertRaises(ValueError):
+            utils.Timebase(0)
+
+
+    def test_timebase_arrays(self):
+        tb = utils.Timebase(29.97)
+        seconds = [i * 0.1 for i in range(20000)]
+        frames = list(tb.to_frames(seconds))
+        self.assertEqual(frames, [tb.to_frame(s) for s in seconds])
+        self.assertEqual([tb.to_frame(s) for s in tb.frames_to_seconds(frames)], frames)
+
+
+    def test_timebase_half_frames(self):
+        # times halfway between two frames round up in every path
+        self.assertEqual(utils.Timebase(5).to_frame(0.3), 2)
+        self.assertEqual(list(utils.Timebase(5).to_frames([0.3])), [2])
+        self.assertEqual(utils.parse_time(':0.300000', 5), 2)
+
+        for fps in (30, 29.97, 24):
+            tb = utils.Timebase(fps)
+            seconds = [float((i + 0.5) / tb.fps) for i in range(5000)]
+            frames = [tb.to_frame(s) for s in seconds]
+            self.assertEqual(list(tb.to_frames(seconds)), frames)
+            self.assertEqual([utils.parse_time(':{!r}'.format(s), fps) for s in seconds], frames)
+
+
+    def test_parse_time(self):
+        self.assertEqual(utils.parse_time('120', 30), 120)
+        self.assertEqual(utils.parse_time(':1.5', 30), 45)
+        self.assertEqual(utils.parse_time('00:01:02.500', 30), 1875)
+        self.assertEqual(utils.parse_time('00:00:02:15', 30), 75)
+        self.assertEqual(utils.parse_time('00:00:02;15', 30), 75)
+
+        # timecode frames count at the nominal rate, and ";" is drop-frame at NTSC rates
+        self.assertEqual(utils.parse_time('00:00:02:15', 29.97), 75)
+        self.assertEqual(utils.parse_time('00:01:00:02', 29.97), 1802)
+        self.assertEqual(utils.parse_time('00:01:00;02', 29.97), 1800)
+        self.assertEqual(utils.parse_time('00:10:00;00', 29.97), 17982)
+        self.assertEqual(utils.parse_time('01:00:00;00', 29.97), 107892)
+        self.assertEqual(utils.parse_time('01:00:00;00', 59.94), 215784)
+        self.assertEqual(utils.parse_time('-00:01:00;02', 29.97), -1800)
+        self.assertEqual(utils.parse_time(utils.Second(2), 25), 50)
+
+
+    def test_border_color(self):
+        width, height = 8, 6
+        frame = bytearray(b'\x00\xff\x00' * width * height)
+        # some noise on the edge, and a subject in the middle
+        frame[0:3] = b'\xff\x00\x00'
+        for y in range(2, 4):
+            for x in range(2, 6):
+                i = (y * width + x) * 3
+                frame[i:i+3] = b'\x10\x20\x30'
+
+        self.assertEqual(utils.border_color([bytes(frame)], width, height, border=1), (0, 255, 0))
+        self.assertEqual(utils.border_color([bytes(frame)], width, height, border=0), (255, 0, 0))
+
+        np = utils.np
+        try:
+            utils.np = None
+            self.assertEqual(utils.border_color([bytes(frame)], width, height, border=1), (0, 255, 0))
+        finally:
+            utils.np = np
+
+
+    def test_file_fingerprint(self):
+        self.assertEqual(utils.file_fingerprint(__file__), utils.file_fingerprint(__file__))
+        self.assertNotEqual(utils.file_fingerprint(__file__), utils.file_fingerprint('color:red'))
+
+
+    def test_save_image(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        filename = os.path.join(directory, 'red.png')
+        self.assertEqual(utils.save_image(Image.new('RGBA', (4, 4), 'red'), filename), filename)
+        self.assertEqual(os.listdir(directory), ['red.png'])
+        self.assertEqual(Image.open(filename).getpixel((0, 0)), (255, 0, 0, 255))
+
+
     @unittest.skipIf('TRAVIS' in os.environ and os.environ['TRAVIS'] == 'true', 'Skipping this test on Travis')
     def test_get_melt_profie(self):
         profile = utils.get_melt_profile(os.path.realpath('demos/videos/hand1.mp4'))
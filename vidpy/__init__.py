@@ -5,3 +5,7 @@ from .composition import Composition
 from .text import Text
 from .camera import Camera
 from .color import Color
+from .cutlist import CutList
+from .template import Template
+from .encoding import EncodingProfile
+from .images import ImageSequence, Still
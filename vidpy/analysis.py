@@ -0,0 +1,384 @@
+'''
+Analysis of media files, for generating cuts automatically
+
+Frames and audio samples are streamed into NumPy in batches,
+so files of any length can be analyzed in constant memory. Requires NumPy.
+'''
+
+import os
+import json
+import hashlib
+from functools import partial
+from multiprocessing import Pool
+from subprocess import Popen, PIPE, check_output
+from . import config, scratch
+from .utils import np, cache_path, file_fingerprint, Timebase, Second
+
+if np is None:
+    raise ImportError('vidpy.analysis requires NumPy. Install it with: pip install numpy')
+
+
+def probe_fps(resource):
+    '''Returns the exact frame rate of the first video stream of a file as a Timebase.
+
+    Uses the average frame rate, or the stream's base rate if the average isn't known.
+    '''
+
+    output = check_output([
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=avg_frame_rate,r_frame_rate',
+        '-of', 'default=noprint_wrappers=1',
+        resource
+    ]).decode('utf-8')
+
+    rates = dict(line.strip().split('=', 1) for line in output.splitlines() if '=' in line)
+
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        rate = rates.get(key, '0/0')
+        num, den = rate.split('/') if '/' in rate else (rate, 1)
+        if int(num) > 0 and int(den) > 0:
+            return Timebase((int(num), int(den)))
+
+    raise ValueError('could not find the frame rate of {}'.format(resource))
+
+
+def stream_video(resource, width, height, fps, batch=256):
+    '''Decodes a video with ffmpeg at a fixed size and frame rate.
+
+    Args:
+        resource (str): path to a video
+        width (int): width to scale frames to
+        height (int): height to scale frames to
+        fps (Timebase): frame rate to decode at
+        batch (int): number of frames per array
+
+    Yields:
+        uint8 arrays of shape (frames, height, width, 3)
+    '''
+
+    rate = '{}/{}'.format(fps.fps.numerator, fps.fps.denominator)
+    args = [
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-i', resource,
+        '-an',
+        '-vf', 'scale={}:{},fps={}'.format(width, height, rate),
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-'
+    ]
+
+    framesize = width * height * 3
+    process = Popen(args, stdout=PIPE)
+    finished = False
+
+    try:
+        while True:
+            data = process.stdout.read(framesize * batch)
+            count = len(data) // framesize
+            if count == 0:
+                break
+            yield np.frombuffer(data[:count * framesize], dtype=np.uint8).reshape(count, height, width, 3)
+        finished = True
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    # a failed decode would otherwise look like a short video
+    if finished and process.returncode != 0:
+        raise RuntimeError('ffmpeg could not decode {}'.format(resource))
+
+
+def color_histograms(frames, bits=4):
+    '''Computes a normalized color histogram for each frame in a batch.
+
+    Args:
+        frames: uint8 array of shape (frames, height, width, 3)
+        bits (int): bits per channel to keep, giving 2 ** (bits * 3) bins
+
+    Returns:
+        float array of shape (frames, bins)
+    '''
+
+    count = frames.shape[0]
+    shift = 8 - bits
+    q = (frames >> shift).astype(np.int64)
+    bins = (q[..., 0] << (2 * bits)) | (q[..., 1] << bits) | q[..., 2]
+
+    total = 1 << (3 * bits)
+    bins = bins.reshape(count, -1) + (np.arange(count) * total)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=count * total).reshape(count, total)
+
+    return counts / float(bins.shape[1])
+
+
+def histogram_distances(histograms, previous=None):
+    '''Returns the distance between each histogram and the one before it, between 0 and 1.
+
+    The first distance is measured against previous, or is 0 if previous is None.
+    '''
+
+    if previous is None:
+        previous = histograms[:1]
+    else:
+        previous = previous[None, :]
+
+    before = np.concatenate([previous, histograms[:-1]])
+    return 0.5 * np.abs(histograms - before).sum(axis=1)
+
+
+def _cache_file(kind, resource, params):
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return cache_path(kind, '{}-{}.json'.format(file_fingerprint(resource), key))
+
+
+def detect_scenes(resource, threshold=0.35, min_length=0.5, width=64, height=36, cache=True):
+    '''Finds shot boundaries in a video.
+
+    Compares the color histograms of consecutive frames, and reports a cut wherever they
+    differ by more than the threshold. Results are cached for each file.
+
+    Args:
+        resource (str): path to a video
+        threshold (float): how different two frames must be to count as a cut, between 0 and 1
+        min_length (float): minimum length of a scene in seconds
+        width (int): width to analyze frames at
+        height (int): height to analyze frames at
+        cache (bool): use and save cached results
+
+    Returns:
+        list: Second timestamps of the start of each scene after the first
+    '''
+
+    params = {'threshold': threshold, 'min_length': min_length, 'width': width, 'height': height}
+    cachefile = _cache_file('scenes', resource, params) if cache else None
+
+    if cachefile is not None and os.path.exists(cachefile):
+        with open(cachefile) as infile:
+            return [Second(s) for s in json.load(infile)]
+
+    fps = probe_fps(resource)
+    min_frames = fps.to_frame(min_length)
+
+    cuts = []
+    last_cut = 0
+    position = 0
+    previous = None
+
+    for frames in stream_video(resource, width, height, fps):
+        histograms = color_histograms(frames)
+        distances = histogram_distances(histograms, previous)
+
+        for i in np.nonzero(distances > threshold)[0]:
+            frame = position + int(i)
+            if frame > 0 and frame - last_cut >= min_frames:
+                cuts.append(frame)
+                last_cut = frame
+
+        previous = histograms[-1]
+        position += len(frames)
+
+    scenes = [fps.to_seconds(f) for f in cuts]
+
+    if cachefile is not None:
+        with open(cachefile, 'w') as outfile:
+            json.dump([float(s) for s in scenes], outfile)
+
+    return scenes
+
+
+def detect_scenes_many(resources, processes=None, **kwargs):
+    '''Runs detect_scenes over many files in a process pool.
+
+    Args:
+        resources (list): paths to videos
+        processes (int): number of processes (defaults to the number of cpus)
+        **kwargs: arguments for detect_scenes
+
+    Returns:
+        dict: scene timestamps for each resource
+    '''
+
+    pool = Pool(processes)
+    try:
+        results = pool.map(partial(detect_scenes, **kwargs), resources)
+    finally:
+        pool.close()
+
+    return dict(zip(resources, results))
+
+
+def scene_clips(resource, scenes=None, **kwargs):
+    '''Splits a video into one Clip per scene.
+
+    Args:
+        resource (str): path to a video
+        scenes (list): scene timestamps. If None, they're detected with detect_scenes
+        **kwargs: arguments for detect_scenes
+
+    Returns:
+        list: Clip objects
+    '''
+
+    from .clip import Clip
+
+    if scenes is None:
+        scenes = detect_scenes(resource, **kwargs)
+
+    # melt out-points are inclusive, so each scene ends on the frame before the next cut
+    fps = probe_fps(resource)
+    starts = [0] + list(scenes)
+    ends = [fps.to_seconds(fps.to_frame(s) - 1) for s in scenes] + [None]
+
+    return [Clip(resource, start=start, end=end) for start, end in zip(starts, ends)]
+
+
+def stream_audio(resource, sample_rate=22050, block=65536):
+    '''Decodes the audio of a file or composition with melt, as mono samples.
+
+    Args:
+        resource: path to a media file or melt xml document, or a Composition
+        sample_rate (int): sample rate to decode at
+        block (int): number of samples per array
+
+    Yields:
+        float32 arrays of samples between -1 and 1
+    '''
+
+    job = None
+    if hasattr(resource, 'save_xml'):
+        job = scratch.Job()
+        resource = job.xml_resource(resource.xml())
+
+    args = [
+        config.MELT_BINARY,
+        resource,
+        '-consumer', 'avformat:pipe:1',
+        'f=s16le',
+        'acodec=pcm_s16le',
+        'ar={}'.format(sample_rate),
+        'channels=1',
+        'vn=1',
+        'video_off=1',
+        'real_time=0',
+    ]
+
+    with open(os.devnull, 'wb') as devnull:
+        process = Popen(args, stdout=PIPE, stderr=devnull)
+
+    finished = False
+
+    try:
+        while True:
+            data = process.stdout.read(block * 2)
+            if len(data) < 2:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype='<i2').astype(np.float32) / 32768.0
+        finished = True
+    finally:
+        process.stdout.close()
+        process.wait()
+        if job is not None:
+            job.cleanup()
+
+    if finished and process.returncode != 0:
+        raise RuntimeError('melt could not decode the audio')
+
+
+def frame_signal(samples, frame_length, hop_length):
+    '''Splits samples into overlapping frames without copying them.
+
+    Returns:
+        array of shape (frames, frame_length)
+    '''
+
+    count = 1 + (len(samples) - frame_length) // hop_length
+    if count < 1:
+        return np.zeros((0, frame_length), dtype=samples.dtype)
+    stride = samples.strides[0]
+    return np.lib.stride_tricks.as_strided(samples, shape=(count, frame_length), strides=(hop_length * stride, stride), writeable=False)
+
+
+def pick_peaks(envelope, pre=3, post=3, average=10, delta=0.07, wait=5):
+    '''Finds peaks in an onset envelope.
+
+    A frame is a peak if it's the maximum within pre/post frames, exceeds the mean within
+    average frames by delta (relative to the envelope's maximum), and is at least wait
+    frames after the previous peak.
+
+    Returns:
+        array of frame indexes
+    '''
+
+    if len(envelope) == 0 or envelope.max() <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    envelope = envelope / envelope.max()
+    width = max(pre, post, average)
+    padded = np.pad(envelope, width, mode='edge')
+    windows = frame_signal(padded, 2 * width + 1, 1)
+
+    local_max = windows[:, width - pre:width + post + 1].max(axis=1)
+    local_mean = windows[:, width - average:width + average + 1].mean(axis=1)
+    candidates = np.nonzero((envelope >= local_max) & (envelope >= local_mean + delta))[0]
+
+    peaks = []
+    for i in candidates:
+        if not peaks or i - peaks[-1] >= wait:
+            peaks.append(i)
+
+    return np.array(peaks, dtype=np.int64)
+
+
+def audio_features(resource, sample_rate=22050, frame_length=2048, hop_length=512, **kwargs):
+    '''Computes loudness and onset features of the audio in a file or composition.
+
+    The audio is streamed from melt and analyzed in blocks, so hours of audio use little memory.
+
+    Args:
+        resource: path to a media file or melt xml document, or a Composition
+        sample_rate (int): sample rate to analyze at
+        frame_length (int): samples per analysis frame
+        hop_length (int): samples between the starts of analysis frames
+        **kwargs: arguments for pick_peaks
+
+    Returns:
+        dict: "times" (start of each analysis frame in seconds), "rms", "loudness" (in dBFS),
+            "onset_strength" (spectral flux) arrays, and "onsets" (a list of Second timestamps)
+    '''
+
+    window = np.hanning(frame_length).astype(np.float32)
+    carry = np.zeros(0, dtype=np.float32)
+    previous = None
+    rms = []
+    flux = []
+
+    for block in stream_audio(resource, sample_rate, block=hop_length * 256):
+        samples = np.concatenate([carry, block])
+        frames = frame_signal(samples, frame_length, hop_length)
+        if len(frames) == 0:
+            carry = samples
+            continue
+        carry = samples[len(frames) * hop_length:]
+
+        rms.append(np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1)))
+
+        spectrum = np.abs(np.fft.rfft(frames * window, axis=1))
+        before = np.concatenate([spectrum[:1] if previous is None else previous[None, :], spectrum[:-1]])
+        flux.append(np.maximum(spectrum - before, 0).sum(axis=1))
+        previous = spectrum[-1]
+
+    rms = np.concatenate(rms) if rms else np.zeros(0)
+    flux = np.concatenate(flux) if flux else np.zeros(0)
+    times = np.arange(len(rms)) * float(hop_length) / sample_rate
+
+    return {
+        'times': times,
+        'rms': rms,
+        'loudness': 20 * np.log10(np.maximum(rms, 1e-10)),
+        'onset_strength': flux,
+        'onsets': [Second(times[i]) for i in pick_peaks(flux, **kwargs)],
+    }
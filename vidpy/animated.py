@@ -0,0 +1,213 @@
+'''
+Animated GIF and WebP export
+
+Frames are streamed from melt, duplicates are merged into longer frame durations, and
+GIF frames are quantized as they arrive, so only the much smaller palette images are
+kept in memory. A global palette is built in a first, sampling pass. Pillow crops each
+frame to the region that changed from the previous one when writing the file.
+'''
+
+from collections import deque
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from PIL import Image
+from .frames import tile
+
+# Pillow moved its dither constants into an enum
+FLOYDSTEINBERG = getattr(getattr(Image, 'Dither', Image), 'FLOYDSTEINBERG')
+NO_DITHER = getattr(getattr(Image, 'Dither', Image), 'NONE')
+
+
+def collect_frames(images, step=1.0, convert=None, workers=None):
+    '''Keeps the frames needed for an animation, merging runs of identical frames.
+
+    Args:
+        images: iterable of PIL Images
+        step (float): number of input frames per output frame, to lower the frame rate
+        convert (function): optional function applied to each kept frame (like quantizing it),
+            run in a thread pool while the next frames are read
+        workers (int): number of frames to convert at once (defaults to the number of cpus)
+
+    Returns:
+        (frames, counts) tuple: the distinct frames, and how many output frames each one lasts
+    '''
+
+    frames = []
+    counts = []
+    previous = None
+    next_frame = 0.0
+
+    workers = workers or cpu_count()
+    pool = ThreadPool(workers) if convert is not None else None
+    # frames waiting to be converted are limited, so a fast source can't fill up memory
+    pending = deque()
+
+    try:
+        for i, image in enumerate(images):
+            if i + 1e-9 < next_frame:
+                continue
+            next_frame += step
+
+            data = image.tobytes()
+            if data == previous:
+                counts[-1] += 1
+                continue
+
+            previous = data
+            counts.append(1)
+
+            if pool is None:
+                frames.append(image)
+                continue
+
+            pending.append(pool.apply_async(convert, (image,)))
+            while len(pending) > 2 * workers:
+                frames.append(pending.popleft().get())
+
+        while pending:
+            frames.append(pending.popleft().get())
+    finally:
+        if pool is not None:
+            pool.close()
+
+    return frames, counts
+
+
+def sample_indexes(total, samples=16):
+    '''Picks evenly spaced frame numbers, for building a palette from a few frames.
+
+    Args:
+        total (int): number of frames
+        samples (int): number of frames to pick
+
+    Returns:
+        list: frame numbers, in order
+    '''
+
+    count = max(min(samples, total), 1)
+    return sorted(set(int(i * total / count) for i in range(count)))
+
+
+def build_palette(frames, colors=256, samples=16):
+    '''Builds one palette that suits a whole animation, from evenly spaced frames.
+
+    Returns:
+        PIL.Image: a palette ("P" mode) image, for Image.quantize
+    '''
+
+    count = min(samples, len(frames))
+    picked = [frames[int(i * len(frames) / count)] for i in range(count)]
+    return tile(picked, 1, count).quantize(colors)
+
+
+def quantizer(colors=256, palette=None, dither=True):
+    '''Returns a function that reduces a frame to at most 256 colors.
+
+    Args:
+        colors (int): number of colors in each palette
+        palette (PIL.Image): a shared palette from build_palette, or None for a palette per frame
+        dither (bool): use Floyd-Steinberg dithering
+    '''
+
+    method = FLOYDSTEINBERG if dither else NO_DITHER
+
+    if palette is not None:
+        return lambda frame: frame.quantize(palette=palette, dither=method)
+    return lambda frame: frame.quantize(colors, dither=method)
+
+
+def quantize_frames(frames, colors=256, palette='global', dither=True, workers=None):
+    '''Reduces frames to at most 256 colors, in parallel.
+
+    Args:
+        frames (list): RGB PIL Images
+        colors (int): number of colors in each palette
+        palette (str): "global" to share one palette between all frames (smaller files),
+            or "frame" for a palette per frame (better color)
+        dither (bool): use Floyd-Steinberg dithering
+        workers (int): number of frames to quantize at once (defaults to the number of cpus)
+
+    Returns:
+        list: "P" mode PIL Images
+    '''
+
+    if palette not in ('global', 'frame'):
+        raise ValueError('palette must be "global" or "frame", not {!r}'.format(palette))
+
+    quantize = quantizer(colors, build_palette(frames, colors) if palette == 'global' else None, dither)
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(quantize, frames)
+    finally:
+        pool.close()
+
+
+def frame_durations(counts, frame_ms, resolution=1):
+    '''Converts frame counts to durations in milliseconds.
+
+    Durations are rounded to the format's resolution (10ms for GIF) without
+    letting the rounding errors add up over the animation.
+    '''
+
+    durations = []
+    elapsed = 0
+    position = 0
+    for count in counts:
+        position += count
+        end = int(round(position * frame_ms / resolution)) * resolution
+        durations.append(max(end - elapsed, resolution))
+        elapsed += durations[-1]
+    return durations
+
+
+def save_gif(frames, counts, filename, frame_ms, colors=256, palette='global', dither=True, loop=0, workers=None):
+    '''Writes frames collected with collect_frames as an animated GIF.
+
+    Args:
+        frames (list): RGB PIL Images, or "P" mode images that are already quantized
+        counts (list): how many output frames each image lasts
+        filename (str): the file to save to
+        frame_ms (float): length of one output frame in milliseconds
+        colors (int): number of colors in each palette
+        palette (str): "global" or "frame" (see quantize_frames)
+        dither (bool): use Floyd-Steinberg dithering
+        loop (int): number of times to loop (0 loops forever)
+        workers (int): number of frames to quantize at once
+
+    Returns:
+        filename (str): the path to the saved file
+    '''
+
+    if any(frame.mode != 'P' for frame in frames):
+        frames = quantize_frames(frames, colors, palette, dither, workers)
+    durations = frame_durations(counts, frame_ms, 10)
+
+    frames[0].save(filename, format='GIF', save_all=True, append_images=frames[1:], duration=durations, loop=loop, disposal=1)
+
+    return filename
+
+
+def save_webp(frames, counts, filename, frame_ms, quality=80, lossless=False, method=4, loop=0):
+    '''Writes frames collected with collect_frames as an animated WebP.
+
+    Args:
+        frames (list): RGB PIL Images
+        counts (list): how many output frames each image lasts
+        filename (str): the file to save to
+        frame_ms (float): length of one output frame in milliseconds
+        quality (int): quality between 0 and 100
+        lossless (bool): use lossless compression
+        method (int): compression effort between 0 (fast) and 6 (small)
+        loop (int): number of times to loop (0 loops forever)
+
+    Returns:
+        filename (str): the path to the saved file
+    '''
+
+    durations = frame_durations(counts, frame_ms)
+
+    frames[0].save(filename, format='WEBP', save_all=True, append_images=frames[1:], duration=durations,
+                   loop=loop, quality=quality, lossless=lossless, method=method)
+
+    return filename
@@ -1,18 +1,234 @@
+import os
+import re
+import sys
+import time
+from subprocess import Popen, PIPE
 from .clip import Clip
 
+# default capture format and device for each platform
+PLATFORM_DEFAULTS = {
+    'darwin': ('avfoundation', 0),
+    'linux': ('v4l2', '/dev/video0'),
+    # DirectShow devices are named, so the first video device is looked up with dshow_devices()
+    'win32': ('dshow', None),
+}
+
+# the name each ffmpeg input format uses for the pixel format option
+PIXEL_FORMAT_OPTIONS = {
+    'v4l2': 'input_format',
+    'video4linux2': 'input_format',
+    'avfoundation': 'pixel_format',
+    'dshow': 'pixel_format',
+}
+
+
+def dshow_devices():
+    '''Lists the names of the DirectShow video devices, in the order ffmpeg reports them'''
+
+    process = Popen(['ffmpeg', '-hide_banner', '-list_devices', 'true', '-f', 'dshow', '-i', 'dummy'], stdout=PIPE, stderr=PIPE)
+    output = process.communicate()[1].decode('utf-8', 'replace')
+
+    devices = []
+    section = None
+    for line in output.splitlines():
+        if 'DirectShow video devices' in line:
+            section = 'video'
+        elif 'DirectShow audio devices' in line:
+            section = 'audio'
+        elif 'Alternative name' not in line:
+            # newer ffmpeg versions put the kind after each name instead of using sections
+            match = re.search(r'\]\s+"(.+)"(?:\s+\((\w+)\))?\s*$', line)
+            if match and (match.group(2) or section) == 'video':
+                devices.append(match.group(1))
+
+    return devices
+
+
 class Camera(Clip):
     '''Captures from a camera using ffmpeg
 
-    (Only tested on Mac)
+    Works with avfoundation on Mac, v4l2 on Linux (including v4l2loopback devices) and dshow on Windows.
+    Any other ffmpeg input format can be used too, for example a synthetic source:
+    Camera(avformat='lavfi', device='testsrc=size=1280x720:rate=30')
 
     Args:
-        device: The device to use (by default, 0)
-        avformat: The format to use in ffmpeg (avfoundation by default)
+        device: The device to use (by default, 0 on Mac, /dev/video0 on Linux and the first video device on Windows)
+        avformat: The format to use in ffmpeg (by default, avfoundation on Mac and v4l2 on Linux)
+        pixel_format (str): pixel format to capture in (yuyv422 by default, if the format supports it)
         width (int): width of capture (default 1280)
         height (int): height of capture (default 720)
+        fps (int): frames per second of capture (default 30)
     '''
 
-    def __init__(self, device=0, avformat='avfoundation', pixel_format='yuyv422', width=1280, height=720, fps=30, **kwargs):
-        params = '{}:{}?framerate={}&video_size={}x{}&pixel_format={}'.format(avformat, device, fps, width, height, pixel_format)
+    def __init__(self, device=None, avformat=None, pixel_format='yuyv422', width=1280, height=720, fps=30, **kwargs):
+        platform = 'linux' if sys.platform.startswith('linux') else sys.platform
+        default_format, default_device = PLATFORM_DEFAULTS.get(platform, PLATFORM_DEFAULTS['linux'])
+
+        self.avformat = avformat or default_format
+        self.device = default_device if device is None else device
+
+        if self.device is None and self.avformat == 'dshow':
+            devices = dshow_devices()
+            if not devices:
+                raise ValueError('no DirectShow video devices found, pass one like device="video=Integrated Camera"')
+            self.device = 'video={}'.format(devices[0])
+        self.fps = fps
+
+        # lavfi and other generic inputs take their settings in the device string
+        self.options = []
+        if self.avformat in PIXEL_FORMAT_OPTIONS:
+            self.options = [('framerate', fps), ('video_size', '{}x{}'.format(width, height))]
+            if pixel_format:
+                self.options.append((PIXEL_FORMAT_OPTIONS[self.avformat], pixel_format))
+
+        params = '{}:{}'.format(self.avformat, self.device)
+        if self.options:
+            params += '?' + '&'.join('{}={}'.format(k, v) for k, v in self.options)
+
         Clip.__init__(self, params, **kwargs)
 
+
+    def input_args(self):
+        '''Returns ffmpeg arguments to open the camera as an input'''
+
+        args = ['-f', self.avformat]
+        for key, val in self.options:
+            args += ['-{}'.format(key), str(val)]
+        args += ['-i', str(self.device)]
+        return args
+
+
+    def record(self, directory, segment_time=10, keep=None, vcodec='libx264', preset='ultrafast'):
+        '''Records the camera to a series of short files in the background.
+
+        Finished segments can be used in compositions while the recording continues,
+        so capturing and rendering can happen at the same time.
+
+        Args:
+            directory (str): where to write the segments
+            segment_time (float): length of each segment in seconds
+            keep (int): if set, only keep this many segments, reusing their files like a ring buffer
+            vcodec (str): the video codec to record with
+            preset (str): the encoder preset
+
+        Returns:
+            Recording
+        '''
+
+        return Recording(self, directory, segment_time=segment_time, keep=keep, vcodec=vcodec, preset=preset)
+
+
+class Recording(object):
+    '''A camera recording in progress, split into segments. Create one with Camera.record()
+
+    Args:
+        camera (Camera): the camera to record
+        directory (str): where to write the segments
+        segment_time (float): length of each segment in seconds
+        keep (int): if set, only keep this many segments (at least 2), reusing their files like a ring buffer.
+            One of them is always being written, so keep - 1 are available while recording
+        vcodec (str): the video codec to record with
+        preset (str): the encoder preset
+    '''
+
+    def __init__(self, camera, directory, segment_time=10, keep=None, vcodec='libx264', preset='ultrafast'):
+        if keep is not None and keep < 2:
+            raise ValueError('keep must be at least 2, one segment is always being written')
+
+        self.directory = directory
+        self.keep = keep
+        self.listfile = os.path.join(directory, 'segments.csv')
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        args = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+        args += camera.input_args()
+        args += [
+            '-c:v', vcodec,
+            '-preset', preset,
+            '-force_key_frames', 'expr:gte(t,n_forced*{})'.format(segment_time),
+            '-f', 'segment',
+            '-segment_time', str(segment_time),
+            '-reset_timestamps', '1',
+            '-segment_list', self.listfile,
+            '-segment_list_type', 'csv',
+        ]
+
+        if keep:
+            args += ['-segment_wrap', str(keep)]
+
+        args += [os.path.join(directory, 'segment%05d.mp4')]
+
+        self.process = Popen(args, stdin=PIPE)
+
+
+    def segments(self):
+        '''Returns the finished segments, oldest first
+
+        Returns:
+            list: (path, start, end) tuples, with times in seconds since the recording started
+        '''
+
+        if not os.path.exists(self.listfile):
+            return []
+
+        segments = []
+        with open(self.listfile) as infile:
+            for line in infile:
+                parts = line.strip().split(',')
+                if len(parts) == 3:
+                    segments.append((os.path.join(self.directory, parts[0]), float(parts[1]), float(parts[2])))
+
+        # while recording, the oldest file in the ring is the one being overwritten
+        if self.keep:
+            finished = self.keep if self.process.poll() is not None else self.keep - 1
+            segments = segments[-finished:]
+
+        return segments
+
+
+    def clips(self, **kwargs):
+        '''Returns a Clip for each finished segment, oldest first
+
+        Args:
+            **kwargs: arguments for each Clip
+        '''
+
+        return [Clip(path, **kwargs) for path, start, end in self.segments()]
+
+
+    def wait(self, count=1, timeout=None, poll=0.25):
+        '''Blocks until at least count segments are finished
+
+        Returns:
+            bool: False if the timeout ran out or the recording stopped first
+        '''
+
+        start = time.time()
+        while len(self.segments()) < count:
+            if self.process.poll() is not None:
+                return len(self.segments()) >= count
+            if timeout is not None and time.time() - start > timeout:
+                return False
+            time.sleep(poll)
+        return True
+
+
+    def stop(self):
+        '''Stops recording, finishing the current segment'''
+
+        if self.process.poll() is None:
+            try:
+                self.process.communicate(b'q')
+            except (OSError, ValueError):
+                self.process.terminate()
+                self.process.wait()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.stop()
@@ -1,11 +1,20 @@
 import os
-from .utils import timestamp, get_bg_color, effects_path, get_melt_profile
+from .utils import timestamp, get_bg_color, effects_path, get_melt_profile, xml_profile, Timebase, Frame, np
+from . import config, keyframes, filters, scratch, intermediates, seeking
+from .rasterize import is_dynamic, text_image, find_font
+
+# filters that only touch audio, and are kept when rendering audio only
+AUDIO_FILTERS = ('volume', 'avfilter.volume', 'panner', 'mono', 'channelcopy', 'audiochannels', 'audiomap', 'audiolevel', 'audioseam', 'loudness', 'dynamic_loudness', 'rbpitch')
+AUDIO_FILTER_PREFIXES = ('sox', 'ladspa', 'lv2', 'vst2')
+
+# still image formats that can be used as a mask through the shape filter
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
 
 class Clip(object):
     '''A VidPy clip
 
     Args:
-        resource (str): Path to a video file, audio file, image, or melt xml document
+        resource (str): Path to a video file, audio file, image, or melt xml document. Can also be a Composition or CutList
         service (str): Optional melt service
         start (float): The in-point of the clip in seconds (optional). Setting this will trim from the start of the clip
         end (float): The out-point of the clip in seconds (optional). Setting this will trim from the end of the clip
@@ -22,6 +31,11 @@ class Clip(object):
         self._repeat = None
         self.output_fps = 30
         self._speed = 1.0
+        self._speed_quality = None
+        self._intermediate = None
+        self._text_images = []
+        # whether melt has the shape filter, set by the composition before rendering (None until then)
+        self._shape = None
         self.fxs = []
         self.transitions = []
         self.kwargs = kwargs
@@ -29,9 +43,12 @@ class Clip(object):
         self.mask = None
         self.is_mask = False
 
-        if self.resource.__class__.__name__ == 'Composition':
-            self.resource = self.resource.save_xml()
-            self._temp_resource = True
+        # nested compositions and cut lists are passed to melt as xml, with their profile read
+        # straight from it so melt doesn't need to probe them again
+        if hasattr(self.resource, 'save_xml'):
+            xml = self.resource.xml()
+            self.resource = scratch.xml_resource(xml)
+            self.__profile = xml_profile(xml)
 
 
     def get_profile(self):
@@ -68,6 +85,13 @@ class Clip(object):
         return self.get_profile().get('fps')
 
 
+    @property
+    def timebase(self):
+        '''Exact Timebase of the original clip'''
+        profile = self.get_profile()
+        return Timebase((profile.get('frame_rate_num'), profile.get('frame_rate_den')))
+
+
     @property
     def width(self):
         '''Width of the original clip'''
@@ -124,17 +148,68 @@ class Clip(object):
         return self
 
 
-    def speed(self, speed):
+    def speed(self, speed, quality=None):
         '''Sets the playback speed of the clip.
 
         The speed can be any number between 20 and 0.01.
         Negative values will play video in reverse.
 
+        Reversed and very fast clips are rendered from a cached intermediate file, so melt
+        doesn't have to seek through the source on every frame (see config.INTERMEDIATES).
+
         Args:
             speed (float): playback speed
+            quality (str): "blend" to blend frames, or "interpolate" for motion interpolated slow motion.
+                Both are rendered ahead of time with ffmpeg.
         '''
 
         self._speed = speed
+        self._speed_quality = quality
+        return self
+
+
+    def prepare(self, width=None, height=None):
+        '''Builds any intermediate media the clip needs before rendering. Called by Composition.xml()
+
+        Args:
+            width (int): width of the composition
+            height (int): height of the composition
+        '''
+
+        for pending in self._text_images:
+            params, text, style_params, image = pending
+            pending[3] = text_image(text, width, height, **style_params) if width and height else None
+
+        self._intermediate = None
+
+        if not config.INTERMEDIATES or not isinstance(self.resource, str) or not os.path.isfile(self.resource):
+            return self
+
+        retimed = self._speed != 1.0 or self._speed_quality is not None
+        if not retimed and (self.end is None or not config.MEZZANINES):
+            return self
+
+        start = self._seconds(self.start) if self.start else 0.0
+        end = self._seconds(self.end) if self.end is not None else None
+        length = (end if end is not None else float(self.original_duration)) - start
+
+        steps = None
+        if retimed:
+            fps = self.timebase.fps if self._speed_quality else None
+            steps = intermediates.plan(self._speed, self._speed_quality, length, fps)
+
+        # short cuts that are repeated, or that start far from a keyframe, get a small all-intra copy
+        if steps is None and config.MEZZANINES and end is not None and length <= config.MEZZANINE_MAX_SECONDS:
+            if self._repeat or (start > 0 and seeking.seek_cost(self.resource, start) >= config.MEZZANINE_SEEK_COST):
+                steps = ([], [], self._speed)
+
+        if steps is None:
+            return self
+
+        video_filters, audio_filters, speed = steps
+        resource = intermediates.build(self.resource, video_filters, audio_filters, start, end)
+        self._intermediate = (resource, speed)
+
         return self
 
 
@@ -156,6 +231,41 @@ class Clip(object):
 
 
 
+    def _seconds(self, time):
+        '''Converts a clip time to seconds in the source'''
+
+        if isinstance(time, Frame):
+            return float(self.timebase.to_seconds(time))
+        return float(time)
+
+
+    def seek_cost(self):
+        '''Returns how many seconds of video melt has to decode to reach the clip's in-point'''
+
+        return seeking.seek_cost(self.resource, self._seconds(self.start))
+
+
+    def snap(self, direction='nearest'):
+        '''Moves the clip's in-point to a keyframe, so it can start without decoding earlier frames
+
+        Args:
+            direction (str): "before", "after", or "nearest"
+        '''
+
+        self.start = seeking.snap(self.resource, self._seconds(self.start), direction)
+        return self
+
+
+    def suggest_starts(self, window=2.0):
+        '''Lists keyframes near the clip's in-point, nearest first, as cheaper places to start the clip
+
+        Args:
+            window (float): how far from the in-point to look, in seconds
+        '''
+
+        return seeking.suggest(self.resource, self._seconds(self.start), window)
+
+
     def transition(self, name, params=None):
         '''Adds any melt transition to a track
 
@@ -188,6 +298,33 @@ class Clip(object):
         return self
 
 
+    def static_mask(self):
+        '''Returns the path of the clip's mask if it's a plain still image, or None.
+
+        Still image masks without effects or timing are applied with a single shape filter,
+        which scales the image once and reuses it, instead of an extra track and matte transition.
+        Until the composition has checked that melt has the shape filter, masks always get a track.
+        '''
+
+        mask = self.mask
+        if mask is None or not isinstance(mask.resource, str):
+            return None
+
+        if os.path.splitext(mask.resource)[1].lower() not in IMAGE_EXTENSIONS:
+            return None
+
+        if mask.fxs or mask.transitions or mask.kwargs or mask.mask is not None:
+            return None
+
+        if mask.offset or mask.start or mask.end is not None or mask._repeat or mask._speed != 1.0:
+            return None
+
+        if not self._shape:
+            return None
+
+        return mask.resource
+
+
     def luma(self, start=None, end=None):
         self.transition('luma', {'in': timestamp(start), 'out': timestamp(end)})
         return self
@@ -240,12 +377,12 @@ class Clip(object):
 
         Args:
             amount (float): distance to the color, between 0.0 and 1.0. The higher the number the more will be removed.
-            color (str): The color to remove. If left blank, the top left pixel color will be used.
+            color (str): The color to remove. If left blank, it's estimated from the edges of the clip's first frame.
             blend (float): Chromakey blend value, between 0 and 1
         '''
 
         if color is None:
-            color = get_bg_color(self.resource)
+            color = get_bg_color(self.resource, times=[self._seconds(self.start)])
 
         if blend:
             self.fx('avfilter.chromakey', {
@@ -375,10 +512,13 @@ class Clip(object):
         You can use pixels or percentages (in quotes)
 
         Args:
-            sequence (list): a sequence of (keyframe, x, w, w, h) params
+            sequence (list): a sequence of (keyframe, x, w, w, h) params, or a NumPy array with one row per keyframe
 
         '''
 
+        if np is not None and isinstance(sequence, np.ndarray):
+            return self.move_keyframes(*sequence.T[:5], repeat=repeat, cycle=cycle, mirror=mirror)
+
         args = ['{}={}/{}:{}x{}'.format(*s) for s in sequence]
         args = ';'.join(args)
         self.fx('affine', {
@@ -391,6 +531,55 @@ class Clip(object):
         return self
 
 
+    def move_keyframes(self, times, x, y, w, h, opacity=None, tolerance=None, fps=None, repeat=False, cycle=0, mirror=False):
+        '''Moves the clip around, using arrays of keyframe data.
+
+        Meant for motion driven by data, like audio envelopes or tracking, with
+        thousands of keyframes. Accepts lists or NumPy arrays, in pixels.
+
+        Args:
+            times (list): keyframe times, in frames, or in seconds if fps is given
+            x (list): x position at each keyframe
+            y (list): y position at each keyframe
+            w (list): width at each keyframe
+            h (list): height at each keyframe
+            opacity (list): optional opacity at each keyframe, between 0 and 1
+            tolerance (float): if set, drop keyframes that linear interpolation reproduces within this many pixels
+            fps: frame rate of the times in seconds
+        '''
+
+        self.fx('affine', {
+            'transition.geometry': keyframes.rect(times, x, y, w, h, opacity=opacity, tolerance=tolerance, fps=fps),
+            'background': 'color:0',
+            'transition.repeat_off': 0 if repeat else 1,
+            'transition.cycle': cycle,
+            'transition.mirror': 1 if mirror else 0
+        })
+        return self
+
+
+    def animate(self, name, param, times, values, tolerance=None, fps=None, params=None):
+        '''Adds a melt filter with a keyframed parameter.
+
+        Works for any animatable parameter, for example:
+        clip.animate('brightness', 'level', times, levels)
+
+        Args:
+            name (str): the name of the filter
+            param (str): the parameter to animate
+            times (list): keyframe times, in frames, or in seconds if fps is given
+            values (list): the value at each keyframe
+            tolerance (float): if set, drop keyframes that linear interpolation reproduces within this amount
+            fps: frame rate of the times in seconds
+            params (dict): other parameters for the filter
+        '''
+
+        params = dict(params or {})
+        params[param] = keyframes.scalar(times, values, tolerance=tolerance, fps=fps)
+        self.fx(name, params)
+        return self
+
+
     def zoompan(self, origin, dest, start=0, end=-1):
         '''Zooms and pans the clip over time
 
@@ -422,9 +611,13 @@ class Clip(object):
         return self
 
 
-    def text(self, text, color="#ffffff", bgcolor="0x00000000", olcolor="0x00000000", outline=0, halign="center", valign="middle", pad=0, font="Sans", size=1080, style="normal", weight=400, bbox=(0, 0, '100%', '100%')):
+    def text(self, text, color="#ffffff", bgcolor="0x00000000", olcolor="0x00000000", outline=0, halign="center", valign="middle", pad=0, font="Sans", size=1080, style="normal", weight=400, bbox=(0, 0, '100%', '100%'), prerender=None):
         '''Overlays text on a clip.
 
+        With prerender, static text is drawn once to a cached image the size of the composition
+        when it's rendered, and overlaid with the watermark filter. Text with dynamictext
+        keywords (like #timecode#) is always drawn by melt on every frame.
+
         Args:
             text (str): The text
             font (str): The font family to use
@@ -437,12 +630,17 @@ class Clip(object):
             bbox (list): A bounding box for text to appear in. By default is (0, 0, '100%', '100%'
             halign (str): Horizontal aligment of text. Can be "center" (default), "left" or "right"
             valign (str): Vertical aligment of text. Can be "middle" (default), "top" or "bottom"
+            prerender (bool): Draw static text once to an image. Defaults to config.PRERENDER_TEXT.
+                Raises a ValueError if the font can't be found
 
         '''
 
+        if prerender is None:
+            prerender = config.PRERENDER_TEXT
+
         geometry = '{}/{}:{}x{}'.format(*bbox)
 
-        self.fx('dynamictext', {
+        params = {
             'argument': text,
             'geometry': geometry,
             'family': font,
@@ -456,7 +654,17 @@ class Clip(object):
             'pad': pad,
             'halign': halign,
             'valign': valign
-        })
+        }
+
+        self.fx('dynamictext', params)
+
+        # the image is drawn by prepare(), once the composition's size is known
+        if prerender and not is_dynamic(text):
+            if find_font(font, size, weight, style) is None:
+                raise ValueError('could not find the font {!r}'.format(font))
+            style_params = dict(font=font, size=size, color=color, bgcolor=bgcolor, olcolor=olcolor, outline=outline,
+                                halign=halign, valign=valign, pad=pad, style=style, weight=weight, bbox=bbox)
+            self._text_images.append([params, text, style_params, None])
 
         return self
 
@@ -900,8 +1108,13 @@ class Clip(object):
         return self
 
 
-    def args(self, singletrack=False):
-        '''Returns melt command line arguments as a list'''
+    def args(self, singletrack=False, audio_only=False):
+        '''Returns melt command line arguments as a list
+
+        Args:
+            singletrack (bool): if the clip is part of a singletrack composition
+            audio_only (bool): skip video decoding and video filters
+        '''
 
         args = []
 
@@ -912,22 +1125,44 @@ class Clip(object):
             args += ['-blank', str(self.offset)]
 
         resource = self.resource
+        speed = self._speed
+        start, end = self.start, self.end
 
-        if self._speed != 1.0:
-            resource = 'timewarp:{}:{}'.format(self._speed, resource)
+        # prepared intermediates already cover just the clip's range
+        if self._intermediate is not None:
+            resource, speed = self._intermediate
+            start, end = timestamp(0), None
 
-        args += [resource, 'in="{}"'.format(self.start)]
+        if speed != 1.0:
+            # timewarp needs a file, it can't wrap xml passed as a string
+            xml = scratch.inline_xml(resource)
+            if xml is not None:
+                resource = scratch.write(xml.encode('utf-8'))
+            resource = 'timewarp:{}:{}'.format(speed, resource)
 
-        if self.end:
-            args += ['out="{}"'.format(self.end)]
+        args += [resource, 'in="{}"'.format(start)]
+
+        if end:
+            args += ['out="{}"'.format(end)]
 
         for key in self.kwargs:
             args += ['{}="{}"'.format(key, self.kwargs[key])]
 
+        if audio_only:
+            args += ['video_index="-1"']
+
         if self._repeat:
             args += ['-repeat', str(self._repeat)]
 
-        for fx, fxargs in self.fxs:
+        fxs = self.fused_fxs()
+
+        mask = self.static_mask()
+        if mask is not None:
+            fxs = fxs + [('shape', {'resource': mask, 'use_luminance': 1, 'mix': 100})]
+
+        for fx, fxargs in fxs:
+            if audio_only and not is_audio_filter(fx):
+                continue
             if singletrack:
                 args += ['-attach-clip', fx]
             else:
@@ -941,6 +1176,27 @@ class Clip(object):
         return args
 
 
+    def fused_fxs(self):
+        '''Returns the clip's filters, with prerendered text swapped in and compatible ones merged (see vidpy.filters)'''
+
+        fxs = self.fxs
+
+        # prerendered text is overlaid as an image instead
+        images = dict((id(params), image) for params, text, style_params, image in self._text_images if image is not None)
+        if images:
+            fxs = [('watermark', {'resource': images[id(params)], 'composite.distort': 1}) if id(params) in images else (name, params) for name, params in fxs]
+
+        if not config.FUSE_FILTERS:
+            return fxs
+
+        length = None
+        if self.end is not None and self._speed == 1.0 and not self._repeat:
+            if not isinstance(self.start, Frame) and not isinstance(self.end, Frame):
+                length = float(self.end) - float(self.start)
+
+        return filters.fuse(fxs, length)
+
+
     def transition_args(self, track_number):
         args = []
         for transition, targs in self.transitions:
@@ -951,6 +1207,32 @@ class Clip(object):
         return args
 
 
+    def thumbnails(self, times=None, every=None, width=None, height=None, workers=None):
+        '''Extracts still frames from the clip, with all effects applied.
+
+        Args:
+            times (list): timestamps in seconds to extract
+            every (float): extract a frame every this many seconds instead of using times
+            width (int): width of the thumbnails (defaults to the clip width)
+            height (int): height of the thumbnails (defaults to the clip height)
+            workers (int): number of frames to render at once (defaults to the number of cpus)
+
+        Returns:
+            list: PIL Images
+        '''
+
+        if every is not None:
+            total = float(self.duration)
+            times = [i * every for i in range(int(total // every) + 1) if i * every < total]
+
+        if times is None:
+            times = [0]
+
+        from vidpy import Composition
+        comp = Composition([self])
+        return comp.extract_frames(times, width=width, height=height, workers=workers)
+
+
     def preview(self):
         '''Previews the clip'''
 
@@ -972,5 +1254,37 @@ class Clip(object):
         comp.save(filename)
 
 
+    def save_gif(self, filename, **kwargs):
+        '''Saves the clip as an animated GIF with an optimized palette
+
+        Args:
+            filename (str): The file to save to.
+            kwargs: arguments for Composition.save_gif (width, fps, colors, palette, dither, loop, workers)
+        '''
+
+        from vidpy import Composition
+        comp = Composition([self])
+        return comp.save_gif(filename, **kwargs)
+
+
+    def save_webp(self, filename, **kwargs):
+        '''Saves the clip as an animated WebP
+
+        Args:
+            filename (str): The file to save to.
+            kwargs: arguments for Composition.save_webp (width, fps, quality, lossless, method, loop)
+        '''
+
+        from vidpy import Composition
+        comp = Composition([self])
+        return comp.save_webp(filename, **kwargs)
+
+
     def __str__(self):
         return ' '.join(self.args())
+
+
+def is_audio_filter(name):
+    '''Checks if a melt filter only processes audio'''
+
+    return name in AUDIO_FILTERS or name.split('.')[0] in AUDIO_FILTER_PREFIXES
@@ -1,10 +1,23 @@
+from __future__ import print_function
 import os
-from subprocess import call, check_output
-import uuid
+import re
+import json
+import time
+import hashlib
+from subprocess import call, check_output, Popen, PIPE
 from xml.etree.ElementTree import Element, tostring, fromstring
 from . import config
 from .clip import Clip
-from .utils import timestamp, check_melt
+from .cutlist import CutList
+from .utils import timestamp, check_melt, parse_time, memory_limiter, xml_timebase, Timebase
+from .services import missing_services, MissingServiceError
+from .frames import render_frames, stream_frames, tile
+from . import animated, scratch, encoding, hls, services
+from .encoding import encode
+from .template import Template
+
+# formats that save_many saves as a single poster frame
+POSTER_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
 
 
 class Composition(object):
@@ -24,10 +37,13 @@ class Composition(object):
         width (int): Width of output in pixels
 
         height (int): Height of output in pixels
+
+        audio_only (bool): Only render audio. Skips the background, video decoding, video filters and compositing
     '''
 
-    def __init__(self, clips, bgcolor='#000000', singletrack=False, duration=None, fps=None, width=None, height=None):
+    def __init__(self, clips, bgcolor='#000000', singletrack=False, duration=None, fps=None, width=None, height=None, audio_only=False):
         self.clips = clips
+        self.audio_only = audio_only
         self.bg = bgcolor
         self.singletrack = singletrack
         self.duration = timestamp(duration)
@@ -36,6 +52,50 @@ class Composition(object):
         self.height = height
 
 
+    @classmethod
+    def from_cuts(cls, resource, starts=None, ends=None, offsets=None, **kwargs):
+        '''Creates a singletrack composition from a list of cuts.
+
+        The cuts are stored compactly and rendered as one playlist, with a single
+        producer for each source file, so melt only opens each source once.
+
+        Args:
+            resource: a single resource for all cuts, a list with one resource per cut,
+                or the path to a .csv or .edl file containing the cuts
+            starts (list): in-points of each cut in seconds (can be a NumPy array)
+            ends (list): out-points of each cut in seconds (can be a NumPy array)
+            offsets (list): optional blank time in seconds before each cut
+            **kwargs: additional Composition parameters (bgcolor, duration, fps, width, height)
+
+        Returns:
+            Composition
+        '''
+
+        fps = kwargs.get('fps')
+
+        if isinstance(resource, str) and resource.lower().endswith('.csv'):
+            cuts = CutList.from_csv(resource, fps=fps)
+        elif isinstance(resource, str) and resource.lower().endswith('.edl'):
+            cuts = CutList.from_edl(resource, fps=fps or 30)
+        else:
+            cuts = CutList(resource, starts, ends, offsets, fps=fps)
+
+        return cls([Clip(cuts)], singletrack=True, **kwargs)
+
+
+    @property
+    def timebase(self):
+        '''The Timebase of the output, from the composition fps or the first clip'''
+
+        if self.fps:
+            return Timebase(self.fps)
+
+        if self.clips:
+            return self.clips[0].timebase
+
+        return Timebase(25)
+
+
     def autoset_duration(self, xml):
         duration = self.duration
 
@@ -43,6 +103,11 @@ class Composition(object):
             duration = self.duration = xml.find('tractor').get('out')
 
         xml.find('tractor').set('out', str(duration))
+
+        # the rest sets the length of the background track
+        if self.audio_only:
+            return xml
+
         xml.find('producer').set('out', str(duration))
         xml.find('producer').remove(xml.find('./producer/property[@name="length"]'))
         xml.find('./playlist/entry').set('out', str(duration))
@@ -50,11 +115,94 @@ class Composition(object):
         return xml
 
 
+    def share_producers(self, xml):
+        '''Merges producers that read the same source, so it's only opened and decoded once.
+
+        Producers are shared by cuts on the same track, and by cuts on different tracks
+        that play the same source frames at the same time. Cuts of one source that overlap
+        at different positions keep their own producers, since a shared producer would
+        have to seek back and forth on every frame.
+        '''
+
+        timebase = xml_timebase(xml)
+
+        # group producers by everything except their id and in/out points
+        groups = {}
+        producers = {}
+        for producer in xml.findall('producer'):
+            service = producer.find('property[@name="mlt_service"]')
+            if service is not None and service.text in ('color', 'colour'):
+                continue
+            attrib = dict((k, v) for k, v in producer.attrib.items() if k not in ('id', 'in', 'out'))
+            key = tostring(Element('producer', attrib)) + b''.join(tostring(child) for child in producer)
+            groups.setdefault(key, []).append(producer)
+            producers[producer.get('id')] = producer
+
+        # find where each producer is used on the timeline
+        usage = dict((pid, []) for pid in producers)
+        for playlist in xml.findall('playlist'):
+            position = 0
+            for child in playlist:
+                if child.tag == 'blank':
+                    position += parse_time(child.get('length', 0), timebase)
+                elif child.tag == 'entry':
+                    producer = producers.get(child.get('producer'))
+                    start = parse_time(child.get('in', 0), timebase)
+                    if child.get('out') is not None:
+                        end = parse_time(child.get('out'), timebase)
+                    elif producer is not None and producer.get('out') is not None:
+                        end = parse_time(producer.get('out'), timebase)
+                    else:
+                        end = start
+                    repeat = int(child.get('repeat', 1))
+                    length = (end - start + 1) * repeat
+                    if producer is not None:
+                        usage[producer.get('id')].append((playlist, position, position + length, start, end, repeat, child))
+                    position += length
+
+        def compatible(a, b):
+            if a[0] is b[0] or a[2] <= b[1] or b[2] <= a[1]:
+                return True
+            if a[5] > 1 or b[5] > 1:
+                return a[1:6] == b[1:6]
+            return a[1] - a[3] == b[1] - b[3]
+
+        for group in groups.values():
+            shared = []
+            for producer in group:
+                uses = usage[producer.get('id')]
+                target = None
+                for candidate, candidate_uses in shared:
+                    if all(compatible(a, b) for a in uses for b in candidate_uses):
+                        target = (candidate, candidate_uses)
+                        break
+
+                if target is None:
+                    shared.append((producer, list(uses)))
+                    continue
+
+                candidate, candidate_uses = target
+                for use in uses:
+                    use[6].set('producer', candidate.get('id'))
+                candidate_uses.extend(uses)
+
+                for attr, pick in (('in', min), ('out', max)):
+                    if candidate.get(attr) is not None and producer.get(attr) is not None:
+                        value = pick(parse_time(candidate.get(attr), timebase), parse_time(producer.get(attr), timebase))
+                        candidate.set(attr, str(value))
+
+                xml.remove(producer)
+
+        return xml
+
+
     def set_meta(self, xml):
         profile = xml.find('profile')
 
         if self.fps:
-            profile.set('frame_rate_num', str(self.fps))
+            fps = Timebase(self.fps).fps
+            profile.set('frame_rate_num', str(fps.numerator))
+            profile.set('frame_rate_den', str(fps.denominator))
 
         if not self.width or not self.height:
             self.width = self.clips[0].width
@@ -78,20 +226,45 @@ class Composition(object):
             str: an mlt xml representation of the composition
         '''
 
+        # prerendered text and stills are drawn at the output size
+        width, height = self.width, self.height
+        if (not width or not height) and self.clips and not self.audio_only:
+            width, height = self.clips[0].width, self.clips[0].height
+
+        for clip in self.clips:
+            clip.prepare(width, height)
+            if clip.mask is not None:
+                clip.mask.prepare(width, height)
+
+        self._resolve_masks()
+
         xml = check_output(self.args() + ['-consumer', 'xml'])
         xml = fromstring(xml)
 
+        xml = self.share_producers(xml)
         xml = self.autoset_duration(xml)
         xml = self.set_meta(xml)
 
         return tostring(xml)
 
 
+    def _resolve_masks(self):
+        '''Checks once whether melt has the shape filter for still image masks, so building args never calls melt'''
+
+        masked = [clip for clip in self.clips if clip.mask is not None]
+        if not masked:
+            return
+
+        shape = services.is_available('shape')
+        for clip in masked:
+            clip._shape = shape
+
+
     def save_xml(self, filename=None):
         '''Saves the composition as a mlt xml file.
 
         Args:
-            filename (str): path to save to
+            filename (str): path to save to (defaults to a file in the scratch directory, removed when Python exits)
 
         Returns:
             str: path to the saved file
@@ -99,7 +272,7 @@ class Composition(object):
         '''
 
         if filename is None:
-            filename = str(uuid.uuid4()) + '.xml'
+            return scratch.write(self.xml())
 
         with open(filename, 'wb') as outfile:
             outfile.write(self.xml())
@@ -107,22 +280,358 @@ class Composition(object):
         return filename
 
 
+    def to_template(self, **placeholders):
+        '''Compiles the composition into a Template with named placeholders.
+
+        Build the composition with sample values (text, source files, colors), then name them here.
+        Every occurrence of a sample value in the compiled xml becomes a placeholder, so variants
+        can be rendered without rebuilding or re-probing anything. Text that should change can't
+        be prerendered, and replacement sources should be at least as long as the samples.
+
+        Example:
+            template = comp.to_template(title='Sample Title', video='videos/hand1.mp4')
+            template.render_many([{'filename': 'a.mp4', 'title': 'Hi', 'video': 'a.mov'}])
+
+        Args:
+            **placeholders: the sample value for each placeholder name
+
+        Returns:
+            Template
+        '''
+
+        xml = fromstring(self.xml())
+        samples = sorted(((name, str(value).replace('$', '$$')) for name, value in placeholders.items()), key=lambda p: -len(p[1]))
+        found = set()
+
+        def replace(value):
+            value = value.replace('$', '$$')
+            for name, sample in samples:
+                if sample in value:
+                    value = value.replace(sample, '${%s}' % name)
+                    found.add(name)
+            return value
+
+        for element in xml.iter():
+            for key, value in element.attrib.items():
+                element.set(key, replace(value))
+            if element.text:
+                element.text = replace(element.text)
+
+        missing = set(placeholders) - found
+        if missing:
+            raise ValueError('placeholder values not found in the composition: {}'.format(', '.join(sorted(missing))))
+
+        return Template(tostring(xml), duration=str(self.duration) if self.duration else None)
+
+
+    def _compile(self, job):
+        '''Renders the composition as XML once, as a resource melt can read.
+
+        Args:
+            job (scratch.Job): where to write the xml, if it's too long to pass to melt directly
+
+        Returns:
+            (resource, parsed xml) tuple
+        '''
+
+        xml = self.xml()
+        return job.xml_resource(xml), fromstring(xml)
+
+
     def preview(self):
         ''' Previews the composition using melt's default viewer.'''
 
         check_melt()
 
-        xmlfile = self.save_xml()
-        call([config.MELT_BINARY, xmlfile, 'out="{}"'.format(self.duration)])
-        os.remove(xmlfile)
+        with scratch.Job() as job:
+            call([config.MELT_BINARY, job.xml_resource(self.xml()), 'out="{}"'.format(self.duration)])
+
+
+    def extract_frames(self, times, width=None, height=None, workers=None):
+        '''Renders still frames of the composition, with all effects applied.
+
+        Only the requested frames are decoded, and they're rendered in parallel.
+
+        Args:
+            times (list): timestamps in seconds of the frames to extract
+            width (int): width of the frames (defaults to the composition width)
+            height (int): height of the frames (defaults to the composition height)
+            workers (int): number of frames to render at once (defaults to the number of cpus)
+
+        Returns:
+            list: PIL Images (use numpy.asarray to convert them to arrays)
+        '''
+
+        check_melt()
+
+        with scratch.Job() as job:
+            xmlfile, xml = self._compile(job)
+            timebase = xml_timebase(xml)
+            width = width or self.width
+            height = height or self.height
+
+            frames = [timebase.to_frame(t) for t in times]
+            return render_frames(xmlfile, frames, width, height, workers)
+
+
+    def contact_sheet(self, cols=4, rows=4, width=320, filename=None, workers=None):
+        '''Creates a contact sheet of evenly spaced frames from the composition.
+
+        Args:
+            cols (int): number of columns
+            rows (int): number of rows
+            width (int): width of each thumbnail in pixels (the height keeps the composition's aspect ratio)
+            filename (str): optional path to save the sheet to
+            workers (int): number of frames to render at once (defaults to the number of cpus)
+
+        Returns:
+            PIL.Image: the contact sheet
+        '''
+
+        check_melt()
+
+        with scratch.Job() as job:
+            xmlfile, xml = self._compile(job)
+            timebase = xml_timebase(xml)
+            total_frames = parse_time(self.duration, timebase) + 1
+            height = int(round(float(width) * self.height / self.width / 2)) * 2
+
+            # sample the middle of each cell's span of the timeline
+            count = cols * rows
+            frames = [int((i + 0.5) * total_frames / count) for i in range(count)]
+
+            images = render_frames(xmlfile, frames, width, height, workers)
+
+        sheet = tile(images, cols, rows, self.bg)
+
+        if filename is not None:
+            sheet.save(filename)
+
+        return sheet
+
+
+    def _animation_source(self, job, width=None, fps=None):
+        '''Compiles the composition for an animation.
+
+        Args:
+            job (scratch.Job): where to keep the compiled xml
+            width (int): width of the animation (defaults to config.ANIMATION_WIDTH, or the composition's width if it's smaller)
+            fps: frame rate of the animation (defaults to the composition's)
+
+        Returns:
+            (stream, render, total, step, frame_ms) tuple: a function that renders the composition's frames once
+            each time it's called, a function that renders only the given frame numbers, the number of frames,
+            the input frames per output frame and the length of an output frame in milliseconds
+        '''
+
+        resource, xml = self._compile(job)
+        timebase = xml_timebase(xml)
+
+        if width is None:
+            width = min(config.ANIMATION_WIDTH, self.width)
+        height = int(round(float(width) * self.height / self.width / 2)) * 2
+
+        rate = Timebase(fps) if fps else timebase
+        step = float(timebase.fps / rate.fps)
+        out = parse_time(self.duration, timebase)
+
+        stream = lambda: stream_frames(resource, width, height, out=out)
+        render = lambda frames: render_frames(resource, frames, width, height)
+        return stream, render, out + 1, step, 1000.0 / float(rate.fps)
+
+
+    def save_gif(self, filename, width=None, fps=None, colors=256, palette='global', dither=True, loop=0, workers=None):
+        '''Saves the composition as an animated GIF with an optimized palette.
+
+        Identical frames are merged, and each frame only stores the area that changed. Frames are
+        quantized as they're rendered, in a single pass over the composition. A global palette is
+        built beforehand from a few sample frames, each rendered on its own.
+
+        Args:
+            filename (str): the file to save to
+            width (int): width of the GIF (the height keeps the composition's aspect ratio).
+                Defaults to config.ANIMATION_WIDTH, or the composition's width if it's smaller
+            fps: frame rate of the GIF (defaults to the composition's)
+            colors (int): number of colors in each palette
+            palette (str): "global" to share one palette between all frames (smaller files),
+                or "frame" for a palette per frame (better color)
+            dither (bool): use Floyd-Steinberg dithering
+            loop (int): number of times to loop (0 loops forever)
+            workers (int): number of frames to quantize at once (defaults to the number of cpus)
+
+        Returns:
+            filename (str): the path to the saved file
+        '''
+
+        if palette not in ('global', 'frame'):
+            raise ValueError('palette must be "global" or "frame", not {!r}'.format(palette))
+
+        check_melt()
+
+        with scratch.Job() as job:
+            stream, render, total, step, frame_ms = self._animation_source(job, width, fps)
+
+            shared = None
+            if palette == 'global':
+                shared = animated.build_palette(render(animated.sample_indexes(total)), colors)
+
+            quantize = animated.quantizer(colors, shared, dither)
+            frames, counts = animated.collect_frames(stream(), step, convert=quantize, workers=workers)
+
+        if not frames:
+            raise RuntimeError('melt did not render any frames')
+
+        return animated.save_gif(frames, counts, filename, frame_ms, loop=loop)
+
+
+    def save_webp(self, filename, width=None, fps=None, quality=80, lossless=False, method=4, loop=0):
+        '''Saves the composition as an animated WebP.
+
+        Args:
+            filename (str): the file to save to
+            width (int): width of the animation (the height keeps the composition's aspect ratio).
+                Defaults to config.ANIMATION_WIDTH, or the composition's width if it's smaller
+            fps: frame rate of the animation (defaults to the composition's)
+            quality (int): quality between 0 and 100
+            lossless (bool): use lossless compression
+            method (int): compression effort between 0 (fast) and 6 (small)
+            loop (int): number of times to loop (0 loops forever)
+
+        Returns:
+            filename (str): the path to the saved file
+        '''
+
+        check_melt()
+
+        with scratch.Job() as job:
+            stream, render, total, step, frame_ms = self._animation_source(job, width, fps)
+            frames, counts = animated.collect_frames(stream(), step)
+
+        if not frames:
+            raise RuntimeError('melt did not render any frames')
+
+        return animated.save_webp(frames, counts, filename, frame_ms, quality=quality, lossless=lossless, method=method, loop=loop)
+
+
+    def stream(self, url, latency='low', metrics=None, interval=1.0, on_missing=None, **kwargs):
+        '''Renders the composition in real time to a live output.
+
+        Supports rtmp:// (flv), srt://, udp:// and tcp:// (mpegts), and HLS (.m3u8) or
+        DASH (.mpd) segments written to disk. Frames are dropped rather than delayed
+        when rendering can't keep up.
+
+        Args:
+            url (str): where to stream to
+            latency (str): "low" for short GOPs, no b-frames and 1 second segments, or "normal"
+            metrics (function): optional callback, called about every interval seconds with a dict
+                of "position" (frames sent), "elapsed", "fps" (throughput), "lag" (how many seconds the
+                position is behind the wall clock since the stream started) and "max_lag" (the largest
+                lag so far). Lag is measured from the outside, it isn't a count of the frames melt dropped
+            interval (float): seconds between metrics callbacks
+            on_missing: what to do with filters that melt doesn't have (see check_services)
+            **kwargs: additional parameters to pass to ffmpeg, overriding the latency settings
+
+        Returns:
+            dict: the final metrics
+        '''
+
+        check_melt()
+        self.check_services(on_missing)
+
+        with scratch.Job() as job:
+            xmlfile, xml = self._compile(job)
+            fps = float(xml_timebase(xml).fps)
+            low = latency == 'low'
+
+            params = {
+                'real_time': 1,
+                'vcodec': 'libx264',
+                'preset': 'veryfast' if low else 'fast',
+                'g': int(round(fps * (1 if low else 2))),
+                'acodec': 'aac',
+            }
+
+            if low:
+                params['tune'] = 'zerolatency'
+                params['bf'] = 0
+
+            lower = url.lower()
+            if lower.startswith('rtmp'):
+                params['f'] = 'flv'
+            elif lower.startswith(('srt:', 'udp:', 'tcp:')):
+                params['f'] = 'mpegts'
+            elif lower.endswith('.m3u8'):
+                params.update({'f': 'hls', 'hls_time': 1 if low else 4, 'hls_list_size': 6, 'hls_flags': 'delete_segments'})
+            elif lower.endswith('.mpd'):
+                params.update({'f': 'dash', 'seg_duration': 1 if low else 4, 'window_size': 6, 'remove_at_exit': 0})
+
+            params.update(kwargs)
+
+            args = [config.MELT_BINARY, xmlfile, 'out="{}"'.format(self.duration), '-progress', '-consumer', 'avformat:{}'.format(url)]
+            args += ['{}="{}"'.format(key, val) for key, val in params.items()]
+
+            process = Popen(args, stderr=PIPE)
+            stats = _watch_progress(process, fps, metrics, interval)
+
+        return stats
+
+
+    def check_services(self, policy=None):
+        '''Checks that melt provides every filter and transition used by the composition.
+
+        Args:
+            policy: what to do with missing services. Can be "ignore", "warn", "drop" (remove them from their clips),
+                "fail" (raise a MissingServiceError), or a dict mapping missing names to replacements. A replacement
+                can be a filter name, a (name, params) tuple, or None to drop it. Defaults to config.MISSING_SERVICES
+
+        Returns:
+            list: (clip, kind, name) tuples for each missing service
+        '''
+
+        if policy is None:
+            policy = config.MISSING_SERVICES
+
+        if policy == 'ignore':
+            return []
+
+        missing = missing_services(self.clips)
+
+        if not missing:
+            return missing
+
+        if policy == 'fail':
+            names = sorted(set(name for clip, kind, name in missing))
+            raise MissingServiceError('melt is missing: {}'.format(', '.join(names)))
+
+        for clip, kind, name in missing:
+            services = clip.fxs if kind == 'filters' else clip.transitions
+
+            if isinstance(policy, dict) and policy.get(name) is not None:
+                replacement = policy[name]
+                if not isinstance(replacement, tuple):
+                    replacement = (replacement, [])
+                services[:] = [replacement if s[0] == name else s for s in services]
+                print('Warning: replacing missing {} "{}" with "{}"'.format(kind[:-1], name, replacement[0]))
 
+            elif policy == 'warn':
+                print('Warning: melt is missing the {} "{}", it will be ignored'.format(kind[:-1], name))
 
-    def save(self, filename, **kwargs):
+            else:
+                services[:] = [s for s in services if s[0] != name]
+                print('Warning: dropping missing {} "{}"'.format(kind[:-1], name))
+
+        return missing
+
+
+    def save(self, filename, on_missing=None, encoding=None, **kwargs):
         '''Save the composition as a video file.
 
         Args:
-            filename (str): the file to save to (any video type is accepted)
-            **kwargs: additional parameters to pass to ffmpeg
+            filename (str): the file to save to (any video type is accepted, see save_gif and save_webp for optimized animations)
+            on_missing: what to do with filters that melt doesn't have (see check_services)
+            encoding: an encoding.EncodingProfile, or the name of a preset ("archive", "web", "preview" or "mezzanine").
+                Profiles with a target bitrate are encoded in two passes
+            **kwargs: additional parameters to pass to ffmpeg (these override the encoding profile)
 
         Returns:
             filename (str): the path to the saved file
@@ -130,23 +639,253 @@ class Composition(object):
         '''
 
         check_melt()
+        self.check_services(on_missing)
+
+        if self.audio_only:
+            kwargs.setdefault('vn', 1)
+            kwargs.setdefault('video_off', 1)
+
+        with scratch.Job() as job:
+            xml = self.xml()
+            fps = float(xml_timebase(fromstring(xml)).fps)
+            inputs = ['out="{}"'.format(self.duration)]
+            if not encode(job.xml_resource(xml), filename, encoding, fps=fps, inputs=inputs, params=kwargs, job=job):
+                raise RuntimeError('melt failed while rendering {}'.format(filename))
+
+        return filename
+
+
+    def save_many(self, outputs, on_missing=None):
+        '''Saves the composition to several files, compositing it only once.
+
+        Video outputs are encoded side by side by melt's multi consumer, each at its own size
+        and settings. Image outputs (.jpg, .png, .bmp, .tif) are saved as poster frames.
+        Outputs with a two pass encoding profile are rendered separately, since they need two runs.
+
+        Args:
+            outputs (list): a dict for each output, with a "filename", an optional "encoding"
+                profile (see save), "time" (for images, in seconds) and any parameters to pass to ffmpeg,
+                like "width" and "height"
+            on_missing: what to do with filters that melt doesn't have (see check_services)
+
+        Returns:
+            list: paths to the saved files
+        '''
+
+        check_melt()
+        self.check_services(on_missing)
+
+        videos, images, separate = [], [], []
+        for output in outputs:
+            output = dict(output)
+            if os.path.splitext(output['filename'])[1].lower() in POSTER_EXTENSIONS:
+                images.append(output)
+            elif output.get('encoding') is not None and encoding.get_profile(output['encoding']).two_pass:
+                separate.append(output)
+            else:
+                videos.append(output)
+
+        with scratch.Job() as job:
+            xml = self.xml()
+            timebase = xml_timebase(fromstring(xml))
+            fps = float(timebase.fps)
+            resource = job.xml_resource(xml)
+            inputs = ['out="{}"'.format(self.duration)]
+
+            if videos:
+                args = [config.MELT_BINARY, resource] + inputs + ['-consumer', 'multi:']
+                for i, output in enumerate(videos):
+                    filename = output.pop('filename')
+                    profile = output.pop('encoding', None)
+                    params = encoding.get_profile(profile).params(fps) if profile is not None else {}
+                    if self.audio_only:
+                        params.update({'vn': 1, 'video_off': 1})
+                    params.update(output)
+                    args += ['{}=avformat:{}'.format(i, filename)]
+                    args += ['{}.{}="{}"'.format(i, key, val) for key, val in params.items()]
+
+                if call(args) != 0:
+                    raise RuntimeError('melt failed while rendering {}'.format(', '.join(o['filename'] for o in outputs)))
+
+            for output in separate:
+                filename = output.pop('filename')
+                profile = output.pop('encoding')
+                if not encoding.encode(resource, filename, profile, fps=fps, inputs=inputs, params=output, job=job):
+                    raise RuntimeError('melt failed while rendering {}'.format(filename))
+
+            for output in images:
+                width = output.get('width', self.width)
+                height = output.get('height', self.height)
+                frame = timebase.to_frame(output.get('time', 0))
+                render_frames(resource, [frame], width, height, workers=1)[0].save(output['filename'])
+
+        return [output['filename'] for output in outputs]
+
+
+    def save_hls(self, directory, ladder=None, segment_time=4, on_missing=None):
+        '''Saves the composition as an HLS stream with several renditions, compositing it only once.
+
+        All renditions are encoded side by side from a single render, with keyframes on the same
+        frames, so players can switch between them at any segment. Each rendition gets its own
+        directory with a playlist and segments, and "master.m3u8" lists them all.
+
+        Args:
+            directory (str): the directory to save to
+            ladder (list): a dict for each rendition, with "height" and/or "width", "bitrate", and
+                optionally "audio_bitrate", "name" and any other parameters to pass to ffmpeg.
+                Defaults to hls.LADDER. Renditions bigger than the composition are left out
+            segment_time (float): length of each segment in seconds
+            on_missing: what to do with filters that melt doesn't have (see check_services)
+
+        Returns:
+            str: the path to the master playlist
+        '''
+
+        if self.audio_only:
+            raise ValueError('HLS ladders need video, use save for audio only compositions')
+
+        check_melt()
+        self.check_services(on_missing)
+
+        if ladder is None:
+            ladder = hls.LADDER
+
+        with scratch.Job() as job:
+            xml = self.xml()
+            parsed = fromstring(xml)
+            fps = float(xml_timebase(parsed).fps)
+            width = int(parsed.find('profile').get('width'))
+            height = int(parsed.find('profile').get('height'))
+            ladder = hls.fit_ladder(ladder, width, height)
+
+            names = [hls.rendition_name(rendition, width, height) for rendition in ladder]
+            if len(set(names)) != len(names):
+                raise ValueError('each rendition needs a different name, got {}'.format(', '.join(names)))
+
+            args = [config.MELT_BINARY, job.xml_resource(xml), 'out="{}"'.format(self.duration), '-consumer', 'multi:']
+            for i, (name, rendition) in enumerate(zip(names, ladder)):
+                folder = os.path.join(directory, name)
+                if not os.path.exists(folder):
+                    os.makedirs(folder)
+                params = hls.rendition_params(rendition, folder, width, height, fps, segment_time)
+                args += ['{}=avformat:{}'.format(i, os.path.join(folder, hls.PLAYLIST_NAME))]
+                args += ['{}.{}="{}"'.format(i, key, val) for key, val in params.items()]
+
+            if call(args) != 0:
+                raise RuntimeError('melt failed while rendering the HLS renditions')
+
+        master = os.path.join(directory, 'master.m3u8')
+        with open(master, 'w') as outfile:
+            outfile.write(hls.master_playlist(ladder, width, height, fps))
+
+        return master
+
+
+    def save_chunked(self, filename, chunk_duration=300, workdir=None, memory_limit=None, keep_chunks=False, on_missing=None, **kwargs):
+        '''Save the composition as a video file, rendering it in separate chunks.
+
+        Each chunk is rendered by its own melt process and recorded in a manifest, so an
+        interrupted render picks up from the last completed chunk when called again.
+        The chunks are joined with ffmpeg at the end, without re-encoding.
+
+        Args:
+            filename (str): the file to save to
+            chunk_duration (float): length of each chunk in seconds
+            workdir (str): directory for chunks and the manifest. Defaults to filename + ".chunks"
+            memory_limit (int): memory ceiling in megabytes for each melt process. Defaults to config.MEMORY_LIMIT
+            keep_chunks (bool): keep the chunk directory after joining
+            on_missing: what to do with filters that melt doesn't have (see check_services)
+            **kwargs: additional parameters to pass to ffmpeg
 
-        xmlfile = self.save_xml()
+        Returns:
+            filename (str): the path to the saved file
+        '''
 
-        args = [
-            config.MELT_BINARY,
-            xmlfile,
-            'out="{}"'.format(self.duration),
-            '-consumer',
-            'avformat:{}'.format(filename)
-        ]
+        check_melt()
+        self.check_services(on_missing)
+
+        if workdir is None:
+            workdir = filename + '.chunks'
+
+        if memory_limit is None:
+            memory_limit = config.MEMORY_LIMIT
+
+        if not os.path.exists(workdir):
+            os.makedirs(workdir)
+
+        xml = self.xml()
+        xmlfile = os.path.join(workdir, 'composition.xml')
+        with open(xmlfile, 'wb') as outfile:
+            outfile.write(xml)
+
+        timebase = xml_timebase(fromstring(xml))
+        total_frames = parse_time(self.duration, timebase) + 1
+        chunk_frames = max(timebase.to_frame(chunk_duration), 1)
+        ext = os.path.splitext(filename)[1]
+
+        # the render can only resume if nothing about it has changed
+        signature = hashlib.sha1(xml + json.dumps(sorted((k, str(v)) for k, v in kwargs.items())).encode('utf-8')).hexdigest()
+        manifest_file = os.path.join(workdir, 'manifest.json')
+        manifest = None
+
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as infile:
+                manifest = json.load(infile)
+            if manifest.get('signature') != signature or manifest.get('chunk_frames') != chunk_frames:
+                manifest = None
+
+        if manifest is None:
+            chunks = []
+            for i, start in enumerate(range(0, total_frames, chunk_frames)):
+                chunks.append({
+                    'file': 'chunk{:05d}{}'.format(i, ext),
+                    'in': start,
+                    'out': min(start + chunk_frames, total_frames) - 1,
+                    'done': False
+                })
+            manifest = {'signature': signature, 'chunk_frames': chunk_frames, 'chunks': chunks}
+
+        if self.audio_only:
+            kwargs.setdefault('vn', 1)
+            kwargs.setdefault('video_off', 1)
 
         extra_params = ['{}="{}"'.format(key, val) for key, val in kwargs.items()]
-        args += extra_params
 
-        call(args)
+        for chunk in manifest['chunks']:
+            chunkfile = os.path.join(workdir, chunk['file'])
+
+            if chunk['done'] and os.path.exists(chunkfile):
+                continue
+
+            args = [
+                config.MELT_BINARY,
+                xmlfile,
+                'in={}'.format(chunk['in']),
+                'out={}'.format(chunk['out']),
+                '-consumer',
+                'avformat:{}'.format(chunkfile)
+            ] + extra_params
 
-        os.remove(xmlfile)
+            if call(args, preexec_fn=memory_limiter(memory_limit)) != 0:
+                raise RuntimeError('melt failed while rendering {}'.format(chunkfile))
+
+            chunk['done'] = True
+            _write_json(manifest_file, manifest)
+
+        listfile = os.path.join(workdir, 'chunks.txt')
+        with open(listfile, 'w') as outfile:
+            for chunk in manifest['chunks']:
+                outfile.write("file '{}'\n".format(chunk['file']))
+
+        if call(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', listfile, '-c', 'copy', filename]) != 0:
+            raise RuntimeError('ffmpeg failed to join the chunks in {}'.format(workdir))
+
+        if not keep_chunks:
+            for chunk in manifest['chunks']:
+                os.remove(os.path.join(workdir, chunk['file']))
+            for name in ('chunks.txt', 'manifest.json', 'composition.xml'):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
 
         return filename
 
@@ -158,6 +897,9 @@ class Composition(object):
             str: mlt command line arguments
         '''
 
+        if self.audio_only:
+            return self.audio_args()
+
         args = [config.MELT_BINARY]
 
 
@@ -174,17 +916,16 @@ class Composition(object):
             args += c.args(self.singletrack)
             args += c.transition_args(i+1)
 
-        # add mask clips
-        for i, c in enumerate(self.clips):
-            if c.mask:
-                args += c.mask.args()
+        # add mask clips (still image masks are applied by a filter on the clip instead)
+        masked = [c for c in self.clips if c.mask and c.static_mask() is None]
+        for c in masked:
+            args += c.mask.args()
 
         # add matte transitions for mask clips
         mask_track_number = len(self.clips)
-        for i, c in enumerate(self.clips):
-            if c.mask:
-                args += ['-transition', 'matte', 'a_track={}'.format(c.track_number), 'b_track={}'.format(mask_track_number)]
-                mask_track_number += 1
+        for c in masked:
+            args += ['-transition', 'matte', 'a_track={}'.format(c.track_number), 'b_track={}'.format(mask_track_number)]
+            mask_track_number += 1
 
         # add composite transitions for all tracks
         if self.singletrack:
@@ -197,6 +938,82 @@ class Composition(object):
         return args
 
 
+    def audio_args(self):
+        '''Generate mlt command line arguments for an audio only render, without any video tracks or transitions
+
+        Returns:
+            str: mlt command line arguments
+        '''
+
+        args = [config.MELT_BINARY]
+
+        if self.singletrack:
+            args += ['-track']
+
+        for i, c in enumerate(self.clips):
+            c.track_number = i
+            args += c.args(self.singletrack, audio_only=True)
+
+        if not self.singletrack:
+            for i in range(1, len(self.clips)):
+                args += ['-transition', 'mix', 'a_track=0', 'b_track={}'.format(i)]
+
+        return args
+
+
     def __str__(self):
         return ' '.join(self.args())
 
+
+def _write_json(path, data):
+    '''Writes json through a temporary file, so an interrupted write can't corrupt it'''
+
+    with open(path + '.tmp', 'w') as outfile:
+        json.dump(data, outfile, indent=2)
+
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+
+    os.rename(path + '.tmp', path)
+
+
+def _watch_progress(process, fps, callback=None, interval=1.0):
+    '''Follows melt's -progress output until it exits, and measures how far it falls behind real time'''
+
+    progress = re.compile(br'(?:Frame|Position):\s*(\d+),')
+    start = time.time()
+    last_report = start
+    stats = {'position': 0, 'elapsed': 0.0, 'fps': 0.0, 'lag': 0.0, 'max_lag': 0.0}
+    buf = b''
+
+    while True:
+        data = process.stderr.read1(4096) if hasattr(process.stderr, 'read1') else process.stderr.read(64)
+        if not data:
+            break
+
+        buf += data
+        matches = progress.findall(buf)
+        buf = buf[-64:]
+
+        if not matches:
+            continue
+
+        now = time.time()
+        elapsed = now - start
+        position = int(matches[-1])
+        lag = max(elapsed * fps - position, 0) / fps
+
+        stats = {
+            'position': position,
+            'elapsed': elapsed,
+            'fps': position / elapsed if elapsed > 0 else 0.0,
+            'lag': lag,
+            'max_lag': max(lag, stats['max_lag']),
+        }
+
+        if callback is not None and now - last_report >= interval:
+            callback(dict(stats))
+            last_report = now
+
+    process.wait()
+    return stats
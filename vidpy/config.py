@@ -14,3 +14,51 @@ for p in PATHS:
     if os.path.exists(p):
         MELT_BINARY = p
         break
+
+# where vidpy keeps indexes and other data that can be reused between runs
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'vidpy')
+
+# what to do when a composition uses filters/transitions melt doesn't have:
+# 'ignore', 'warn', 'drop', 'fail', or a dict of substitutions
+MISSING_SERVICES = 'warn'
+
+# memory ceiling in megabytes for each melt process in chunked renders (None for no limit)
+MEMORY_LIMIT = None
+
+# draw static text once to a cached image (at the composition's size) instead of on every frame
+PRERENDER_TEXT = False
+
+# default width of animations from save_gif and save_webp, which keep every distinct frame in memory
+ANIMATION_WIDTH = 480
+
+# merge stacked opacity and affine filters on each clip into single filters
+FUSE_FILTERS = True
+
+# nested compositions smaller than this many bytes are passed to melt as xml strings instead of files
+# (except on Windows, where they always go to files)
+INLINE_XML_LIMIT = 128000
+
+# where to make the scratch directory for temporary files: None for the system temp directory,
+# "ram" for a RAM disk (/dev/shm) if there is one, or any path
+SCRATCH_DIR = None
+
+# maximum size of the scratch directory in megabytes (None for no limit). Checked when vidpy writes
+# a scratch file, so files melt and ffmpeg write there count but aren't stopped (see scratch.py)
+SCRATCH_QUOTA = None
+
+# render reversed clips, and clips sped up this much or more, from cached all-intra intermediates
+INTERMEDIATES = True
+INTERMEDIATE_SPEED = 4
+
+# maximum size of the cached intermediates in megabytes, least recently used files are removed first (None for no limit)
+INTERMEDIATE_CACHE_SIZE = 4096
+
+# reversed clips up to this many seconds long are reversed ahead of time, longer ones are only made all-intra
+REVERSE_MAX_SECONDS = 60
+
+# copy short cuts (up to MEZZANINE_MAX_SECONDS) to small all-intra files when they're repeated,
+# or when melt would decode more than MEZZANINE_SEEK_COST seconds of video to reach their in-point.
+# Off by default, since it probes every cut and renders extra files
+MEZZANINES = False
+MEZZANINE_MAX_SECONDS = 30
+MEZZANINE_SEEK_COST = 2.0
@@ -0,0 +1,236 @@
+'''
+Compact cut lists for building supercuts out of many short pieces of a few source files
+'''
+
+import os
+import re
+import csv
+from xml.sax.saxutils import quoteattr
+from . import scratch
+from .utils import parse_time, get_melt_profile, Timebase, np
+
+
+class CutList(object):
+    '''A list of cuts, stored as arrays instead of individual Clip objects.
+
+    Renders as a single melt playlist, with one producer per source file shared
+    by every cut from that file.
+
+    Args:
+        resources: a single resource for all cuts, or a list with one resource per cut
+        starts (list): in-points of each cut in seconds
+        ends (list): out-points of each cut in seconds
+        offsets (list): optional blank time in seconds before each cut
+        fps: frame rate to convert cut points to exact frames at. Defaults to the frame rate
+            of the first source, read with melt when the cut list is rendered
+    '''
+
+    def __init__(self, resources, starts, ends, offsets=None, fps=None):
+        starts = list(starts)
+        ends = list(ends)
+
+        if len(starts) != len(ends):
+            raise ValueError('starts and ends must have the same length')
+
+        if isinstance(resources, str):
+            resources = [resources] * len(starts)
+        else:
+            resources = list(resources)
+
+        if len(resources) != len(starts):
+            raise ValueError('there must be one resource per cut')
+
+        if offsets is not None:
+            offsets = list(offsets)
+            if len(offsets) != len(starts):
+                raise ValueError('there must be one offset per cut')
+
+        # one entry per distinct source, and an index into it for every cut
+        self.sources = []
+        lookup = {}
+        self.source_index = []
+        for resource in resources:
+            if resource not in lookup:
+                lookup[resource] = len(self.sources)
+                self.sources.append(resource)
+            self.source_index.append(lookup[resource])
+
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.timebase = Timebase(fps) if fps else None
+
+
+    def __len__(self):
+        return len(self.starts)
+
+
+    @classmethod
+    def from_csv(cls, filename, fps=None):
+        '''Loads a cut list from a csv file with resource, start, end and optional offset columns.
+
+        A header row is skipped if present. Relative resources are resolved against the csv file's directory.
+        '''
+
+        resources, starts, ends, offsets = [], [], [], []
+        basedir = os.path.dirname(os.path.abspath(filename))
+
+        with open(filename) as infile:
+            for row in csv.reader(infile):
+                if len(row) < 3:
+                    continue
+                try:
+                    start, end = float(row[1]), float(row[2])
+                except ValueError:
+                    continue
+                resources.append(_resolve(row[0].strip(), basedir))
+                starts.append(start)
+                ends.append(end)
+                offsets.append(float(row[3]) if len(row) > 3 and row[3].strip() else 0)
+
+        return cls(resources, starts, ends, offsets if any(offsets) else None, fps=fps)
+
+
+    @classmethod
+    def from_edl(cls, filename, fps=30):
+        '''Loads a cut list from a CMX3600 edl file.
+
+        Source files are taken from "FROM CLIP NAME" comments, or from the reel name.
+        Gaps in the record timecodes become offsets. Timecodes are drop-frame if they're
+        written with ";" or the edl says "FCM: DROP FRAME" (only at 29.97 and 59.94 fps).
+        '''
+
+        timebase = Timebase(fps)
+        basedir = os.path.dirname(os.path.abspath(filename))
+        event = re.compile(r'^(\d+)\s+(\S+)\s+(\S+)\s+\S+\s+(?:\d+\s+)?([\d:;]+)\s+([\d:;]+)\s+([\d:;]+)\s+([\d:;]+)')
+        events = []
+        drop_frame = False
+
+        with open(filename) as infile:
+            for line in infile:
+                match = event.match(line.strip())
+                if line.startswith('FCM:'):
+                    drop_frame = line.split(':', 1)[1].strip().upper() == 'DROP FRAME'
+                elif match:
+                    number, reel, track, src_in, src_out, rec_in, rec_out = match.groups()
+                    if events and events[-1]['number'] == number:
+                        continue
+                    if drop_frame:
+                        # drop-frame edls don't always write the ";" separator
+                        src_in, src_out, rec_in, rec_out = [_drop_frame(t) for t in (src_in, src_out, rec_in, rec_out)]
+                    events.append({
+                        'number': number,
+                        'resource': reel,
+                        'start': parse_time(src_in, timebase),
+                        'end': parse_time(src_out, timebase),
+                        'rec_in': parse_time(rec_in, timebase),
+                        'rec_out': parse_time(rec_out, timebase),
+                    })
+                elif events and line.startswith('* FROM CLIP NAME:'):
+                    events[-1]['resource'] = line.split(':', 1)[1].strip()
+
+        resources, starts, ends, offsets = [], [], [], []
+        position = events[0]['rec_in'] if events else 0
+        for e in events:
+            resources.append(_resolve(e['resource'], basedir))
+            starts.append(timebase.to_seconds(e['start']))
+            ends.append(timebase.to_seconds(e['end']))
+            offsets.append(timebase.to_seconds(max(e['rec_in'] - position, 0)))
+            position = e['rec_out']
+
+        return cls(resources, starts, ends, offsets if any(offsets) else None, fps=fps)
+
+
+    def get_timebase(self):
+        '''Returns the timebase of the cut points: the fps if one was given, otherwise the first source's frame rate'''
+
+        if self.timebase is None and self.sources:
+            profile = get_melt_profile(self.sources[0])
+            self.timebase = Timebase((profile['frame_rate_num'], profile['frame_rate_den']))
+        return self.timebase
+
+
+    def _times(self, values, out=False):
+        '''Formats a column of times for melt as exact frames, so back to back cuts never share a frame'''
+
+        if not len(values):
+            return []
+
+        frames = self.get_timebase().to_frames(values)
+        if np is not None:
+            frames = frames.tolist()
+
+        # melt out-points are inclusive
+        if out:
+            return [str(f - 1) for f in frames]
+        return [str(f) for f in frames]
+
+
+    def xml(self):
+        '''Renders the cut list as an mlt xml document
+
+        Returns:
+            str: an mlt xml representation of the cut list
+        '''
+
+        ins = self._times(self.starts)
+        outs = self._times(self.ends, out=True)
+        blanks = self._times(self.offsets) if self.offsets is not None else None
+
+        lines = ['<?xml version="1.0" encoding="utf-8"?>', '<mlt>']
+
+        for i, resource in enumerate(self.sources):
+            lines.append('<producer id="producer{}"><property name="resource">{}</property></producer>'.format(i, _escape(resource)))
+
+        lines.append('<playlist id="cuts">')
+        for i, source in enumerate(self.source_index):
+            if blanks is not None and self.offsets[i] > 0:
+                lines.append('<blank length={}/>'.format(quoteattr(blanks[i])))
+            lines.append('<entry producer="producer{}" in={} out={}/>'.format(source, quoteattr(ins[i]), quoteattr(outs[i])))
+        lines.append('</playlist>')
+
+        lines.append('<tractor id="tractor0"><track producer="cuts"/></tractor>')
+        lines.append('</mlt>')
+
+        return '\n'.join(lines)
+
+
+    def save_xml(self, filename=None):
+        '''Saves the cut list as a mlt xml file.
+
+        Args:
+            filename (str): path to save to (defaults to a file in the scratch directory, removed when Python exits)
+
+        Returns:
+            str: path to the saved file
+        '''
+
+        if filename is None:
+            return scratch.write(self.xml().encode('utf-8'))
+
+        with open(filename, 'wb') as outfile:
+            outfile.write(self.xml().encode('utf-8'))
+
+        return filename
+
+
+def _escape(value):
+    return quoteattr(value)[1:-1]
+
+
+def _drop_frame(timecode):
+    '''Marks a timecode as drop-frame, by putting ";" before the frames'''
+
+    if ';' in timecode:
+        return timecode
+    head, _, frames = timecode.rpartition(':')
+    return head + ';' + frames
+
+
+def _resolve(resource, basedir):
+    if os.path.isabs(resource) or ':' in resource:
+        return resource
+    path = os.path.join(basedir, resource)
+    if os.path.exists(path):
+        return path
+    return resource
@@ -0,0 +1,255 @@
+'''
+Encoding profiles, for choosing codecs and rate control without hand tuning ffmpeg parameters
+
+Profiles only use software (CPU) codecs. Use one of the named PRESETS, or make your own:
+
+    comp.save('out.mp4', encoding='web')
+    comp.save('out.mp4', encoding=EncodingProfile(crf=20, preset='fast'))
+'''
+
+import os
+import re
+import time
+from subprocess import call, Popen, PIPE
+from . import config, scratch
+
+
+class EncodingProfile(object):
+    '''Settings for encoding a video.
+
+    Args:
+        vcodec (str): video codec, like "libx264", "libx265", "libvpx-vp9" or "prores_ks"
+        preset (str): encoder speed preset (for x264 and x265)
+        crf (int): constant quality level (lower is better). Used when bitrate isn't set
+        bitrate (str): target video bitrate, like "4M"
+        two_pass (bool): encode twice to hit the bitrate more accurately (defaults to True when a bitrate is set)
+        gop (float): seconds between keyframes (0 makes every frame a keyframe, None uses the encoder default)
+        threads (int): encoder threads (0 picks automatically)
+        pix_fmt (str): pixel format
+        acodec (str): audio codec
+        audio_bitrate (str): audio bitrate, like "192k"
+        width (int): width to scale to (defaults to the composition width)
+        height (int): height to scale to (defaults to the composition height)
+        extra (dict): any other parameters to pass to ffmpeg
+    '''
+
+    def __init__(self, vcodec='libx264', preset='medium', crf=23, bitrate=None, two_pass=None, gop=None, threads=0,
+                 pix_fmt='yuv420p', acodec='aac', audio_bitrate='192k', width=None, height=None, extra=None):
+        self.vcodec = vcodec
+        self.preset = preset
+        self.crf = crf
+        self.bitrate = bitrate
+        self.two_pass = bitrate is not None if two_pass is None else two_pass
+        self.gop = gop
+        self.threads = threads
+        self.pix_fmt = pix_fmt
+        self.acodec = acodec
+        self.audio_bitrate = audio_bitrate
+        self.width = width
+        self.height = height
+        self.extra = dict(extra or {})
+
+
+    def params(self, fps=None):
+        '''Returns melt avformat consumer parameters for the profile.
+
+        Args:
+            fps (float): frame rate of the output, to convert the keyframe interval to frames
+
+        Returns:
+            dict
+        '''
+
+        params = {'vcodec': self.vcodec, 'threads': self.threads}
+
+        if self.preset and self.vcodec in ('libx264', 'libx265'):
+            params['preset'] = self.preset
+
+        if self.bitrate is not None:
+            params['vb'] = self.bitrate
+        elif self.crf is not None:
+            params['crf'] = self.crf
+            # vp9 only uses constant quality when the bitrate is 0
+            if self.vcodec.startswith('libvpx'):
+                params['vb'] = 0
+
+        if self.gop is not None and fps:
+            params['g'] = max(int(round(self.gop * fps)), 1)
+
+        if self.pix_fmt:
+            params['pix_fmt'] = self.pix_fmt
+
+        if self.acodec:
+            params['acodec'] = self.acodec
+            if self.audio_bitrate:
+                params['ab'] = self.audio_bitrate
+
+        if self.width:
+            params['width'] = self.width
+        if self.height:
+            params['height'] = self.height
+
+        params.update(self.extra)
+
+        return params
+
+
+    def __repr__(self):
+        return 'EncodingProfile({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in sorted(self.__dict__.items())))
+
+
+PRESETS = {
+    # high quality masters
+    'archive': EncodingProfile(preset='slow', crf=16, audio_bitrate='320k'),
+    # streaming and downloads, with keyframes every 2 seconds and the index at the front of the file
+    'web': EncodingProfile(preset='medium', crf=23, gop=2, extra={'movflags': '+faststart'}),
+    # fast drafts
+    'preview': EncodingProfile(preset='ultrafast', crf=30, audio_bitrate='96k'),
+    # all-intra files for editing, which can be decoded from any frame
+    'mezzanine': EncodingProfile(preset='veryfast', crf=12, gop=0, pix_fmt='yuv422p', acodec='pcm_s16le', audio_bitrate=None),
+}
+
+
+def get_profile(profile):
+    '''Returns an EncodingProfile from a preset name, or the profile itself'''
+
+    if isinstance(profile, EncodingProfile):
+        return profile
+
+    if profile not in PRESETS:
+        raise ValueError('unknown encoding profile {!r}, choose one of {}'.format(profile, ', '.join(sorted(PRESETS))))
+
+    return PRESETS[profile]
+
+
+def melt_params(params):
+    '''Formats consumer parameters as melt arguments'''
+
+    return ['{}="{}"'.format(key, val) for key, val in params.items()]
+
+
+def encode(resource, filename, profile=None, fps=None, inputs=None, params=None, job=None):
+    '''Renders a melt resource to a file, in two passes if the profile asks for it.
+
+    Args:
+        resource (str): a melt resource, like an xml document or media file
+        filename (str): the file to save to
+        profile: an EncodingProfile or preset name (optional)
+        fps (float): frame rate of the output
+        inputs (list): extra melt arguments after the resource, like in and out points
+        params (dict): consumer parameters, added on top of the profile's
+        job (scratch.Job): where to keep the pass log (defaults to a new job)
+
+    Returns:
+        bool: True if melt succeeded
+    '''
+
+    settings = get_profile(profile).params(fps) if profile is not None else {}
+    settings.update(params or {})
+
+    args = [config.MELT_BINARY, resource] + list(inputs or [])
+
+    if profile is None or not get_profile(profile).two_pass:
+        return call(args + ['-consumer', 'avformat:{}'.format(filename)] + melt_params(settings)) == 0
+
+    own_job = job is None
+    if own_job:
+        job = scratch.Job()
+
+    try:
+        logfile = job.path('-pass')
+
+        # the first pass only analyzes the video, so its output is thrown away
+        first = dict(settings, **{'pass': 1, 'passlogfile': logfile, 'an': 1})
+        first.pop('acodec', None)
+        first.pop('ab', None)
+        firstfile = job.path(os.path.splitext(filename)[1])
+        if call(args + ['-consumer', 'avformat:{}'.format(firstfile)] + melt_params(first)) != 0:
+            return False
+
+        second = dict(settings, **{'pass': 2, 'passlogfile': logfile})
+        return call(args + ['-consumer', 'avformat:{}'.format(filename)] + melt_params(second)) == 0
+    finally:
+        if own_job:
+            job.cleanup()
+
+
+def measure_quality(encoded, reference, width, height):
+    '''Compares an encoded video to a reference with ffmpeg.
+
+    Returns:
+        (psnr, ssim) tuple, with None for values ffmpeg didn't report
+    '''
+
+    graph = '[0:v]scale={}:{},split[a0][a1];[1:v]split[b0][b1];[a0][b0]ssim;[a1][b1]psnr'.format(width, height)
+    args = ['ffmpeg', '-hide_banner', '-nostats', '-i', encoded, '-i', reference, '-lavfi', graph, '-f', 'null', '-']
+
+    process = Popen(args, stdout=PIPE, stderr=PIPE)
+    output = process.communicate()[1].decode('utf-8', 'replace')
+
+    psnr = re.search(r'PSNR .*?average:([\d.]+|inf)', output)
+    ssim = re.search(r'SSIM .*?All:([\d.]+)', output)
+
+    return (float(psnr.group(1)) if psnr else None, float(ssim.group(1)) if ssim else None)
+
+
+def benchmark(composition, profiles=None, start=0, duration=10):
+    '''Compares encoding profiles on a sample of a composition.
+
+    The sample is rendered once losslessly, then encoded with each profile.
+
+    Args:
+        composition (Composition): the composition to sample
+        profiles (list): profiles or preset names to compare (defaults to all presets)
+        start (float): start of the sample in seconds
+        duration (float): length of the sample in seconds
+
+    Returns:
+        list: a dict for each profile, with "profile", "seconds" (encoding time), "size" (bytes),
+            "fps" (frames encoded per second), "psnr" and "ssim"
+    '''
+
+    from xml.etree.ElementTree import fromstring
+    from .utils import xml_timebase, check_melt
+
+    check_melt()
+
+    if profiles is None:
+        profiles = sorted(PRESETS)
+
+    results = []
+
+    with scratch.Job() as job:
+        xml = composition.xml()
+        timebase = xml_timebase(fromstring(xml))
+        first = timebase.to_frame(start)
+        last = timebase.to_frame(float(start) + duration) - 1
+        frames = last - first + 1
+        fps = float(timebase.fps)
+
+        reference = job.path('.mkv')
+        lossless = {'vcodec': 'ffv1', 'acodec': 'pcm_s16le', 'pix_fmt': 'yuv420p'}
+        if not encode(job.xml_resource(xml), reference, inputs=['in={}'.format(first), 'out={}'.format(last)], params=lossless):
+            raise RuntimeError('melt could not render the benchmark sample')
+
+        for profile in profiles:
+            settings = get_profile(profile)
+            output = job.path('.mov')
+
+            started = time.time()
+            if not encode(reference, output, settings, fps=fps, job=job):
+                raise RuntimeError('melt could not encode the benchmark sample with {!r}'.format(profile))
+            seconds = time.time() - started
+
+            psnr, ssim = measure_quality(output, reference, composition.width, composition.height)
+
+            results.append({
+                'profile': profile,
+                'seconds': seconds,
+                'size': os.path.getsize(output),
+                'fps': frames / seconds if seconds > 0 else None,
+                'psnr': psnr,
+                'ssim': ssim,
+            })
+
+    return results
@@ -0,0 +1,223 @@
+'''
+Fuses stacked filters on a clip, so each frame goes through fewer full-frame passes
+
+Only filters whose combination is exact are merged: opacity changes from fadein(), fadeout()
+and opacity() are multiplied into a single brightness filter, and static percentage rects
+(with distort) that stay inside the frame are composed into one affine filter. Rotations are
+never merged, since each rotated pass crops its corners.
+Opacity filters are moved past affine filters to meet each other, since scaling alpha and
+moving pixels around can happen in either order. Everything else keeps its place.
+'''
+
+# affine parameters that don't change what a static, distorted rect looks like
+RECT_KEYS = ('transition.rect', 'transition.geometry')
+RECT_OPTIONS = ('transition.valign', 'transition.halign', 'transition.fill', 'transition.distort')
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_animation(value):
+    '''Splits a melt animation string into (time, value) pairs.
+
+    Returns:
+        list of (time string, float) tuples, or None if the value isn't a numeric animation
+    '''
+
+    value = str(value)
+    if '=' not in value:
+        return None
+
+    keyframes = []
+    for item in value.split(';'):
+        time, _, amount = item.rpartition('=')
+        if not time or not _is_number(amount):
+            return None
+        keyframes.append((time, float(amount)))
+    return keyframes
+
+
+def format_animation(keyframes):
+    '''Joins (time, value) pairs into a melt animation string'''
+
+    return ';'.join('{}=%.10g'.format(time) % amount for time, amount in keyframes)
+
+
+def _seconds(time):
+    '''Converts a keyframe time to seconds, if it's given in seconds (or is 0)'''
+
+    if time.startswith(':') and _is_number(time[1:]):
+        return float(time[1:])
+    if time.lstrip('-') == '0':
+        return 0.0
+    return None
+
+
+def _is_opacity(name, params):
+    if name != 'brightness' or set(params) != set(['alpha', 'opacity']):
+        return False
+    return str(params['alpha']) == str(params['opacity'])
+
+
+def _is_affine(name, params):
+    return name == 'affine'
+
+
+def merge_opacity(a, b, length=None):
+    '''Multiplies two opacity values, constant or animated.
+
+    Two animations are only merged when one fades in (ending at 1) and the other fades out
+    (starting at 1, with times from the end) and the clip is known to be long enough that
+    the fades don't overlap.
+
+    Args:
+        a: the first opacity
+        b: the second opacity
+        length (float): length of the clip in seconds, if known
+
+    Returns:
+        the combined value, or None if the product can't be expressed exactly
+    '''
+
+    anim_a, anim_b = parse_animation(a), parse_animation(b)
+
+    if anim_a is None and anim_b is None:
+        if not (_is_number(a) and _is_number(b)):
+            return None
+        return '%.10g' % (float(a) * float(b))
+
+    if anim_a is None or anim_b is None:
+        constant, anim = (a, anim_b) if anim_a is None else (b, anim_a)
+        if not _is_number(constant):
+            return None
+        return format_animation([(time, amount * float(constant)) for time, amount in anim])
+
+    if length is None:
+        return None
+
+    def fades_in(anim):
+        times = [_seconds(t) for t, v in anim]
+        return None not in times and min(times) >= 0 and anim[-1][1] == 1
+
+    def fades_out(anim):
+        return all(t.startswith(('-', ':-')) for t, v in anim) and anim[0][1] == 1 and _seconds(anim[0][0]) is not None
+
+    for fade_in, fade_out in ((anim_a, anim_b), (anim_b, anim_a)):
+        if fades_in(fade_in) and fades_out(fade_out):
+            if max(_seconds(t) for t, v in fade_in) <= length + _seconds(fade_out[0][0]):
+                return format_animation(fade_in + fade_out)
+
+    return None
+
+
+def _parse_rect(value):
+    '''Parses a static "x%/y%:w%xh%" rect into percentages, or returns None'''
+
+    value = str(value)
+    if '=' in value or ';' in value or '/' not in value or ':' not in value:
+        return None
+
+    position, _, size = value.partition(':')
+    parts = position.split('/') + size.split('x')
+    # 0 is the same in pixels and percent
+    parts = ['0%' if p == '0' else p for p in parts]
+    if len(parts) != 4 or not all(p.endswith('%') and _is_number(p[:-1]) for p in parts):
+        return None
+
+    x, y, w, h = [float(p[:-1]) for p in parts]
+
+    # a rect that reaches outside the frame gets cropped, so it can't be combined exactly
+    if x < 0 or y < 0 or x + w > 100 or y + h > 100:
+        return None
+
+    return x, y, w, h
+
+
+def _rect(params):
+    '''Returns (key, rect) for a filter that only places the clip in a static distorted rect, or None'''
+
+    keys = [k for k in RECT_KEYS if k in params]
+    if len(keys) != 1 or str(params.get('transition.distort')) != '1':
+        return None
+    if any(k not in RECT_KEYS and k not in RECT_OPTIONS for k in params):
+        return None
+
+    rect = _parse_rect(params[keys[0]])
+    return None if rect is None else (keys[0], rect)
+
+
+def merge_affine(a, b):
+    '''Combines two affine filters, the first applied before the second.
+
+    Returns:
+        the combined params, or None if they can't be combined exactly
+    '''
+
+    inner, outer = _rect(a), _rect(b)
+    if inner is not None and outer is not None:
+        x1, y1, w1, h1 = inner[1]
+        x2, y2, w2, h2 = outer[1]
+        rect = (x2 + x1 * w2 / 100, y2 + y1 * h2 / 100, w1 * w2 / 100, h1 * h2 / 100)
+        merged = dict(b)
+        merged[outer[0]] = '%.10g%%/%.10g%%:%.10g%%x%.10g%%' % rect
+        return merged
+
+    return None
+
+
+def fuse(fxs, length=None):
+    '''Merges compatible filters in a clip's filter chain.
+
+    Args:
+        fxs (list): (name, params) tuples, in the order they're applied
+        length (float): length of the clip in seconds, if known
+
+    Returns:
+        list: a new list of (name, params) tuples
+    '''
+
+    fused = []
+
+    for name, params in fxs:
+        params = params or {}
+
+        if _is_opacity(name, params):
+            kind, can_pass, merge = _is_opacity, _is_affine, lambda a, b: _merge_opacity_params(a, b, length)
+        elif _is_affine(name, params):
+            kind, can_pass, merge = _is_affine, _is_opacity, merge_affine
+        else:
+            fused.append((name, params))
+            continue
+
+        # look back for a filter of the same kind, skipping over filters it can trade places with
+        for i in range(len(fused) - 1, -1, -1):
+            other_name, other_params = fused[i]
+            if kind(other_name, other_params):
+                merged = merge(other_params, params)
+                if merged is not None:
+                    if kind is _is_opacity:
+                        fused[i] = (other_name, merged)
+                    else:
+                        # the merged affine takes the later position, after any opacity filters it passed
+                        del fused[i]
+                        fused.append((name, merged))
+                    break
+            if not can_pass(other_name, other_params):
+                fused.append((name, params))
+                break
+        else:
+            fused.append((name, params))
+
+    return fused
+
+
+def _merge_opacity_params(a, b, length):
+    value = merge_opacity(a['alpha'], b['alpha'], length)
+    if value is None:
+        return None
+    return {'alpha': value, 'opacity': value}
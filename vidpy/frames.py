@@ -0,0 +1,130 @@
+'''
+Extracting still frames from rendered compositions
+'''
+
+import os
+from subprocess import Popen, PIPE
+from multiprocessing.pool import ThreadPool
+from PIL import Image
+from . import config
+
+
+def frame_args(width, height):
+    '''Returns melt consumer arguments that write raw rgb24 frames of a given size to stdout'''
+
+    return [
+        '-consumer', 'avformat:pipe:1',
+        'f=rawvideo',
+        'vcodec=rawvideo',
+        'pix_fmt=rgb24',
+        'width={}'.format(width),
+        'height={}'.format(height),
+        'an=1',
+        'real_time=0',
+    ]
+
+
+def render_frame(xmlfile, frame, width, height):
+    '''Renders a single frame of a melt xml document into memory.
+
+    Only the requested frame is decoded and composited, with all effects applied.
+
+    Args:
+        xmlfile (str): path to a melt xml document
+        frame (int): the frame number to render
+        width (int): width of the frame
+        height (int): height of the frame
+
+    Returns:
+        PIL.Image: the rendered frame
+    '''
+
+    args = [config.MELT_BINARY, xmlfile, 'in={}'.format(frame), 'out={}'.format(frame)] + frame_args(width, height)
+
+    with open(os.devnull, 'wb') as devnull:
+        process = Popen(args, stdout=PIPE, stderr=devnull)
+        data = process.stdout.read(width * height * 3)
+        process.stdout.close()
+        process.wait()
+
+    if len(data) < width * height * 3:
+        raise RuntimeError('melt could not render frame {}'.format(frame))
+
+    return Image.frombytes('RGB', (width, height), data)
+
+
+def stream_frames(xmlfile, width, height, out=None):
+    '''Renders every frame of a melt xml document in a single pass.
+
+    Args:
+        xmlfile (str): path to a melt xml document
+        width (int): width of the frames
+        height (int): height of the frames
+        out (int): the last frame to render
+
+    Yields:
+        PIL Images, in order
+    '''
+
+    args = [config.MELT_BINARY, xmlfile]
+    if out is not None:
+        args += ['out={}'.format(out)]
+    args += frame_args(width, height)
+
+    framesize = width * height * 3
+
+    with open(os.devnull, 'wb') as devnull:
+        process = Popen(args, stdout=PIPE, stderr=devnull)
+
+    try:
+        while True:
+            data = process.stdout.read(framesize)
+            if len(data) < framesize:
+                break
+            yield Image.frombytes('RGB', (width, height), data)
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def render_frames(xmlfile, frames, width, height, workers=None):
+    '''Renders several frames of a melt xml document in parallel.
+
+    Args:
+        xmlfile (str): path to a melt xml document
+        frames (list): frame numbers to render
+        width (int): width of the frames
+        height (int): height of the frames
+        workers (int): number of melt processes to run at once (defaults to the number of cpus)
+
+    Returns:
+        list: PIL Images, in the same order as frames
+    '''
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(lambda f: render_frame(xmlfile, f, width, height), frames)
+    finally:
+        pool.close()
+
+
+def tile(images, cols, rows, bgcolor='#000000'):
+    '''Tiles images into a single sheet, left to right and top to bottom.
+
+    Args:
+        images (list): PIL Images, all the same size
+        cols (int): number of columns
+        rows (int): number of rows
+        bgcolor (str): color for empty cells
+
+    Returns:
+        PIL.Image: the tiled sheet
+    '''
+
+    width, height = images[0].size
+    sheet = Image.new('RGB', (width * cols, height * rows), bgcolor)
+
+    for i, image in enumerate(images[:cols * rows]):
+        sheet.paste(image, ((i % cols) * width, (i // cols) * height))
+
+    return sheet
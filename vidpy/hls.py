@@ -0,0 +1,200 @@
+'''
+HTTP Live Streaming (HLS) packaging, for adaptive bitrate ladders rendered in a single pass
+
+Every rendition is encoded from the same melt render through the multi consumer, with
+fixed GOPs that line up with the segment length (and scene cut keyframes turned off),
+so all renditions switch at the same frames. The master playlist is written afterwards.
+'''
+
+import os
+import re
+
+# a typical ladder for 1080p sources, highest quality first
+LADDER = [
+    {'height': 1080, 'bitrate': '5M', 'audio_bitrate': '192k'},
+    {'height': 720, 'bitrate': '3M', 'audio_bitrate': '128k'},
+    {'height': 480, 'bitrate': '1200k', 'audio_bitrate': '96k'},
+    {'height': 360, 'bitrate': '700k', 'audio_bitrate': '96k'},
+]
+
+PLAYLIST_NAME = 'index.m3u8'
+SEGMENT_PATTERN = 'segment%05d.ts'
+
+# H.264 profiles, as the profile and constraint bytes of their codec strings
+H264_PROFILES = {
+    'baseline': '42e0',
+    'main': '4d40',
+    'high': '6400',
+}
+
+# H.264 levels from 3.0 up, with their limits: macroblocks per second, macroblocks per frame
+# and main profile bitrate in kbps
+H264_LEVELS = [
+    ('3.0', 40500, 1620, 10000),
+    ('3.1', 108000, 3600, 14000),
+    ('3.2', 216000, 5120, 20000),
+    ('4.0', 245760, 8192, 20000),
+    ('4.1', 245760, 8192, 50000),
+    ('4.2', 522240, 8704, 50000),
+    ('5.0', 589824, 22080, 135000),
+    ('5.1', 983040, 36864, 240000),
+    ('5.2', 2073600, 36864, 240000),
+]
+
+
+def parse_bitrate(bitrate):
+    '''Converts a bitrate like "3M", "800k" or 128000 to bits per second'''
+
+    match = re.match(r'^\s*([\d.]+)\s*([kKmMgG]?)\s*$', str(bitrate))
+    if not match:
+        raise ValueError('invalid bitrate {!r}'.format(bitrate))
+
+    scale = {'': 1, 'k': 1000, 'm': 1000000, 'g': 1000000000}[match.group(2).lower()]
+    return int(float(match.group(1)) * scale)
+
+
+def gop_frames(segment_time, fps):
+    '''Returns the keyframe interval in frames for a segment length, so segments always start on a keyframe'''
+
+    return max(int(round(segment_time * fps)), 1)
+
+
+def rendition_size(rendition, width, height):
+    '''Returns the (width, height) of a rendition, keeping the composition's aspect ratio
+    if only one of them is given. Sizes are rounded to even numbers for yuv420p.'''
+
+    w, h = rendition.get('width'), rendition.get('height')
+
+    if w is None and h is None:
+        w, h = width, height
+    elif w is None:
+        w = h * float(width) / height
+    elif h is None:
+        h = w * float(height) / width
+
+    return int(round(w / 2.0)) * 2, int(round(h / 2.0)) * 2
+
+
+def h264_level(width, height, fps, bitrate):
+    '''Returns the lowest H.264 level, like "3.1", that allows a size, frame rate and bitrate'''
+
+    frame = ((width + 15) // 16) * ((height + 15) // 16)
+    for level, per_second, per_frame, kbps in H264_LEVELS:
+        if frame <= per_frame and frame * fps <= per_second and bitrate <= kbps * 1000:
+            return level
+    return H264_LEVELS[-1][0]
+
+
+def fit_ladder(ladder, width, height):
+    '''Removes the renditions that are bigger than the composition, since upscaling only wastes bits.
+    If none of them fit, the lowest one is kept at the composition's size.'''
+
+    fitted = []
+    for rendition in ladder:
+        w, h = rendition_size(rendition, width, height)
+        if w <= width and h <= height:
+            fitted.append(rendition)
+
+    if not fitted and ladder:
+        fitted = [dict(ladder[-1], width=width, height=height)]
+
+    return fitted
+
+
+def rendition_name(rendition, width, height):
+    '''Returns the directory name of a rendition, like "720p"'''
+
+    return rendition.get('name') or '{}p'.format(rendition_size(rendition, width, height)[1])
+
+
+def rendition_params(rendition, directory, width, height, fps, segment_time=4):
+    '''Returns melt avformat consumer parameters that encode one rendition to HLS.
+
+    Args:
+        rendition (dict): "height" and/or "width", "bitrate", and optionally "audio_bitrate",
+            "name" and any other parameters to pass to ffmpeg
+        directory (str): the directory for the rendition's playlist and segments
+        width (int): width of the composition
+        height (int): height of the composition
+        fps (float): frame rate of the composition
+        segment_time (float): target length of each segment in seconds
+
+    Returns:
+        dict
+    '''
+
+    w, h = rendition_size(rendition, width, height)
+    bitrate = parse_bitrate(rendition['bitrate'])
+    gop = gop_frames(segment_time, fps)
+
+    params = {
+        'width': w,
+        'height': h,
+        'vcodec': rendition.get('vcodec', 'libx264'),
+        'pix_fmt': 'yuv420p',
+        'vb': bitrate,
+        # cap the rate so players can trust the advertised bandwidth
+        'maxrate': bitrate,
+        'bufsize': bitrate * 2,
+        # fixed GOPs, so every rendition has keyframes on the same frames
+        'g': gop,
+        'keyint_min': gop,
+        'sc_threshold': 0,
+        'acodec': 'aac',
+        'ab': rendition.get('audio_bitrate', '128k'),
+        'threads': 0,
+        'f': 'hls',
+        'hls_time': '%.6g' % (gop / float(fps)),
+        'hls_playlist_type': 'vod',
+        'hls_segment_filename': os.path.join(directory, SEGMENT_PATTERN),
+    }
+
+    # main profile at the lowest level that fits plays on most devices (melt calls ffmpeg's -profile:v "vprofile")
+    if params['vcodec'] == 'libx264':
+        params['preset'] = 'medium'
+        params['vprofile'] = 'main'
+        params['level'] = h264_level(w, h, fps, bitrate)
+
+    params.update((key, val) for key, val in rendition.items() if key not in ('name', 'width', 'height', 'bitrate', 'audio_bitrate'))
+
+    return params
+
+
+def rendition_codecs(params):
+    '''Returns the codec string of a rendition for the master playlist, like "avc1.4d401f,mp4a.40.2",
+    or None if its codecs can't be described (players then probe the segments themselves).'''
+
+    if params.get('vcodec') != 'libx264' or params.get('vprofile') not in H264_PROFILES or params.get('acodec') != 'aac':
+        return None
+
+    level = int(round(float(params['level']) * 10))
+    return 'avc1.{}{:02x},mp4a.40.2'.format(H264_PROFILES[params['vprofile']], level)
+
+
+def master_playlist(renditions, width, height, fps):
+    '''Returns the text of a master playlist that lists each rendition's playlist.
+
+    Args:
+        renditions (list): rendition dicts, as in rendition_params
+        width (int): width of the composition
+        height (int): height of the composition
+        fps (float): frame rate of the composition
+
+    Returns:
+        str
+    '''
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-INDEPENDENT-SEGMENTS']
+
+    for rendition in renditions:
+        name = rendition_name(rendition, width, height)
+        params = rendition_params(rendition, name, width, height, fps)
+        bandwidth = parse_bitrate(rendition['bitrate']) + parse_bitrate(params['ab'])
+        info = 'BANDWIDTH={},RESOLUTION={}x{}'.format(bandwidth, params['width'], params['height'])
+        codecs = rendition_codecs(params)
+        if codecs is not None:
+            info += ',CODECS="{}"'.format(codecs)
+        lines.append('#EXT-X-STREAM-INF:' + info)
+        lines.append('{}/{}'.format(name, PLAYLIST_NAME))
+
+    return '\n'.join(lines) + '\n'
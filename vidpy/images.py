@@ -0,0 +1,195 @@
+'''
+Fast paths for image sequences and still images
+
+Image sequences are read by ffmpeg's image2 demuxer instead of loading each file as its own
+producer, so frames are decoded ahead on several threads. Stills are scaled to the output
+size once and cached, so melt only decodes them once and doesn't rescale them on every frame.
+'''
+
+import os
+import re
+import glob
+import json
+import hashlib
+from collections import Counter
+from PIL import Image
+from .clip import Clip, IMAGE_EXTENSIONS
+from .utils import cache_path, file_fingerprint, save_image, Timebase
+
+# how a still is fit into the output size
+FIT_MODES = ('contain', 'cover', 'stretch')
+
+
+def _number_pattern(pattern):
+    '''Converts a printf style pattern like "frame%05d.png" into a regex that matches its files'''
+
+    parts = re.split(r'%(0?\d*)d', os.path.basename(pattern))
+    regex = ''
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            regex += re.escape(part)
+        else:
+            regex += r'(\d{%d})' % int(part) if part else r'(\d+)'
+    return re.compile('^' + regex + '$')
+
+
+def _glob_escape(path):
+    '''Escapes glob characters in a path, for glob and ffmpeg's glob pattern type'''
+
+    return re.sub(r'([*?[])', r'[\1]', path)
+
+
+def sequence_files(pattern):
+    '''Lists the files in an image sequence, in order.
+
+    Args:
+        pattern (str): a directory of images, a glob like "frames/*.png",
+            or a numbered pattern like "frames/%05d.png"
+
+    Returns:
+        (pattern, files) tuple, where pattern is the glob or numbered pattern to give ffmpeg
+    '''
+
+    if os.path.isdir(pattern):
+        extensions = Counter(os.path.splitext(name)[1] for name in os.listdir(pattern) if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        if not extensions:
+            raise ValueError('no images found in {}'.format(pattern))
+        pattern = os.path.join(_glob_escape(pattern), '*' + extensions.most_common(1)[0][0])
+        return pattern, sorted(glob.glob(pattern))
+
+    # only the file name is a pattern, so directories can have any name
+    directory, name = os.path.split(pattern)
+
+    if '*' in name or '[' in name:
+        pattern = os.path.join(_glob_escape(directory), name)
+        return pattern, sorted(glob.glob(pattern))
+
+    if '%' in name:
+        regex = _number_pattern(name)
+        matches = [(int(m.group(1)), filename) for m, filename in ((regex.match(filename), filename) for filename in os.listdir(directory or '.')) if m]
+        pattern = os.path.join(directory.replace('%', '%%'), name)
+        return pattern, [os.path.join(directory, filename) for number, filename in sorted(matches)]
+
+    raise ValueError('{} is not a directory, glob (with * or [...]) or numbered pattern (with %d)'.format(pattern))
+
+
+class ImageSequence(Clip):
+    '''A clip made from a sequence of images, like rendered frames.
+
+    Args:
+        pattern (str): a directory of images, a glob like "frames/*.png", or a numbered
+            pattern like "frames/%05d.png"
+        fps (float): frame rate of the sequence
+        threads (int): decoding threads (0 uses one for each cpu)
+        **kwargs: Option parameters that will get sent to melt
+    '''
+
+    def __init__(self, pattern, fps=30, threads=0, start=0, end=None, offset=0, **kwargs):
+        self.pattern, self.files = sequence_files(pattern)
+        if not self.files:
+            raise ValueError('no images match {}'.format(pattern))
+
+        self.sequence_timebase = Timebase(fps)
+        self._sequence_profile = None
+        rate = self.sequence_timebase.fps
+
+        options = [('framerate', '{}/{}'.format(rate.numerator, rate.denominator))]
+        if '%' in os.path.basename(self.pattern):
+            options += [('pattern_type', 'sequence'), ('start_number', int(_number_pattern(self.pattern).match(os.path.basename(self.files[0])).group(1)))]
+        else:
+            options += [('pattern_type', 'glob')]
+
+        resource = 'avformat:image2:{}?{}'.format(self.pattern, '&'.join('{}={}'.format(k, v) for k, v in options))
+
+        Clip.__init__(self, resource, start=start, end=end, offset=offset, threads=threads, **kwargs)
+
+
+    def get_profile(self):
+        '''Returns the profile of the sequence, read from its first image instead of probing with melt'''
+
+        if self._sequence_profile is not None:
+            return self._sequence_profile
+
+        rate = self.sequence_timebase.fps
+        width, height = Image.open(self.files[0]).size
+
+        self._sequence_profile = {
+            'total_frames': len(self.files),
+            'fps': float(rate),
+            'frame_rate_num': rate.numerator,
+            'frame_rate_den': rate.denominator,
+            'width': width,
+            'height': height,
+            'duration': round(len(self.files) / float(rate), 2)
+        }
+        return self._sequence_profile
+
+
+def still_image(resource, width, height, fit='contain'):
+    '''Returns the path to a cached copy of an image, scaled to a size.
+
+    Args:
+        resource (str): path to an image
+        width (int): width to scale to
+        height (int): height to scale to
+        fit (str): "contain" to fit inside the size with transparent borders, "cover" to fill
+            it and crop the edges, or "stretch" to ignore the aspect ratio
+
+    Returns:
+        str: path to a png
+    '''
+
+    if fit not in FIT_MODES:
+        raise ValueError('fit must be one of {}, not {!r}'.format(', '.join(FIT_MODES), fit))
+
+    key = json.dumps([file_fingerprint(resource), width, height, fit])
+    filename = cache_path('stills', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    if os.path.exists(filename):
+        return filename
+
+    image = Image.open(resource).convert('RGBA')
+
+    if fit == 'stretch':
+        output = image.resize((width, height), Image.LANCZOS)
+    else:
+        scale = (max if fit == 'cover' else min)(float(width) / image.width, float(height) / image.height)
+        size = (max(int(round(image.width * scale)), 1), max(int(round(image.height * scale)), 1))
+        image = image.resize(size, Image.LANCZOS)
+        output = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        output.paste(image, ((width - size[0]) // 2, (height - size[1]) // 2))
+
+    return save_image(output, filename)
+
+
+class Still(Clip):
+    '''A still image, decoded and scaled once to the output size and held for the clip's duration.
+
+    Args:
+        resource (str): path to an image
+        resolution (tuple): (width, height) to scale to. Defaults to the size of the composition it's rendered in
+        fit (str): "contain" (default), "cover" or "stretch" (see still_image)
+        **kwargs: Option parameters that will get sent to melt
+    '''
+
+    def __init__(self, resource, start=0, end=None, offset=0, resolution=None, fit='contain', **kwargs):
+        if fit not in FIT_MODES:
+            raise ValueError('fit must be one of {}, not {!r}'.format(', '.join(FIT_MODES), fit))
+
+        self.source = resource
+        self.resolution = resolution
+        self.fit = fit
+
+        if resolution is not None:
+            resource = still_image(resource, resolution[0], resolution[1], fit=fit)
+
+        Clip.__init__(self, resource, start=start, end=end, offset=offset, **kwargs)
+
+
+    def prepare(self, width=None, height=None):
+        '''Scales the image to the composition's size, unless the still has its own resolution'''
+
+        if self.resolution is None and width and height:
+            self.resource = still_image(self.source, width, height, fit=self.fit)
+
+        return Clip.prepare(self, width, height)
@@ -0,0 +1,180 @@
+'''
+Cached intermediate media for clips that are expensive to play from their source
+
+Reversed and very fast clips make melt seek on every frame, which is slow on long-GOP
+sources like H.264. These clips are rendered once with ffmpeg into an all-intra file
+(reversed ahead of time when it's short enough), and kept in the cache directory.
+Slow motion can also be frame blended or motion interpolated this way.
+
+The cache is kept under config.INTERMEDIATE_CACHE_SIZE by removing the least recently
+used intermediates whenever a new one is made.
+'''
+
+import os
+import json
+import hashlib
+from subprocess import call
+from . import config
+from .utils import cache_path, file_fingerprint
+
+# slow motion quality modes, as ffmpeg minterpolate modes
+QUALITY_MODES = {
+    'blend': 'blend',
+    'interpolate': 'mci',
+}
+
+# ffmpeg arguments for all-intra intermediates, which can be decoded from any frame
+INTRA_ARGS = ['-c:v', 'mjpeg', '-q:v', '2', '-pix_fmt', 'yuvj422p', '-c:a', 'pcm_s16le']
+INTRA_EXTENSION = '.mov'
+
+
+def atempo(factor):
+    '''Returns atempo filters that change the audio speed by factor (each one handles 0.5 to 2)'''
+
+    filters = []
+    while factor > 2.0:
+        filters.append('atempo=2.0')
+        factor /= 2.0
+    while factor < 0.5:
+        filters.append('atempo=0.5')
+        factor /= 0.5
+    filters.append('atempo=%.10g' % factor)
+    return filters
+
+
+def plan(speed, quality=None, length=None, fps=None):
+    '''Decides if a clip needs an intermediate file, and how to make it.
+
+    Args:
+        speed (float): the clip's playback speed
+        quality (str): None for plain retiming, "blend" or "interpolate" for smoother slow motion
+        length (float): length of the source range in seconds, if known
+        fps (Fraction): frame rate of the source, needed for blend and interpolate
+
+    Returns:
+        (video filters, audio filters, speed) tuple, where speed is what's left for melt
+        to apply to the intermediate, or None if the source can be played directly
+    '''
+
+    if quality is not None:
+        if quality not in QUALITY_MODES:
+            raise ValueError('quality must be one of {}, not {!r}'.format(', '.join(sorted(QUALITY_MODES)), quality))
+        video, audio = ([], []) if speed > 0 else (['reverse'], ['areverse'])
+        video += ['setpts=PTS/%.10g' % abs(speed), 'minterpolate=fps={}/{}:mi_mode={}'.format(fps.numerator, fps.denominator, QUALITY_MODES[quality])]
+        audio += atempo(abs(speed))
+        return video, audio, 1.0
+
+    if speed < 0:
+        # reversing buffers the whole range in memory, so long ranges are only made all-intra
+        if length is not None and length <= config.REVERSE_MAX_SECONDS:
+            return ['reverse'], ['areverse'], abs(speed)
+        return [], [], speed
+
+    if speed >= config.INTERMEDIATE_SPEED:
+        return [], [], speed
+
+    return None
+
+
+def build(resource, video_filters=None, audio_filters=None, start=None, end=None):
+    '''Renders a range of a file to a cached all-intra intermediate, unless it's already cached.
+
+    Args:
+        resource (str): path to a media file
+        video_filters (list): ffmpeg video filters to apply
+        audio_filters (list): ffmpeg audio filters to apply
+        start (float): start of the range in seconds
+        end (float): end of the range in seconds (defaults to the end of the file)
+
+    Returns:
+        str: path to the intermediate file
+    '''
+
+    params = [video_filters or [], audio_filters or [], start, end, INTRA_ARGS]
+    key = hashlib.sha1(json.dumps(params).encode('utf-8')).hexdigest()[:12]
+    filename = cache_path('intermediates', '{}-{}{}'.format(file_fingerprint(resource), key, INTRA_EXTENSION))
+
+    if os.path.exists(filename):
+        # mark it as recently used, so prune keeps it
+        os.utime(filename, None)
+        return filename
+
+    args = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+
+    if start:
+        args += ['-ss', '%.6f' % start]
+
+    args += ['-i', resource]
+
+    if end is not None:
+        args += ['-t', '%.6f' % (end - (start or 0))]
+
+    args += ['-map', '0:v:0', '-map', '0:a:0?']
+
+    if video_filters:
+        args += ['-vf', ','.join(video_filters)]
+
+    if audio_filters:
+        args += ['-af', ','.join(audio_filters)]
+
+    # write to a temporary name first, so an interrupted render is never mistaken for a finished one
+    tempname = '{}.{}.tmp{}'.format(filename, os.getpid(), INTRA_EXTENSION)
+    args += INTRA_ARGS + [tempname]
+
+    if call(args) != 0:
+        if os.path.exists(tempname):
+            os.remove(tempname)
+        raise RuntimeError('ffmpeg could not make an intermediate of {}'.format(resource))
+
+    os.rename(tempname, filename)
+    prune(keep=filename)
+
+    return filename
+
+
+def prune(limit=None, keep=None):
+    '''Removes the least recently used intermediates until the cache fits in limit.
+
+    Args:
+        limit (float): size in megabytes (defaults to config.INTERMEDIATE_CACHE_SIZE, None for no limit)
+        keep (str): a file that's never removed, like one that's about to be used
+
+    Returns:
+        list: paths of the removed files
+    '''
+
+    if limit is None:
+        limit = config.INTERMEDIATE_CACHE_SIZE
+        if limit is None:
+            return []
+
+    directory = os.path.dirname(cache_path('intermediates', 'x'))
+    entries = []
+    for name in os.listdir(directory):
+        # skip intermediates that are still being rendered
+        if '.tmp' in name:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for mtime, size, path in entries)
+    limit = limit * 1024 * 1024
+    removed = []
+
+    for mtime, size, path in sorted(entries):
+        if total <= limit:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+
+    return removed
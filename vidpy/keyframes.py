@@ -0,0 +1,171 @@
+'''
+Fast keyframe strings for animating melt parameters from arrays of data
+
+Keyframes are serialized with a single string formatting call, and can be thinned
+out to the ones that matter for linear interpolation within a tolerance.
+'''
+
+from .utils import np, Timebase
+
+
+def to_frames(times, fps=None):
+    '''Converts keyframe times to frame numbers.
+
+    Args:
+        times (list): keyframe times, in frames, or in seconds if fps is given
+        fps: frame rate of the times in seconds
+
+    Returns:
+        list of ints
+    '''
+
+    if fps is not None:
+        frames = Timebase(fps).to_frames(times)
+    else:
+        frames = times
+
+    if np is not None:
+        return np.asarray(frames, dtype=np.int64).tolist()
+
+    return [int(f) for f in frames]
+
+
+def simplify(times, columns, tolerance):
+    '''Finds the keyframes needed to reproduce values within a tolerance with linear interpolation.
+
+    Uses the Ramer-Douglas-Peucker algorithm over all columns at once: a keyframe is kept
+    if leaving it out would move any column by more than the tolerance.
+
+    Args:
+        times (list): keyframe times
+        columns (list): lists of values, one per animated parameter
+        tolerance (float): maximum error allowed, in the units of the values
+
+    Returns:
+        list: sorted indexes of the keyframes to keep
+    '''
+
+    count = len(times)
+    if count < 3:
+        return list(range(count))
+
+    if np is not None:
+        t = np.asarray(times, dtype=np.float64)
+        v = np.asarray(columns, dtype=np.float64).T
+
+    keep = [0, count - 1]
+    stack = [(0, count - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        if np is not None:
+            span = t[last] - t[first]
+            weights = (t[first + 1:last] - t[first]) / span if span else np.zeros(last - first - 1)
+            expected = v[first] + weights[:, None] * (v[last] - v[first])
+            errors = np.abs(v[first + 1:last] - expected).max(axis=1)
+            worst = int(errors.argmax())
+            error = errors[worst]
+            worst += first + 1
+        else:
+            error, worst = -1, None
+            span = float(times[last] - times[first])
+            for i in range(first + 1, last):
+                weight = (times[i] - times[first]) / span if span else 0
+                e = max(abs(c[i] - (c[first] + weight * (c[last] - c[first]))) for c in columns)
+                if e > error:
+                    error, worst = e, i
+
+        if error > tolerance:
+            keep.append(worst)
+            stack.append((first, worst))
+            stack.append((worst, last))
+
+    return sorted(keep)
+
+
+def serialize(frames, columns, template):
+    '''Formats keyframes as a melt animation string.
+
+    Args:
+        frames (list): keyframe frame numbers
+        columns (list): lists of values, one per placeholder in the template after the frame
+        template (str): format for one keyframe, like "%d=%.10g"
+
+    Returns:
+        str: keyframes joined by ";"
+    '''
+
+    if np is not None and columns:
+        values = np.column_stack([np.asarray(frames, dtype=np.float64)] + [np.asarray(c, dtype=np.float64) for c in columns]).ravel().tolist()
+    else:
+        values = [v for row in zip(frames, *columns) for v in row]
+
+    return ';'.join([template] * len(frames)) % tuple(values)
+
+
+def _prepare(times, columns, tolerance, fps):
+    frames = to_frames(times, fps)
+
+    if np is not None:
+        columns = [np.asarray(c, dtype=np.float64).tolist() for c in columns]
+    else:
+        columns = [list(c) for c in columns]
+
+    if tolerance is not None:
+        keep = simplify(frames, columns, tolerance)
+        frames = [frames[i] for i in keep]
+        columns = [[c[i] for i in keep] for c in columns]
+
+    return frames, columns
+
+
+def scalar(times, values, tolerance=None, fps=None):
+    '''Creates an animation string for any numeric melt parameter.
+
+    Args:
+        times (list): keyframe times, in frames, or in seconds if fps is given
+        values (list): the value at each keyframe
+        tolerance (float): if set, drop keyframes that linear interpolation reproduces within this amount
+        fps: frame rate of the times in seconds
+
+    Returns:
+        str: a melt animation string like "0=0;10=0.5;20=1"
+    '''
+
+    frames, columns = _prepare(times, [values], tolerance, fps)
+    return serialize(frames, columns, '%d=%.10g')
+
+
+def rect(times, x, y, w, h, opacity=None, tolerance=None, fps=None):
+    '''Creates a geometry animation string for affine and composite transitions.
+
+    Args:
+        times (list): keyframe times, in frames, or in seconds if fps is given
+        x (list): x position in pixels at each keyframe
+        y (list): y position in pixels at each keyframe
+        w (list): width in pixels at each keyframe
+        h (list): height in pixels at each keyframe
+        opacity (list): optional opacity between 0 and 1 at each keyframe
+        tolerance (float): if set, drop keyframes that linear interpolation reproduces within this many pixels (or percent of opacity)
+        fps: frame rate of the times in seconds
+
+    Returns:
+        str: a melt geometry string like "0=0/0:100x100;10=50/50:100x100"
+    '''
+
+    columns = [x, y, w, h]
+    template = '%d=%.10g/%.10g:%.10gx%.10g'
+
+    if opacity is not None:
+        if np is not None:
+            opacity = np.asarray(opacity, dtype=np.float64) * 100
+        else:
+            opacity = [o * 100 for o in opacity]
+        columns.append(opacity)
+        template += ':%.10g'
+
+    frames, columns = _prepare(times, columns, tolerance, fps)
+    return serialize(frames, columns, template)
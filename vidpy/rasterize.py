@@ -0,0 +1,183 @@
+'''
+Rasterizes static text to transparent images, so melt doesn't lay it out on every frame
+
+Images are cached on disk by a hash of everything that affects how they look, so
+the same lower third is only drawn once, across compositions and processes.
+'''
+
+import os
+import re
+import json
+import hashlib
+from subprocess import check_output, CalledProcessError
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+from .utils import cache_path, save_image
+
+# dynamictext keywords, like #timecode# or #frame#, that change on every frame
+DYNAMIC_TEXT = re.compile(r'#\w[\w.]*#')
+
+# css font weights to fontconfig weights
+FC_WEIGHTS = {100: 0, 200: 40, 300: 50, 400: 80, 500: 100, 600: 180, 700: 200, 800: 205, 900: 210, 1000: 215}
+
+# fontconfig aliases that any font can stand in for
+GENERIC_FAMILIES = ('sans', 'sans-serif', 'serif', 'monospace', 'mono')
+
+_fonts = {}
+
+
+def is_dynamic(text):
+    '''Checks if text contains dynamictext keywords that need to be drawn on every frame'''
+
+    return DYNAMIC_TEXT.search(text) is not None
+
+
+def parse_color(color):
+    '''Converts a melt color ("#rrggbb", "#rrggbbaa", "0xrrggbbaa" or a color name) to an RGBA tuple'''
+
+    color = str(color)
+
+    if color.startswith('0x'):
+        color = '#' + color[2:]
+
+    if color.startswith('#') and len(color) == 9:
+        return tuple(int(color[i:i+2], 16) for i in (1, 3, 5, 7))
+
+    return ImageColor.getcolor(color, 'RGBA')
+
+
+def find_font(family, size, weight=400, style='normal'):
+    '''Finds a font file with fontconfig and loads it.
+
+    fontconfig always suggests some font, so its suggestion is only used if it's the
+    family that was asked for (or any font, for generic families like "Sans").
+
+    Args:
+        family (str): font family name, or path to a font file
+        size (int): font size in pixels
+        weight (int): font weight, between 100 and 1000
+        style (str): "normal" or "italic"
+
+    Returns:
+        ImageFont, or None if the font can't be found
+    '''
+
+    key = (family, size, weight, style)
+    if key in _fonts:
+        return _fonts[key]
+
+    candidates = [family]
+    fc_weight = FC_WEIGHTS[min(max(int(round(weight / 100.0)) * 100, 100), 1000)]
+    pattern = '{}:weight={}{}'.format(family, fc_weight, ':slant=100' if style == 'italic' else '')
+
+    try:
+        filename, _, families = check_output(['fc-match', '-f', '%{file}|%{family}', pattern]).decode('utf-8').partition('|')
+        if family.lower() in GENERIC_FAMILIES or family.lower() in [f.strip().lower() for f in families.split(',')]:
+            candidates.insert(0, filename)
+    except (OSError, CalledProcessError):
+        pass
+
+    font = None
+    for candidate in candidates:
+        try:
+            font = ImageFont.truetype(candidate, size)
+            break
+        except (IOError, OSError):
+            continue
+
+    _fonts[key] = font
+    return font
+
+
+def _length(value, total):
+    '''Converts a pixel or percent value to pixels'''
+
+    value = str(value)
+    if value.endswith('%'):
+        return int(round(float(value[:-1]) * total / 100.0))
+    return int(round(float(value)))
+
+
+def _text_size(font, text):
+    '''Returns the (width, height) of a line of text, with the APIs of both old and new versions of Pillow'''
+
+    if hasattr(font, 'getbbox'):
+        left, top, right, bottom = font.getbbox(text)
+        return right, bottom
+    return font.getsize(text)
+
+
+def render_text(text, width, height, font="Sans", size=1080, color="#ffffff", bgcolor="0x00000000", olcolor="0x00000000", outline=0, halign="center", valign="middle", pad=0, style="normal", weight=400, bbox=(0, 0, '100%', '100%')):
+    '''Draws text on a transparent image, laid out like melt's dynamictext filter.
+
+    Returns:
+        PIL.Image: an RGBA image
+
+    Raises:
+        ValueError: if the font can't be found
+    '''
+
+    pil_font = find_font(font, size, weight, style)
+    if pil_font is None:
+        raise ValueError('could not find the font {!r}'.format(font))
+
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    x, y = _length(bbox[0], width), _length(bbox[1], height)
+    w, h = _length(bbox[2], width), _length(bbox[3], height)
+
+    align = {'centre': 'center'}.get(halign, halign)
+
+    # lines are laid out by hand, since Pillow 4.3 can't measure or outline multiline text
+    lines = text.split('\n')
+    sizes = [_text_size(pil_font, line or ' ') for line in lines]
+    line_h = max(size[1] for size in sizes)
+    spacing = 4
+    text_w = max(size[0] for size in sizes) + outline * 2
+    text_h = line_h * len(lines) + spacing * (len(lines) - 1) + outline * 2
+
+    tx = {'left': x + pad, 'right': x + w - pad - text_w}.get(align, x + (w - text_w) // 2)
+    ty = {'top': y + pad, 'bottom': y + h - pad - text_h}.get(valign, y + (h - text_h) // 2)
+
+    background = parse_color(bgcolor)
+    if background[3] > 0:
+        draw.rectangle([tx - pad, ty - pad, tx + text_w + pad, ty + text_h + pad], fill=background)
+
+    fill, outline_fill = parse_color(color), parse_color(olcolor)
+    offsets = [(dx, dy) for dx in range(-outline, outline + 1) for dy in range(-outline, outline + 1) if 0 < dx * dx + dy * dy <= outline * outline]
+
+    for i, (line, size) in enumerate(zip(lines, sizes)):
+        lx = tx + outline + {'left': 0, 'right': text_w - outline * 2 - size[0]}.get(align, (text_w - outline * 2 - size[0]) // 2)
+        ly = ty + outline + i * (line_h + spacing)
+
+        # the outline is the text stamped all around its position, under the text itself
+        for dx, dy in offsets:
+            draw.text((lx + dx, ly + dy), line, font=pil_font, fill=outline_fill)
+        draw.text((lx, ly), line, font=pil_font, fill=fill)
+
+    return image
+
+
+def text_image(text, width, height, **params):
+    '''Returns the path to a cached image of static text, drawing it if needed.
+
+    Args:
+        text (str): the text
+        width (int): width of the image
+        height (int): height of the image
+        **params: styling arguments for render_text
+
+    Returns:
+        str: path to a png
+
+    Raises:
+        ValueError: if the font can't be found
+    '''
+
+    key = json.dumps([text, width, height, sorted((k, str(v)) for k, v in params.items())])
+    filename = cache_path('text', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    if os.path.exists(filename):
+        return filename
+
+    return save_image(render_text(text, width, height, **params), filename)
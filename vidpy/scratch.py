@@ -0,0 +1,199 @@
+'''
+Scratch space for temporary files
+
+Temporary files go in a private directory that's removed when Python exits,
+instead of the current working directory. Set config.SCRATCH_DIR to choose where
+that directory is made ("ram" uses a RAM disk like /dev/shm when there is one),
+and config.SCRATCH_QUOTA to cap how much it can hold. The quota is checked whenever
+write() (or Job.write and xml_resource) adds a file. Files that melt or ffmpeg write
+to a Job.path() count towards the quota, but can't be stopped from going over it.
+Chunked renders and cached intermediates are kept elsewhere and aren't covered.
+
+Each task that needs temporary files can also use its own Job directory, which
+is removed as soon as the task is done:
+
+    with scratch.Job() as job:
+        resource = job.xml_resource(xml)
+        ...
+'''
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import uuid
+from . import config
+
+# melt's producer for xml passed as a string instead of a file
+XML_PREFIX = 'xml-string:'
+
+# RAM backed filesystems to use when config.SCRATCH_DIR is "ram"
+RAM_DIRS = ('/dev/shm', '/run/shm')
+
+_directory = None
+_base = None
+# every scratch directory made so far, so cleanup removes them all (config.SCRATCH_DIR can change)
+_directories = []
+
+
+class ScratchFullError(IOError):
+    '''Raised when writing a file would take the scratch directory over config.SCRATCH_QUOTA'''
+    pass
+
+
+def base_directory():
+    '''Returns the directory the scratch directory is made in (None for the system default)'''
+
+    if config.SCRATCH_DIR == 'ram':
+        for candidate in RAM_DIRS:
+            if os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+                return candidate
+        return None
+
+    return config.SCRATCH_DIR
+
+
+def directory():
+    '''Returns the scratch directory, creating it if needed'''
+
+    global _directory, _base
+
+    base = base_directory()
+    if _directory is None or base != _base or not os.path.isdir(_directory):
+        if base is not None and not os.path.exists(base):
+            os.makedirs(base)
+        _directory = tempfile.mkdtemp(prefix='vidpy-', dir=base)
+        _directories.append(_directory)
+        _base = base
+
+    return _directory
+
+
+def usage():
+    '''Returns the number of bytes used in the scratch directories'''
+
+    total = 0
+    for scratch_dir in _directories:
+        for root, dirs, files in os.walk(scratch_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+def reserve(size):
+    '''Checks that size more bytes fit in the scratch directory, raising ScratchFullError if not'''
+
+    if config.SCRATCH_QUOTA is None:
+        return
+
+    quota = config.SCRATCH_QUOTA * 1024 * 1024
+    used = usage()
+    if used + size > quota:
+        raise ScratchFullError('scratch space is full: {} bytes used, {} more needed, quota is {}MB'.format(used, size, config.SCRATCH_QUOTA))
+
+
+def path(suffix='', parent=None):
+    '''Returns a new, unique path in the scratch directory (or in parent)'''
+
+    return os.path.join(parent or directory(), uuid.uuid4().hex + suffix)
+
+
+def write(data, suffix='.xml', parent=None):
+    '''Writes bytes to a new scratch file and returns its path'''
+
+    reserve(len(data))
+
+    filename = path(suffix, parent)
+    with open(filename, 'wb') as outfile:
+        outfile.write(data)
+    return filename
+
+
+def xml_resource(xml, parent=None):
+    '''Returns a melt resource for an mlt xml document.
+
+    Small documents are passed to melt through the xml-string producer, so nothing is written
+    to disk. Documents too long for a command line argument go to a scratch file, and so does
+    everything on Windows, where the whole command line is limited to about 32K characters.
+
+    Args:
+        xml: mlt xml, as bytes or str
+        parent (str): directory for the scratch file (defaults to the scratch directory)
+
+    Returns:
+        str: "xml-string:" and the xml, or the path to a scratch file containing it
+    '''
+
+    if not isinstance(xml, bytes):
+        xml = xml.encode('utf-8')
+
+    if sys.platform != 'win32' and len(xml) <= config.INLINE_XML_LIMIT:
+        return XML_PREFIX + xml.decode('utf-8')
+
+    return write(xml, parent=parent)
+
+
+def inline_xml(resource):
+    '''Returns the xml of a resource made by xml_resource, or None if it's a file'''
+
+    if resource.startswith(XML_PREFIX):
+        return resource[len(XML_PREFIX):]
+    return None
+
+
+def cleanup():
+    '''Removes the scratch directories and everything in them'''
+
+    global _directory
+    while _directories:
+        shutil.rmtree(_directories.pop(), ignore_errors=True)
+    _directory = None
+
+
+atexit.register(cleanup)
+
+
+class Job(object):
+    '''A scratch directory for one task, removed when the task is done.
+
+    Use it as a context manager, or call cleanup() when finished.
+    '''
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='job-', dir=directory())
+
+
+    def path(self, suffix=''):
+        '''Returns a new, unique path in the job directory'''
+
+        return path(suffix, self.directory)
+
+
+    def write(self, data, suffix='.xml'):
+        '''Writes bytes to a new file in the job directory and returns its path'''
+
+        return write(data, suffix, self.directory)
+
+
+    def xml_resource(self, xml):
+        '''Returns a melt resource for an mlt xml document (see scratch.xml_resource)'''
+
+        return xml_resource(xml, self.directory)
+
+
+    def cleanup(self):
+        '''Removes the job directory and everything in it'''
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.cleanup()
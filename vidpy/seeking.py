@@ -0,0 +1,187 @@
+'''
+Keyframe indexes, for finding how expensive it is to start a clip at a given time
+
+Melt seeks to the keyframe before a clip's in-point and decodes every frame from there,
+each time the clip starts. The keyframes near a time are read from the packets in a short
+window around it with ffprobe (without decoding anything, or reading the rest of the file).
+Each file has one index on disk, which collects every window read so far along with the
+spans of the file it covers, so a time is only probed once.
+'''
+
+import os
+import json
+from bisect import bisect_left, bisect_right
+from subprocess import check_output, CalledProcessError
+from .utils import cache_path, file_fingerprint, Second
+
+# seconds of packets to read on each side of a time when looking for keyframes near it
+WINDOW = 10.0
+
+_indexes = {}
+
+
+def _index(fingerprint):
+    '''Returns the keyframe index of a file: the keyframes found so far and the [start, end] spans they cover'''
+
+    if fingerprint not in _indexes:
+        index = {'spans': [], 'keyframes': []}
+        cachefile = cache_path('keyframes', fingerprint + '.json')
+        if os.path.exists(cachefile):
+            with open(cachefile) as infile:
+                index = json.load(infile)
+        _indexes[fingerprint] = index
+
+    return _indexes[fingerprint]
+
+
+def _add_span(index, start, end, times):
+    '''Adds the keyframes read from a span of a file to its index, merging overlapping spans'''
+
+    spans = sorted(index['spans'] + [[start, end]])
+    merged = [spans[0]]
+    for lo, hi in spans[1:]:
+        if lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+
+    index['spans'] = merged
+    index['keyframes'] = sorted(set(index['keyframes']) | set(times))
+
+
+def keyframes(resource, start=None, end=None, cache=True):
+    '''Returns the times of the keyframes in the first video stream of a file.
+
+    Args:
+        resource (str): path to a video
+        start (float): only read packets from the keyframe before this time (defaults to the start of the file)
+        end (float): only read packets up to this time (defaults to the end of the file)
+        cache (bool): use and save the file's keyframe index
+
+    Returns:
+        list: keyframe times in seconds, sorted, or None if the file can't be read. When the range
+        is already in the index, this is every keyframe in the indexed span around it
+    '''
+
+    lo = float(start) if start else 0.0
+    hi = float(end) if end is not None else float('inf')
+
+    fingerprint = file_fingerprint(resource)
+    if cache:
+        index = _index(fingerprint)
+        for span_start, span_end in index['spans']:
+            if span_start <= lo and hi <= span_end:
+                return [t for t in index['keyframes'] if span_start <= t <= span_end]
+
+    args = ['ffprobe', '-v', 'error', '-select_streams', 'v:0']
+
+    if start is not None or end is not None:
+        interval = '%.6f' % start if start else ''
+        interval += '%' + ('%.6f' % end if end is not None else '')
+        args += ['-read_intervals', interval]
+
+    args += ['-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', resource]
+
+    try:
+        output = check_output(args).decode('utf-8')
+    except (OSError, CalledProcessError):
+        return None
+
+    times = []
+    first = None
+    for line in output.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2:
+            continue
+        try:
+            time = float(parts[0])
+        except ValueError:
+            continue
+        if first is None:
+            first = time
+        if 'K' in parts[1]:
+            times.append(time)
+
+    times.sort()
+
+    if cache:
+        # ffprobe starts reading at the keyframe before start, so everything from there on is known
+        _add_span(index, min(lo, first) if first is not None else lo, hi, times)
+        with open(cache_path('keyframes', fingerprint + '.json'), 'w') as outfile:
+            json.dump(index, outfile)
+
+    return times
+
+
+def _window(time, window=WINDOW):
+    '''Returns the (start, end) of the packets to read around a time'''
+
+    return max(float(time) - window, 0.0), float(time) + window
+
+
+def seek_cost(resource, time):
+    '''Returns how many seconds of video melt decodes before it reaches a time in a file.
+
+    Returns WINDOW if there's no keyframe that close before the time (so at least that much),
+    and 0 if the file can't be read.
+    '''
+
+    start, end = _window(time)
+    index = keyframes(resource, start, end)
+    if index is None:
+        return 0.0
+
+    i = bisect_right(index, float(time) + 1e-6)
+    previous = index[i - 1] if i > 0 else start
+    return max(float(time) - previous, 0.0)
+
+
+def snap(resource, time, direction='nearest'):
+    '''Moves a time to a keyframe, where a clip can start without decoding earlier frames.
+
+    Args:
+        resource (str): path to a video
+        time (float): time in seconds
+        direction (str): "before", "after", or "nearest"
+
+    Returns:
+        Second: the keyframe time (or the original time if there's no keyframe within WINDOW seconds)
+    '''
+
+    if direction not in ('before', 'after', 'nearest'):
+        raise ValueError('direction must be "before", "after" or "nearest", not {!r}'.format(direction))
+
+    index = keyframes(resource, *_window(time))
+    if not index:
+        return Second(time)
+
+    time = float(time)
+    i = bisect_right(index, time + 1e-6)
+    before = index[i - 1] if i > 0 else None
+    j = bisect_left(index, time - 1e-6)
+    after = index[j] if j < len(index) else None
+
+    if direction == 'before' or after is None:
+        return Second(before if before is not None else time)
+    if direction == 'after' or before is None:
+        return Second(after)
+
+    return Second(before if time - before <= after - time else after)
+
+
+def suggest(resource, time, window=2.0):
+    '''Lists the keyframes near a time, as cheap alternatives for a cut point.
+
+    Args:
+        resource (str): path to a video
+        time (float): time in seconds
+        window (float): how far from the time to look, in seconds
+
+    Returns:
+        list: Second keyframe times, nearest first
+    '''
+
+    index = keyframes(resource, *_window(time, window)) or []
+    time = float(time)
+    nearby = index[bisect_left(index, time - window):bisect_right(index, time + window)]
+    return [Second(t) for t in sorted(nearby, key=lambda t: abs(t - time))]
@@ -0,0 +1,173 @@
+'''
+An index of the services (filters, transitions, producers and consumers) available to melt
+
+Querying melt is slow, so the index is saved to the cache directory once per melt version
+and kept in memory after the first lookup.
+'''
+
+from __future__ import print_function
+import os
+import re
+import json
+import hashlib
+from subprocess import check_output, CalledProcessError, STDOUT
+from . import config
+from .utils import cache_path
+
+KINDS = ('filters', 'transitions', 'producers', 'consumers')
+
+_indexes = {}
+
+
+class MissingServiceError(Exception):
+    '''Raised when a composition uses a filter or transition that melt doesn't provide'''
+
+    pass
+
+
+def melt_version():
+    '''Returns the version string of the current melt binary, or None if it can't be found'''
+
+    try:
+        output = check_output([config.MELT_BINARY, '-version'], stderr=STDOUT)
+    except (OSError, CalledProcessError):
+        return None
+
+    match = re.search(r'(\d+\.\d+\.\d+)', output.decode('utf-8', 'replace'))
+    if match:
+        return match.group(1)
+    return None
+
+
+def query_services(kind):
+    '''Asks melt for all available services of a given kind
+
+    Args:
+        kind (str): one of "filters", "transitions", "producers" or "consumers"
+
+    Returns:
+        list: service names
+    '''
+
+    output = check_output([config.MELT_BINARY, '-query', kind], stderr=STDOUT)
+    output = output.decode('utf-8', 'replace')
+    return re.findall(r'^\s+- (.+?)\s*$', output, re.MULTILINE)
+
+
+def _binary_path():
+    '''Finds the melt binary on the PATH, if config.MELT_BINARY isn't a path already'''
+
+    binary = config.MELT_BINARY
+    if os.path.dirname(binary):
+        return os.path.abspath(binary)
+
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, binary)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+
+    return binary
+
+
+def _binary_key():
+    '''A cheap key for the current melt binary, so a replaced binary gets a fresh index'''
+
+    path = _binary_path()
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_mtime, stat.st_size)
+    except OSError:
+        return (path, None, None)
+
+
+def get_index(refresh=False):
+    '''Returns the service index for the current melt binary
+
+    Args:
+        refresh (bool): ignore cached indexes and query melt again
+
+    Returns:
+        dict: a set of service names for each kind, or None if melt can't be queried
+    '''
+
+    key = _binary_key()
+
+    if not refresh and key in _indexes:
+        return _indexes[key]
+
+    version = melt_version()
+    if version is None:
+        return None
+
+    # builds of the same version can have different modules, so the binary is part of the key
+    binary = hashlib.sha1(json.dumps(list(key)).encode('utf-8')).hexdigest()[:12]
+    filename = cache_path('services-{}-{}.json'.format(version, binary))
+    index = None
+
+    if not refresh and os.path.exists(filename):
+        try:
+            with open(filename) as infile:
+                index = json.load(infile)
+        except ValueError:
+            index = None
+
+    if index is None:
+        try:
+            index = dict((kind, query_services(kind)) for kind in KINDS)
+        except (OSError, CalledProcessError):
+            return None
+
+        with open(filename, 'w') as outfile:
+            json.dump(index, outfile)
+
+    index = dict((kind, frozenset(index.get(kind, []))) for kind in KINDS)
+    _indexes[key] = index
+
+    return index
+
+
+def is_available(name, kind='filters'):
+    '''Checks if a service is available in melt
+
+    Args:
+        name (str): the name of the service, for example "frei0r.glow"
+        kind (str): one of "filters", "transitions", "producers" or "consumers"
+
+    Returns:
+        bool: True if available, or if melt can't be queried
+    '''
+
+    index = get_index()
+    if index is None:
+        return True
+    return name in index[kind]
+
+
+def missing_services(clips):
+    '''Finds the filters and transitions in a list of clips that melt doesn't provide
+
+    Args:
+        clips (list): a list of Clip objects. Mask clips are checked as well.
+
+    Returns:
+        list: (clip, kind, name) tuples for each missing service
+    '''
+
+    index = get_index()
+    if index is None:
+        return []
+
+    missing = []
+
+    for clip in clips:
+        for c in [clip, clip.mask]:
+            if c is None:
+                continue
+            for name, params in c.fxs:
+                if name not in index['filters']:
+                    missing.append((c, 'filters', name))
+            for name, params in c.transitions:
+                if name not in index['transitions']:
+                    missing.append((c, 'transitions', name))
+
+    return missing
@@ -0,0 +1,135 @@
+'''
+Compiled compositions with placeholders, for rendering the same layout many times
+'''
+
+from string import Template as StringTemplate
+from subprocess import call
+from multiprocessing.pool import ThreadPool
+from xml.sax.saxutils import escape
+from . import config, scratch
+from .utils import check_melt
+
+
+class Template(object):
+    '''A compiled melt xml document with named ${placeholders}.
+
+    Rendering a variant only substitutes values into the xml, without rebuilding
+    clips or compositions. Create one with Composition.to_template().
+
+    Args:
+        xml (str): melt xml with ${name} placeholders (literal dollar signs written as $$)
+        duration: the out point of the composition
+    '''
+
+    def __init__(self, xml, duration=None):
+        if isinstance(xml, bytes):
+            xml = xml.decode('utf-8')
+        self.template = StringTemplate(xml)
+        self.duration = duration
+
+
+    @property
+    def placeholders(self):
+        '''Names of the placeholders in the template'''
+
+        names = set()
+        for match in self.template.pattern.finditer(self.template.template):
+            name = match.group('named') or match.group('braced')
+            if name:
+                names.add(name)
+        return sorted(names)
+
+
+    @classmethod
+    def load(cls, filename):
+        '''Loads a template saved with save()'''
+
+        with open(filename, 'rb') as infile:
+            xml = infile.read().decode('utf-8')
+
+        duration = None
+        if xml.startswith('<!-- duration: '):
+            header, xml = xml.split('\n', 1)
+            duration = header[len('<!-- duration: '):-len(' -->')]
+
+        return cls(xml, duration)
+
+
+    def save(self, filename):
+        '''Saves the template to a file'''
+
+        with open(filename, 'wb') as outfile:
+            if self.duration is not None:
+                outfile.write('<!-- duration: {} -->\n'.format(self.duration).encode('utf-8'))
+            outfile.write(self.template.template.encode('utf-8'))
+
+        return filename
+
+
+    def substitute(self, **values):
+        '''Fills in the placeholders.
+
+        Args:
+            **values: a value for each placeholder
+
+        Returns:
+            str: melt xml
+        '''
+
+        values = dict((k, escape(str(v), {'"': '&quot;'})) for k, v in values.items())
+        return self.template.substitute(values)
+
+
+    def render(self, filename, values=None, **kwargs):
+        '''Renders one variant of the template to a video file.
+
+        Args:
+            filename (str): the file to save to
+            values (dict): a value for each placeholder
+            **kwargs: additional parameters to pass to ffmpeg
+
+        Returns:
+            filename (str): the path to the saved file
+        '''
+
+        xml = self.substitute(**(values or {}))
+
+        with scratch.Job() as job:
+            args = [config.MELT_BINARY, job.xml_resource(xml)]
+
+            if self.duration is not None:
+                args += ['out="{}"'.format(self.duration)]
+
+            args += ['-consumer', 'avformat:{}'.format(filename)]
+            args += ['{}="{}"'.format(key, val) for key, val in kwargs.items()]
+
+            if call(args) != 0:
+                raise RuntimeError('melt failed while rendering {}'.format(filename))
+
+        return filename
+
+
+    def render_many(self, rows, workers=None, **kwargs):
+        '''Renders many variants of the template in parallel.
+
+        Args:
+            rows (list): dicts with a "filename" key and a value for each placeholder
+            workers (int): number of renders to run at once (defaults to the number of cpus)
+            **kwargs: additional parameters to pass to ffmpeg, for every render
+
+        Returns:
+            list: paths to the saved files
+        '''
+
+        check_melt()
+
+        def render_row(row):
+            values = dict(row)
+            filename = values.pop('filename')
+            return self.render(filename, values, **kwargs)
+
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(render_row, rows)
+        finally:
+            pool.close()
@@ -1,8 +1,14 @@
+from . import config
 from .clip import Clip
+from .rasterize import is_dynamic, text_image
 
 class Text(Clip):
     '''Subclass of Clip that allows you to write text in your composition
 
+    With prerender, static text is drawn once to a cached image, at the given resolution or
+    at the composition's size when it's rendered. Text with dynamictext keywords (like #timecode#)
+    is always drawn by melt on every frame.
+
     Args:
         text (str): The text
         font (str): The font family to use
@@ -15,28 +21,25 @@ class Text(Clip):
         bbox (list): A bounding box for text to appear in. By default is (0, 0, '100%', '100%'
         halign (str): Horizontal aligment of text. Can be "center" (default), "left" or "right"
         valign (str): Vertical aligment of text. Can be "middle" (default), "top" or "bottom"
+        prerender (bool): Draw static text once to an image. Defaults to config.PRERENDER_TEXT.
+            Raises a ValueError if the font can't be found
+        resolution (tuple): (width, height) of the prerendered image. Defaults to the composition's size
 
     '''
 
-    def __init__(self, text, start=0, end=None, offset=0, color="#ffffff", bgcolor="0x00000000", olcolor="0x00000000", outline=0, halign="center", valign="middle", pad=0, font="Sans", size=1080, style="normal", weight=400, bbox=(0, 0, '100%', '100%'), **kwargs):
+    def __init__(self, text, start=0, end=None, offset=0, color="#ffffff", bgcolor="0x00000000", olcolor="0x00000000", outline=0, halign="center", valign="middle", pad=0, font="Sans", size=1080, style="normal", weight=400, bbox=(0, 0, '100%', '100%'), prerender=None, resolution=None, **kwargs):
 
-        Clip.__init__(self, 'color:#00000000', start=start, end=end, offset=offset, **kwargs)
+        if prerender is None:
+            prerender = config.PRERENDER_TEXT
 
-        geometry = '{}/{}:{}x{}'.format(*bbox)
-
-        self.fx('dynamictext', {
-            'argument': text,
-            'geometry': geometry,
-            'family': font,
-            'size': size,
-            'weight': weight,
-            'style': style,
-            'fgcolour': color,
-            'bgcolour': bgcolor,
-            'olcolour': olcolor,
-            'outline': outline,
-            'pad': pad,
-            'halign': halign,
-            'valign': valign
-        })
+        if prerender and resolution is not None and not is_dynamic(text):
+            image = text_image(text, resolution[0], resolution[1], font=font, size=size, color=color, bgcolor=bgcolor,
+                               olcolor=olcolor, outline=outline, halign=halign, valign=valign, pad=pad, style=style,
+                               weight=weight, bbox=bbox)
+            Clip.__init__(self, image, start=start, end=end, offset=offset, **kwargs)
+            return
+
+        Clip.__init__(self, 'color:#00000000', start=start, end=end, offset=offset, **kwargs)
 
+        self.text(text, color=color, bgcolor=bgcolor, olcolor=olcolor, outline=outline, halign=halign, valign=valign,
+                  pad=pad, font=font, size=size, style=style, weight=weight, bbox=bbox, prerender=prerender)
@@ -5,39 +5,142 @@ Utility functions for vidpy
 from __future__ import print_function
 import os
 import sys
-from subprocess import call, Popen, check_output
+import json
+import hashlib
+from subprocess import Popen, check_output
 from xml.etree.ElementTree import fromstring
-import uuid
-from PIL import Image
+from fractions import Fraction
 from . import config
 
-def get_bg_color(filename):
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_bg_colors = {}
+
+
+def file_fingerprint(filename):
+    '''
+    Returns a short id for a file that changes when the file does, for keying caches.
+
+    Uses the absolute path, size and modification time. Resources that aren't files
+    (urls, melt services) are fingerprinted by name.
+    '''
+
+    try:
+        stat = os.stat(filename)
+        key = '{}:{}:{}'.format(os.path.abspath(filename), stat.st_size, stat.st_mtime)
+    except (OSError, TypeError, ValueError):
+        key = str(filename)
+
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def read_frame(filename, time=0, width=160, height=90):
     '''
-    Extracts the top left pixel color from the first frame of a video
+    Decodes a single frame of a video with ffmpeg, straight into memory.
 
     Args:
         filename: an input video
+        time (float): timestamp in seconds of the frame
+        width (int): width to scale the frame to
+        height (int): height to scale the frame to
 
     Returns:
-        color
+        bytes: the frame as packed rgb24 pixels
     '''
 
-    tempname = str(uuid.uuid4()) + '.png'
-    call([
+    return check_output([
         'ffmpeg',
         '-hide_banner',
         '-loglevel', 'panic',
+        '-ss', str(float(time)),
         '-i', filename,
-        '-t', '1',
-        '-f', 'image2',
-        '-y',
-        tempname
+        '-frames:v', '1',
+        '-vf', 'scale={}:{}'.format(width, height),
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-'
     ])
-    image = Image.open(tempname)
-    red, green, blue = image.getpixel((0, 0))
-    color = '#%02x%02x%02x' % (red, green, blue)
-    os.remove(tempname)
-    return color
+
+
+def border_color(frames, width, height, border=2):
+    '''
+    Estimates the dominant color along the edges of one or more frames.
+
+    Takes the per-channel median of all pixels within the border, so a few
+    stray pixels (noise, a hand crossing the edge) don't change the result.
+
+    Args:
+        frames (list): frames as packed rgb24 bytes
+        width (int): width of the frames
+        height (int): height of the frames
+        border (int): thickness of the sampled border in pixels. 0 uses only the top left pixel.
+
+    Returns:
+        (r, g, b) tuple
+    '''
+
+    border = min(border, width // 2, height // 2)
+
+    if np is not None:
+        pixels = np.frombuffer(b''.join(frames), dtype=np.uint8).reshape(len(frames), height, width, 3)
+        if border == 0:
+            samples = pixels[:, 0, 0]
+        else:
+            samples = np.concatenate([
+                pixels[:, :border].reshape(-1, 3),
+                pixels[:, -border:].reshape(-1, 3),
+                pixels[:, border:-border, :border].reshape(-1, 3),
+                pixels[:, border:-border, -border:].reshape(-1, 3),
+            ])
+        return tuple(int(c) for c in np.median(samples, axis=0))
+
+    samples = []
+    for frame in frames:
+        for y in range(height):
+            for x in range(width):
+                if border == 0 and (x, y) != (0, 0):
+                    continue
+                if border > 0 and border <= x < width - border and border <= y < height - border:
+                    continue
+                i = (y * width + x) * 3
+                samples.append(tuple(bytearray(frame[i:i+3])))
+
+    channels = [sorted(channel) for channel in zip(*samples)]
+    return tuple(channel[len(channel) // 2] for channel in channels)
+
+
+def get_bg_color(filename, times=None, border=2):
+    '''
+    Estimates the background color of a video from the edges of its frames.
+
+    Frames are decoded into memory at a small size, nothing is written to disk.
+    Results are cached for each file.
+
+    Args:
+        filename: an input video
+        times (list): timestamps in seconds to sample frames from (by default only the first frame)
+        border (int): thickness of the sampled border, in pixels of a 160x90 frame. 0 uses only the top left pixel.
+
+    Returns:
+        color
+    '''
+
+    if times is None:
+        times = [0]
+
+    key = (file_fingerprint(filename), tuple(float(t) for t in times), border)
+
+    if key not in _bg_colors:
+        frames = [read_frame(filename, t) for t in times]
+        frames = [f for f in frames if len(f) == 160 * 90 * 3]
+        if not frames:
+            raise ValueError('Could not read any frames from {}'.format(filename))
+        _bg_colors[key] = '#%02x%02x%02x' % border_color(frames, 160, 90, border)
+
+    return _bg_colors[key]
 
 
 def timestamp(val):
@@ -53,24 +156,141 @@ def timestamp(val):
         return Second(val)
 
 
+def parse_time(value, fps):
+    '''
+    Converts a melt time value to a Frame.
+
+    Accepts frame numbers, clock times ("00:01:02.500"), timecodes ("00:01:02:15" or with ";"),
+    and vidpy timestamps (":62.5").
+
+    Args:
+        value: the time value
+        fps: frames per second, or a Timebase
+
+    Returns:
+        Frame
+    '''
+
+    if isinstance(value, Frame):
+        return value
+
+    if isinstance(value, Second):
+        return Timebase(fps).to_frame(value)
+
+    value = str(value).strip()
+
+    if ':' not in value and ';' not in value:
+        return Frame(int(float(value)))
+
+    timebase = Timebase(fps)
+    sign = -1 if value.startswith('-') else 1
+    parts = value.lstrip('-').replace(';', ':').split(':')
+
+    if len(parts) == 4:
+        return Frame(sign * timecode_frames(parts, timebase, drop_frame=';' in value))
+
+    seconds = Fraction(0)
+    for part in parts:
+        seconds = seconds * 60 + Fraction(part or '0')
+
+    return Frame(sign * timebase.to_frame(seconds))
+
+
+def timecode_frames(parts, timebase, drop_frame=False):
+    '''
+    Counts the frames in a SMPTE timecode.
+
+    Timecode frames are counted at the nominal rate (30 for 29.97). Drop-frame timecodes
+    (written with ";") skip frame numbers at the start of each minute except every tenth,
+    so they keep up with the clock at 29.97 and 59.94 fps.
+
+    Args:
+        parts (list): hours, minutes, seconds and frames
+        timebase (Timebase): the frame rate
+        drop_frame (bool): if the timecode is drop-frame
+
+    Returns:
+        int
+    '''
+
+    hours, minutes, seconds, frames = [int(part or 0) for part in parts]
+    nominal = int(round(timebase.fps))
+    total = ((hours * 60 + minutes) * 60 + seconds) * nominal + frames
+
+    # drop-frame only applies to NTSC rates
+    if drop_frame and timebase.fps.denominator != 1 and nominal % 30 == 0:
+        minutes = hours * 60 + minutes
+        total -= (nominal // 15) * (minutes - minutes // 10)
+
+    return total
+
+
+def xml_timebase(xml):
+    '''Returns the Timebase of the profile in a parsed mlt xml document'''
+
+    profile = xml.find('profile')
+    return Timebase((int(profile.get('frame_rate_num')), int(profile.get('frame_rate_den', 1))))
+
+
 def get_melt_profile(resource):
     '''
     Retrieves a melt profile from any given resource.
 
     Inlcudes, with, height, fps, duration
+
+    Profiles of files are cached on disk, so each file is only probed once.
     '''
 
+    cachefile = None
+    if os.path.isfile(resource):
+        cachefile = cache_path('probe', file_fingerprint(resource) + '.json')
+        if os.path.exists(cachefile):
+            with open(cachefile) as infile:
+                return json.load(infile)
+
     xml = check_output([config.MELT_BINARY, resource, '-consumer', 'xml'])
     xml = fromstring(xml)
-    profile = xml.find('profile')
     total_frames = int(xml.find('producer').find('property[@name="length"]').text)
-    fps = float(profile.get('frame_rate_num'))/float(profile.get('frame_rate_den'))
+    profile = _profile(xml, total_frames)
+
+    if cachefile is not None:
+        with open(cachefile, 'w') as outfile:
+            json.dump(profile, outfile)
+
+    return profile
+
+
+def xml_profile(xml):
+    '''
+    Reads the profile of a composition from its mlt xml, without running melt.
+
+    Returns None if the xml doesn't have a profile and a tractor with an out point.
+    '''
+
+    if not hasattr(xml, 'findall'):
+        xml = fromstring(xml)
+
+    tractor = xml.find('tractor')
+    if xml.find('profile') is None or tractor is None or tractor.get('out') is None:
+        return None
+
+    total_frames = parse_time(tractor.get('out'), xml_timebase(xml)) + 1
+    return _profile(xml, total_frames)
+
+
+def _profile(xml, total_frames):
+    profile = xml.find('profile')
+    frame_rate_num = int(profile.get('frame_rate_num'))
+    frame_rate_den = int(profile.get('frame_rate_den'))
+    fps = float(frame_rate_num)/float(frame_rate_den)
     width = int(profile.get('width'))
     height =  int(profile.get('height'))
     duration = round(float(total_frames)/fps, 2)
     profile = {
         'total_frames': total_frames,
         'fps': fps,
+        'frame_rate_num': frame_rate_num,
+        'frame_rate_den': frame_rate_den,
         'width': width,
         'height': height,
         'duration': duration
@@ -78,6 +298,30 @@ def get_melt_profile(resource):
     return profile
 
 
+def memory_limiter(megabytes):
+    '''
+    Returns a function that caps the memory of a child process, for use as Popen's preexec_fn.
+
+    Only works on systems with the resource module (Linux, Mac). Returns None otherwise,
+    or if megabytes is None.
+    '''
+
+    if megabytes is None:
+        return None
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    limit = int(megabytes * 1024 * 1024)
+
+    def preexec():
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    return preexec
+
+
 def check_melt():
     '''
     Checks for a melt installation
@@ -92,6 +336,34 @@ def check_melt():
             sys.exit()
 
 
+def cache_path(*parts):
+    '''Returns a path inside the vidpy cache directory, creating parent directories as needed'''
+
+    returnpath = os.path.join(config.CACHE_DIR, *parts)
+    dirname = os.path.dirname(returnpath)
+
+    if not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+
+    return returnpath
+
+
+def save_image(image, filename, format='PNG'):
+    '''Saves a PIL image to a cache file.
+
+    The image is written to a temporary name first, so parallel renders never read a half written file.
+    '''
+
+    tempname = '{}.{}.tmp'.format(filename, os.getpid())
+    image.save(tempname, format)
+    os.rename(tempname, filename)
+    return filename
+
+
 def effects_path(effect=None):
     '''Returns the path to the effects directory'''
 
@@ -106,7 +378,12 @@ def effects_path(effect=None):
 class Frame(int):
     '''A wrapper class for int to help differentiate between timestamps and frames'''
 
-    pass
+    __slots__ = ()
+
+    def to_second(self, fps):
+        '''Converts the frame to a Second at the given frame rate'''
+
+        return Timebase(fps).to_seconds(self)
 
 
 class Second(float):
@@ -116,6 +393,13 @@ class Second(float):
     Allows floats to be converted into melt timestamps
     '''
 
+    __slots__ = ()
+
+    def to_frame(self, fps):
+        '''Converts the timestamp to the nearest Frame at the given frame rate'''
+
+        return Timebase(fps).to_frame(self)
+
     def __repr__(self):
         return ':%f' % self
 
@@ -141,3 +425,113 @@ class Second(float):
         return Second(float(self) / y)
 
     __str__ = __repr__
+
+
+# frame rates that are really x/1001, but are usually written as rounded floats
+NTSC_RATES = [Fraction(rate * 1000, 1001) for rate in (24, 30, 48, 60, 120)]
+
+
+class Timebase(object):
+    '''
+    Exact conversion between seconds and frames at a given frame rate.
+
+    Seconds are rounded to the nearest frame with rational arithmetic, so cut points
+    that fall on the same frame always produce the same frame number. Floats are read
+    as the decimal they print as, so 0.3 is exactly 3/10, the same as the string ":0.3".
+    Halfway times round up.
+
+    Args:
+        fps: frames per second, as a number, a (num, den) tuple, or a Fraction.
+            Rounded NTSC rates like 29.97 are treated as their exact x/1001 values.
+    '''
+
+    __slots__ = ('fps',)
+
+    def __init__(self, fps):
+        if isinstance(fps, Timebase):
+            fps = fps.fps
+        elif isinstance(fps, tuple):
+            fps = Fraction(*fps)
+        elif not isinstance(fps, Fraction):
+            fps = Fraction(str(fps))
+            for rate in NTSC_RATES:
+                if fps != rate and abs(fps - rate) < Fraction(1, 100):
+                    fps = rate
+                    break
+
+        if fps <= 0:
+            raise ValueError('fps must be positive')
+
+        self.fps = fps
+
+
+    def to_frame(self, seconds):
+        '''Converts seconds to the nearest Frame. Frames are returned unchanged.'''
+
+        if isinstance(seconds, Frame):
+            return seconds
+        if isinstance(seconds, float):
+            seconds = repr(float(seconds))
+        return Frame(int((Fraction(seconds) * self.fps + Fraction(1, 2)) // 1))
+
+
+    def to_seconds(self, frame):
+        '''Converts a frame number to a Second'''
+
+        return Second(float(Fraction(int(frame)) / self.fps))
+
+
+    def snap(self, seconds):
+        '''Rounds seconds to the start of the nearest frame'''
+
+        return self.to_seconds(self.to_frame(seconds))
+
+
+    def to_frames(self, seconds):
+        '''Converts a sequence of seconds to frame numbers.
+
+        Uses a vectorized NumPy conversion when NumPy is installed.
+
+        Returns:
+            an int64 array with NumPy, otherwise a list of Frames
+        '''
+
+        if np is None:
+            return [self.to_frame(s) for s in seconds]
+
+        seconds = np.asarray(seconds, dtype=np.float64)
+        product = seconds * self.fps.numerator / self.fps.denominator
+        frames = np.floor(product + 0.5).astype(np.int64)
+
+        # float error can put a time on either side of a half frame, so those are rounded exactly like to_frame
+        for i in np.flatnonzero(np.abs(product - np.floor(product) - 0.5) < 1e-6):
+            frames[i] = self.to_frame(float(seconds[i]))
+
+        return frames
+
+
+    def frames_to_seconds(self, frames):
+        '''Converts a sequence of frame numbers to seconds.
+
+        Returns:
+            a float64 array with NumPy, otherwise a list of Seconds
+        '''
+
+        if np is None:
+            return [self.to_seconds(f) for f in frames]
+
+        frames = np.asarray(frames, dtype=np.int64)
+        return frames * float(self.fps.denominator) / self.fps.numerator
+
+
+    def __eq__(self, other):
+        return isinstance(other, Timebase) and self.fps == other.fps
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fps)
+
+    def __repr__(self):
+        return 'Timebase({}/{})'.format(self.fps.numerator, self.fps.denominator)